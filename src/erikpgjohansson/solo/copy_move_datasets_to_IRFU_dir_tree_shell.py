@@ -19,7 +19,7 @@ def main(ls_cli_args):
     NOTE: Can not override instrDirCase and dtdnInclInstrument.
 
 
-    Parameters: (move | copy) <source dir> <destination dir.>
+    Parameters: (move | copy | link | reflink) <source dir> <destination dir.>
 
 
     Script initially created 2020-10-16 by Erik P G Johansson.
@@ -0,0 +1,391 @@
+'''
+In-process copying and linking of (many) files.
+
+Copies file content using kernel-side ("zero-copy") system calls when
+available (os.copy_file_range(), os.sendfile()), with a fallback to
+reading/writing in Python. Multiple files are copied concurrently using a
+bounded thread pool (hides the latency of network filesystems).
+
+Every file is first copied to a temporary file in the destination directory,
+which is then renamed (atomically) to the destination path. Readers therefore
+never see partially copied files, and an interrupted copy never leaves a
+truncated file at the destination path.
+
+Files can also be "placed" at the destination using cheaper methods when
+source and destination are on the same filesystem (see place_files()):
+    'reflink' : Copy-on-write clone (FICLONE ioctl; e.g. btrfs, XFS). Shares
+                the data blocks until modified.
+    'link'    : Hard link. Source and destination are the same file.
+    'copy'    : Copy the content.
+'''
+
+
+import concurrent.futures
+import errno
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+
+
+'''
+PROPOSAL: Preserve file modification time (like "cp -p", shutil.copy2()).
+PROPOSAL: Retry on all OSError, except for source file not existing.
+'''
+
+
+N_COPY_WORKERS = 8
+'''Default number of threads to use for copying files.'''
+
+N_COPY_TRIES = 5
+'''Default number of times to try copying a file before giving up (see
+_SET_ERRNO_RETRY).'''
+
+COPY_RETRY_DELAY_S = 1.0
+'''Default delay before the first retry of a failed copy. The delay is
+doubled for every subsequent retry (exponential backoff).'''
+
+_SET_ERRNO_RETRY = {
+    errno.EACCES, errno.EPERM, errno.EAGAIN, errno.EBUSY, errno.EIO,
+    errno.ESTALE,
+}
+'''Error numbers for which a failed copy is retried.
+
+NOTE: Includes permission errors. Copying large numbers of files to (at
+least) nas24 from brain has been observed to fail intermittently with
+"PermissionError: [Errno 13] Permission denied" when opening the destination
+file. See erikpgjohansson.solo.iddt.copy_move_datasets_to_IRFU_dir_tree().'''
+
+_SET_ERRNO_FALLBACK = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP,
+    errno.ENOTSUP, errno.ENOTSOCK,
+}
+'''Error numbers for which a kernel-side copy system call is considered to be
+unsupported (for the combination of files/filesystems), so that the next
+copy method is used instead.'''
+
+_FICLONE = 0x40049409
+'''Linux ioctl request code for cloning a file (reflink).'''
+
+_SET_ERRNO_NO_REFLINK = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP,
+    errno.ENOTSUP, errno.ENOTTY, errno.EBADF,
+}
+'''Error numbers for which reflinking is considered to be unsupported (e.g.
+filesystem without copy-on-write, or different filesystems).'''
+
+_SET_ERRNO_NO_LINK = {
+    errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTSUP,
+    errno.ENOSYS,
+}
+'''Error numbers for which hard linking is considered to be unsupported (e.g.
+different filesystems, or too many links).'''
+
+DC_FALLBACK_METHODS = {
+    'reflink': ('reflink', 'link', 'copy'),
+    'link':    ('link', 'copy'),
+    'copy':    ('copy',),
+}
+'''Mode (argument to place_files()) --> Methods to try, in order.'''
+
+_COPY_CHUNK_SIZE = 2**30
+'''Max number of bytes per system call when copying file content.'''
+
+
+def place_files(
+    mode, ls_src_dest, n_workers=None, n_tries=None, retry_delay_s=None,
+):
+    '''
+    Place (reflink, hard link or copy) multiple files at destination paths
+    concurrently. For every file, tries the methods for the mode in
+    DC_FALLBACK_METHODS in order, and falls back to the next method if one is
+    not supported for the file (e.g. if source and destination are on
+    different filesystems).
+
+    Like copying, every method replaces any pre-existing destination file
+    atomically (via a temporary file/link in the destination directory).
+
+    Attempts to place all files before raising an exception (if any failed).
+    Then raises the exception of the first failure (in list order) after
+    logging all of them.
+
+    NOTE: A hard-linked destination is the same file as the source.
+    Modifying one also modifies the other. Reflinked and copied files are
+    independent.
+
+
+    Parameters
+    ----------
+    mode : String. 'reflink', 'link' or 'copy'.
+    ls_src_dest : List of (src_path, dest_path).
+    n_workers : None or int >= 1.
+        Number of threads. None: Use N_COPY_WORKERS.
+    n_tries, retry_delay_s : See copy_file().
+
+
+    Returns
+    -------
+    ls_method : List of strings. The method ('reflink', 'link', 'copy')
+        actually used for every file, in the same order as ls_src_dest.
+    '''
+    ls_method_try = DC_FALLBACK_METHODS[mode]
+    if n_workers is None:
+        n_workers = N_COPY_WORKERS
+    assert type(n_workers) is int and n_workers >= 1
+
+    L = logging.getLogger(__name__)
+
+    def place(src_dest):
+        return _retry(
+            lambda: _place_file(*src_dest, ls_method_try),
+            mode, src_dest[0], n_tries, retry_delay_s,
+        )
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=n_workers,
+    ) as executor:
+        ls_future = [
+            executor.submit(place, src_dest) for src_dest in ls_src_dest
+        ]
+
+    ls_exception = []
+    for (src_path, dest_path), future in zip(ls_src_dest, ls_future):
+        e = future.exception()
+        if e is not None:
+            L.error(
+                f'Failed to {mode} "{src_path}" --> "{dest_path}": {e!r}',
+            )
+            ls_exception.append(e)
+    if ls_exception:
+        raise ls_exception[0]
+
+    return [future.result() for future in ls_future]
+
+
+def copy_files(
+    ls_src_dest, n_workers=None, n_tries=None, retry_delay_s=None,
+):
+    '''
+    Copy multiple files concurrently. See place_files() and copy_file().
+
+    Returns
+    -------
+    None.
+    '''
+    place_files('copy', ls_src_dest, n_workers, n_tries, retry_delay_s)
+
+
+def copy_file(src_path, dest_path, n_tries=None, retry_delay_s=None):
+    '''
+    Copy one file (content and permission bits) via a temporary file in the
+    destination directory, which is then atomically renamed to the
+    destination path. Overwrites any pre-existing destination file.
+
+    Retries with exponential backoff for errors which are likely to be
+    intermittent (see _SET_ERRNO_RETRY).
+
+    NOTE: Does not check whether source and destination are the same file.
+    Doing so is the caller's responsibility.
+
+
+    Parameters
+    ----------
+    src_path, dest_path : Paths to files.
+    n_tries : None or int >= 1. None: Use N_COPY_TRIES.
+    retry_delay_s : None or number >= 0. Delay before the first retry.
+        None: Use COPY_RETRY_DELAY_S.
+    '''
+    _retry(
+        lambda: _write_file_atomic(src_path, dest_path, _copy_fd_content),
+        'copy', src_path, n_tries, retry_delay_s,
+    )
+
+
+def _retry(func, operation, src_path, n_tries, retry_delay_s):
+    '''Call func() and return its return value. Retry with exponential
+    backoff for errors which are likely to be intermittent. See
+    copy_file().
+
+    operation : String. The operation attempted on src_path ('copy', 'link',
+        'reflink'). Only used for logging.'''
+    if n_tries is None:
+        n_tries = N_COPY_TRIES
+    if retry_delay_s is None:
+        retry_delay_s = COPY_RETRY_DELAY_S
+    assert type(n_tries) is int and n_tries >= 1
+    assert retry_delay_s >= 0
+
+    L = logging.getLogger(__name__)
+
+    for i_try in range(n_tries):
+        try:
+            return func()
+        except OSError as e:
+            if (e.errno not in _SET_ERRNO_RETRY) or (i_try + 1 == n_tries):
+                raise
+            delay_s = retry_delay_s * 2**i_try
+            L.warning(
+                f'Failed to {operation} "{src_path}"'
+                f' (try {i_try + 1}/{n_tries}): {e!r}.'
+                f' Retrying in {delay_s} s.',
+            )
+            time.sleep(delay_s)
+
+
+def _place_file(src_path, dest_path, ls_method):
+    '''Place one file using the first supported method. Returns the method
+    used.'''
+    for method in ls_method[:-1]:
+        try:
+            if method == 'reflink':
+                _write_file_atomic(src_path, dest_path, _reflink_fd_content)
+            else:
+                assert method == 'link'
+                _link_file_atomic(src_path, dest_path)
+            return method
+        except _UnsupportedMethodError:
+            pass
+
+    method = ls_method[-1]
+    assert method == 'copy'
+    _write_file_atomic(src_path, dest_path, _copy_fd_content)
+    return method
+
+
+class _UnsupportedMethodError(Exception):
+    '''Raised when a method of placing a file is not supported for the
+    file.'''
+    pass
+
+
+def _link_file_atomic(src_path, dest_path):
+    '''Hard link file via temporary link + rename.'''
+    dest_dir_path, dest_file_name = os.path.split(dest_path)
+    # NOTE: Name is unique per thread, so that a stale link (from an
+    # interrupted call) can be removed safely.
+    temp_path = os.path.join(
+        dest_dir_path,
+        f'.{dest_file_name}.{os.getpid()}_{threading.get_ident()}.tmp',
+    )
+    try:
+        os.unlink(temp_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(src_path, temp_path, follow_symlinks=True)
+    except OSError as e:
+        if e.errno in _SET_ERRNO_NO_LINK:
+            raise _UnsupportedMethodError() from e
+        raise
+    try:
+        os.replace(temp_path, dest_path)
+    finally:
+        # NOTE: If the destination already was a hard link to the source,
+        # then the rename does nothing (POSIX) and the temporary link remains.
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+
+
+def _write_file_atomic(src_path, dest_path, write_content):
+    '''Write file via temporary file + rename, using
+    write_content(fd_src, fd_temp) for the content. Copies the permission
+    bits. Removes the temporary file on failure.'''
+    dest_dir_path, dest_file_name = os.path.split(dest_path)
+    with open(src_path, 'rb') as f_src:
+        st_mode = os.fstat(f_src.fileno()).st_mode
+        # NOTE: Hidden file with unique name, in the destination directory
+        # (same filesystem; required for atomic rename).
+        fd_temp, temp_path = tempfile.mkstemp(
+            prefix=f'.{dest_file_name}.', suffix='.tmp',
+            dir=dest_dir_path or None,
+        )
+        try:
+            try:
+                write_content(f_src.fileno(), fd_temp)
+                os.fchmod(fd_temp, stat.S_IMODE(st_mode))
+            finally:
+                os.close(fd_temp)
+            os.replace(temp_path, dest_path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+def _reflink_fd_content(fd_src, fd_dest):
+    '''Clone the content of one file to another, empty file.'''
+    try:
+        # NOTE: fcntl is only available on Unix.
+        import fcntl
+    except ImportError as e:
+        raise _UnsupportedMethodError() from e
+    try:
+        fcntl.ioctl(fd_dest, _FICLONE, fd_src)
+    except OSError as e:
+        if e.errno in _SET_ERRNO_NO_REFLINK:
+            raise _UnsupportedMethodError() from e
+        raise
+
+
+def _copy_fd_content(fd_src, fd_dest):
+    '''
+    Copy the entire content of one file to another, empty file.
+
+    Tries the copy methods in order of efficiency, and falls back to the next
+    method if one is not supported. Every method starts from the beginning of
+    the files.
+    '''
+    if hasattr(os, 'copy_file_range'):
+        try:
+            _copy_fd_content_loop(
+                lambda offset: os.copy_file_range(
+                    fd_src, fd_dest, _COPY_CHUNK_SIZE, offset, offset,
+                ),
+            )
+            return
+        except OSError as e:
+            if e.errno not in _SET_ERRNO_FALLBACK:
+                raise
+            os.ftruncate(fd_dest, 0)
+
+    if hasattr(os, 'sendfile'):
+        try:
+            # NOTE: sendfile() writes at the current position of fd_dest.
+            os.lseek(fd_dest, 0, os.SEEK_SET)
+            _copy_fd_content_loop(
+                lambda offset: os.sendfile(
+                    fd_dest, fd_src, offset, _COPY_CHUNK_SIZE,
+                ),
+            )
+            return
+        except OSError as e:
+            if e.errno not in _SET_ERRNO_FALLBACK:
+                raise
+            os.ftruncate(fd_dest, 0)
+
+    def read_write(offset):
+        mv = memoryview(os.pread(fd_src, 2**20, offset))
+        n_bytes = len(mv)
+        while mv:
+            mv = mv[os.write(fd_dest, mv):]
+        return n_bytes
+
+    os.lseek(fd_dest, 0, os.SEEK_SET)
+    _copy_fd_content_loop(read_write)
+
+
+def _copy_fd_content_loop(copy_chunk):
+    '''Call copy_chunk(offset) --> n_bytes_copied, until it returns zero
+    (end of source file).'''
+    offset = 0
+    while True:
+        n_bytes = copy_chunk(offset)
+        if n_bytes == 0:
+            return
+        offset += n_bytes
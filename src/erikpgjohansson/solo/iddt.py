@@ -7,14 +7,20 @@ Initially created 2020-10-26 by Erik P G Johansson, IRF Uppsala, Sweden.
 '''
 
 
+import collections
 import dataclasses
+import datetime
 import erikpgjohansson.solo.asserts
+import erikpgjohansson.solo.fileops
 import erikpgjohansson.solo.metadata
 import erikpgjohansson.solo.str
+import functools
 import itertools
+import json
 import logging
+import numpy as np
 import os.path
-import shutil
+import typing
 
 
 '''
@@ -167,6 +173,21 @@ assert len(lsDsid) == len(set(lsDsid))
 lsDtdn = tuple(dtdne.dtdn for dtdne in _LS_DTDN_ENTRIES)
 assert len(lsDtdn) == len(set(lsDtdn))
 
+_DC_DSID_DTDN = {
+    dsid: dtdne.dtdn
+    for dtdne in _LS_DTDN_ENTRIES
+    for dsid in dtdne.setDsid
+}
+'''Dictionary DSID-->DTDN for the tabulated special cases. Derived from
+_LS_DTDN_ENTRIES (faster lookup).'''
+
+
+_LS_LEVELS_DTDN = ('L2', 'L3')
+'''Levels whose IDDT subdirectories are instrument/level/DTDN/YYYY/MM.'''
+
+_LS_LEVELS_YMD = ('LL02', 'LL03', 'L1', 'L1R')
+'''Levels whose IDDT subdirectories are instrument/level/YYYY/MM/DD.'''
+
 
 def get_IDDT_subdir(filename, dtdnInclInstrument=True, instrDirCase='lower'):
     '''
@@ -206,9 +227,76 @@ def get_IDDT_subdir(filename, dtdnInclInstrument=True, instrDirCase='lower'):
     if not dsfn:
         return None
 
-    dsid = dsfn.dsid
-    tv1  = dsfn.tv1
+    return _derive_IDDT_subdir(
+        dsfn.dsid, dsfn.tv1, dtdnInclInstrument, instrDirCase,
+    )
+
+
+def get_IDDT_subdirs(
+    lsFilename, dtdnInclInstrument=True, instrDirCase='lower',
+):
+    '''
+    Derive the relative IDDT subdirectory paths for multiple filenames.
+    Faster than calling get_IDDT_subdir() once per filename.
+
+    Unlike get_IDDT_subdir(), does not raise exception for datasets which
+    can not be handled (e.g. HK, or no UTC time in the filename).
+
+
+    Returns
+    -------
+    lsRelDirPath : List. One element per filename. Relative directory path,
+        or None if the filename can not be parsed or the dataset can not be
+        handled.
+    '''
+    assert type(dtdnInclInstrument) is bool
+
+    naBParsed, dcNaFn = erikpgjohansson.solo.metadata.parse_filenames(
+        lsFilename,
+    )
+
+    # IMPLEMENTATION NOTE: Derive the subdirectory only once per unique
+    # combination of DSID and date.
+    dcRelDirPath = {}
+    lsRelDirPath = []
+    for iFile in range(len(lsFilename)):
+        if not naBParsed[iFile]:
+            lsRelDirPath.append(None)
+            continue
+        beginDt64 = dcNaFn['begin_dt64'][iFile]
+        if np.isnat(beginDt64):
+            lsRelDirPath.append(None)
+            continue
+
+        key = (dcNaFn['dsid'][iFile], beginDt64.astype('datetime64[D]'))
+        try:
+            relDirPath = dcRelDirPath[key]
+        except KeyError:
+            dt = key[1].item()
+            try:
+                relDirPath = _derive_IDDT_subdir(
+                    key[0], (dt.year, dt.month, dt.day),
+                    dtdnInclInstrument, instrDirCase,
+                )
+            except Exception:
+                relDirPath = None
+            dcRelDirPath[key] = relDirPath
+        lsRelDirPath.append(relDirPath)
+
+    return lsRelDirPath
+
 
+def _derive_IDDT_subdir(dsid, tv1, dtdnInclInstrument, instrDirCase):
+    '''
+    Derive the relative IDDT subdirectory path from DSID and time.
+    See get_IDDT_subdir().
+
+    Parameters
+    ----------
+    dsid : String.
+    tv1 : Sequence (year, month, day, ...). Only the first three values are
+        used.
+    '''
     _, level, instrument, descriptor = \
         erikpgjohansson.solo.metadata.parse_DSID(dsid)
 
@@ -223,13 +311,13 @@ def get_IDDT_subdir(filename, dtdnInclInstrument=True, instrDirCase='lower'):
     else:
         raise Exception(f'Illegal argument value instrDirCase={instrDirCase}')
 
-    if level in ['L2', 'L3']:
+    if level in _LS_LEVELS_DTDN:
         dtdn = convert_DSID_to_DTDN(
             dsid, includeInstrument=dtdnInclInstrument,
         )
         return os.path.join(instrDirName, level, dtdn, yearStr, monthStr)
 
-    elif level in ['LL02', 'LL03', 'L1', 'L1R']:
+    elif level in _LS_LEVELS_YMD:
         return os.path.join(instrDirName, level, yearStr, monthStr, domStr)
 
     else:
@@ -239,12 +327,109 @@ def get_IDDT_subdir(filename, dtdnInclInstrument=True, instrDirCase='lower'):
         )
 
 
+@dataclasses.dataclass(frozen=True)
+class IddtSubtreeFilter:
+    '''
+    Immutable. Specifies which IDDT subdirectories can contain datasets with
+    a given instrument, level and begin time. Used for pruning directory tree
+    scans, i.e. for only listing the relevant parts of an IDDT.
+
+    The filter is conservative: Directories which do not follow the IDDT
+    conventions below the level directory (e.g. non-numeric year
+    directories) are always selected.
+
+    Fields
+    ------
+    instruments : None, or tuple of instrument names, e.g. ('EPD', 'MAG').
+        Compared case-insensitively with the instrument directory names.
+    levels : None, or tuple of processing levels, e.g. ('L1', 'L2').
+    start_dt64, stop_dt64 : None, or numpy.datetime64. Begin time window
+        (start <= begin time < stop).
+    --
+    NOTE: None means no condition.
+    '''
+    instruments: typing.Optional[tuple] = None
+    levels:      typing.Optional[tuple] = None
+    start_dt64:  typing.Optional[np.datetime64] = None
+    stop_dt64:   typing.Optional[np.datetime64] = None
+
+    def __post_init__(self):
+        for ls_str in (self.instruments, self.levels):
+            if ls_str is not None:
+                assert type(ls_str) is tuple
+                assert all(type(s) is str for s in ls_str)
+        for dt64 in (self.start_dt64, self.stop_dt64):
+            assert dt64 is None or isinstance(dt64, np.datetime64)
+
+    def select_subdir(self, tpl_dir_name) -> bool:
+        '''
+        Whether a subdirectory (relative to the IDDT root directory) may
+        contain matching datasets, directly or in its subdirectories.
+
+        Parameters
+        ----------
+        tpl_dir_name : Tuple of directory names, e.g. ('mag', 'L2', 'mag-rtn',
+            '2020').
+        '''
+        n = len(tpl_dir_name)
+        if n >= 1 and self.instruments is not None:
+            if tpl_dir_name[0].upper() not in {
+                s.upper() for s in self.instruments
+            }:
+                return False
+        if n >= 2 and self.levels is not None:
+            if tpl_dir_name[1] not in self.levels:
+                return False
+        if n < 2 or (self.start_dt64 is None and self.stop_dt64 is None):
+            return True
+
+        level = tpl_dir_name[1]
+        if level in _LS_LEVELS_DTDN:
+            tpl_date_str = tpl_dir_name[3:5]
+        elif level in _LS_LEVELS_YMD:
+            tpl_date_str = tpl_dir_name[2:5]
+        else:
+            return True
+        return self._select_date_dir(tpl_date_str)
+
+    def _select_date_dir(self, tpl_date_str) -> bool:
+        '''Whether a year/month/day directory (given as its tuple of
+        year/month/day directory names; may be empty) overlaps with the time
+        window.'''
+        if not tpl_date_str:
+            return True
+        if not all(
+            s.isdigit() and len(s) == n
+            for s, n in zip(tpl_date_str, (4, 2, 2))
+        ):
+            return True
+
+        unit = 'YMD'[len(tpl_date_str) - 1]
+        try:
+            dir_start_dt64 = np.datetime64('-'.join(tpl_date_str), unit)
+        except ValueError:
+            # CASE: E.g. month 13.
+            return True
+        dir_stop_dt64 = dir_start_dt64 + np.timedelta64(1, unit)
+
+        if self.start_dt64 is not None:
+            if dir_stop_dt64 <= self.start_dt64:
+                return False
+        if self.stop_dt64 is not None:
+            if self.stop_dt64 <= dir_start_dt64:
+                return False
+        return True
+
+
+@functools.lru_cache(maxsize=1024)
 def convert_DSID_to_DTDN(dsid, includeInstrument=False):
     '''
     Convert DSID --> DTDN.
 
     Only applies to L2 & L3 since DTDNs are only defined for L2 & L3.
 
+    NOTE: Cached (bounded LRU cache). Exceptions are not cached.
+
     Arguments:
         includeInstrument
             Whether non-RPW DTDNs should include the instrument name.
@@ -268,9 +453,9 @@ def convert_DSID_to_DTDN(dsid, includeInstrument=False):
         )
 
     # __IF__ a tabulated special case applies, then handle that.
-    for dtdne in _LS_DTDN_ENTRIES:
-        if dsid in dtdne.setDsid:
-            return dtdne.dtdn    # NOTE: EXIT
+    dtdn = _DC_DSID_DTDN.get(dsid)
+    if dtdn is not None:
+        return dtdn    # NOTE: EXIT
 
     # ASSERTION: ALl RPW cases have already been handled.
     if instrument == 'RPW':
@@ -305,6 +490,8 @@ def copy_move_datasets_to_IRFU_dir_tree(
     dirCreationPermissions=0o775,
     dtdnInclInstrument=True,
     instrDirCase='lower',
+    nCopyWorkers=None,
+    manifestPath=None,
 ):
     '''
     ~Utility
@@ -322,6 +509,10 @@ def copy_move_datasets_to_IRFU_dir_tree(
     NOTE: Prints log messages.
     NOTE: Can be useful when called separately from bash wrapper to
           automatically organize/re-organize existing local datasets.
+    NOTE: Consists of planning
+          (plan_copy_move_datasets_to_IRFU_dir_tree()) and executing the
+          resulting manifest (execute_copy_move_manifest()). Using a manifest
+          file makes the operation resumable after interruptions.
 
 
     POSSIBLE ~BUG
@@ -374,12 +565,26 @@ def copy_move_datasets_to_IRFU_dir_tree(
     as in “outfd.write(infd.read())”."
         https://docs.python.org/3/library/shutil.html#shutil-platform-dependent-efficient-copy-operations
     NOTE: brain has python 3.5.2:
+    --
+    NOTE: Now copies using erikpgjohansson.solo.fileops (in-process,
+    kernel-side copy via temporary file + atomic rename, retries with
+    exponential backoff on permission errors), instead of "cp" or
+    shutil.copy().
 
 
     Parameters
     ----------
     mode : String constant.
-        'copy' or 'move'.
+        'copy', 'move', 'link' or 'reflink'.
+        'link'    : Hard link files. Falls back to copying if not possible
+                    (e.g. different filesystems).
+        'reflink' : Clone files (copy-on-write; e.g. btrfs, XFS). Falls back
+                    to hard linking, and then to copying.
+        Linking is useful when source and destination are on the same
+        filesystem, e.g. when publishing generated datasets into another
+        directory tree, or keeping parallel directory trees. See
+        erikpgjohansson.solo.fileops.place_files().
+        NOTE: Hard-linked files are the same files as the source files.
     sourceDir : String
         Directory which will be searched RECURSIVELY for datasets.
         Non-parsable filenames will be ~ignored (no error; logged on stdout).
@@ -388,11 +593,26 @@ def copy_move_datasets_to_IRFU_dir_tree(
     dirCreationPermissions : Integer.
         File permissions for created directories (octal).
         Unclear what is appropriate.
+    nCopyWorkers : None or int >= 1.
+        Number of threads used for copying/linking files (all modes except
+        'move').
+        None: Use erikpgjohansson.solo.fileops.N_COPY_WORKERS.
+    manifestPath : None, or path to JSON manifest file.
+        If the file does not exist, then the plan is written to it before
+        executing it. If it exists (e.g. from an interrupted call), then the
+        plan in it is used and entries already completed according to the
+        journal (manifest path + ".journal") are skipped. The manifest and
+        the journal are removed after successful completion, i.e. the next
+        call plans anew.
+        None: Do not write a manifest or journal.
 
 
     Returns
     -------
-    None.
+    lsOutcome : List of (oldPath, newPath, method), one per copied/moved/
+        linked file. method : The way the file was actually placed at newPath:
+        'copy', 'move', 'link' or 'reflink'. Files which are skipped (copying
+        to itself) are excluded.
     '''
     '''
     ~PROBLEM: Not obvious how to log. Log paths? Just filenames? One/both?
@@ -421,78 +641,97 @@ def copy_move_datasets_to_IRFU_dir_tree(
                       idle).
         PROPOSAL: ~General function that copies with tricks.
         PROPOSAL: Temporary copy which is then moved.
+            -- IMPLEMENTED: erikpgjohansson.solo.fileops.copy_files().
+    '''
+    L = logging.getLogger(__name__)
+
+    if (manifestPath is not None) and os.path.exists(manifestPath):
+        L.info(f'Resuming using pre-existing manifest "{manifestPath}".')
+        manifest = _read_manifest(manifestPath)
+        b_ok = manifest['mode'] == mode
+        b_ok = b_ok and (manifest['source_dir'] == sourceDir)
+        b_ok = b_ok and (manifest['dest_dir'] == destDir)
+        b_ok = b_ok and (
+            manifest['dtdn_incl_instrument'] == dtdnInclInstrument
+        )
+        b_ok = b_ok and (manifest['instr_dir_case'] == instrDirCase)
+        assert b_ok, (
+            f'Pre-existing manifest "{manifestPath}" was created for another'
+            ' mode, source directory, destination directory,'
+            ' dtdnInclInstrument or instrDirCase.'
+        )
+    else:
+        manifest = plan_copy_move_datasets_to_IRFU_dir_tree(
+            mode, sourceDir, destDir,
+            dtdnInclInstrument=dtdnInclInstrument,
+            instrDirCase=instrDirCase,
+            manifestPath=manifestPath,
+        )
+
+    lsOutcome = execute_copy_move_manifest(
+        manifestPath if manifestPath is not None else manifest,
+        dirCreationPermissions=dirCreationPermissions,
+        nCopyWorkers=nCopyWorkers,
+    )
+
+    if manifestPath is not None:
+        # NOTE: Removes the journal first. If interrupted in between, then
+        # the manifest is executed again (repeating completed entries is
+        # harmless), instead of failing on a journal without a manifest.
+        journalPath = f'{manifestPath}.journal'
+        if os.path.exists(journalPath):
+            os.remove(journalPath)
+        os.remove(manifestPath)
+        L.info(f'Completed and removed manifest "{manifestPath}".')
+
+    return lsOutcome
+
+
+_MANIFEST_FORMAT_VERSION = 2
+
+_N_JOURNAL_BATCH_ENTRIES = 1000
+'''Number of manifest entries to copy/link concurrently before journaling
+them. Limits the number of entries which are repeated after an
+interruption.'''
+
+
+def plan_copy_move_datasets_to_IRFU_dir_tree(
+    mode: str, sourceDir, destDir,
+    dtdnInclInstrument=True,
+    instrDirCase='lower',
+    manifestPath=None,
+):
+    '''
+    Plan (but do not execute) copy_move_datasets_to_IRFU_dir_tree(): Find all
+    datasets under the source directory and derive their destination paths.
+    Does not modify any files, except for writing the manifest (optional).
+
+
+    Parameters
+    ----------
+    manifestPath : None, or path to JSON file to which the manifest is
+        written.
+    Other arguments: See copy_move_datasets_to_IRFU_dir_tree().
+
+
+    Returns
+    -------
+    manifest : dict. Can be stored as JSON. Keys:
+        'manifest_format_version', 'created', 'mode', 'source_dir',
+        'dest_dir', 'dtdn_incl_instrument', 'instr_dir_case',
+        'entries' : List of [oldPath, newPath]. One per dataset to
+            copy/move/link.
     '''
     L = logging.getLogger(__name__)
 
     # ASSERTIONS
-    if dirCreationPermissions > 0o777:
-        # Useful for catch if mistakenly using hex literal instead of octal.
-        raise Exception('Illegal dirCreationPermissions.')
+    if mode not in ('copy', 'move', 'link', 'reflink'):
+        raise Exception(f'Illegal mode="{mode}".')
     erikpgjohansson.solo.asserts.is_dir(sourceDir)
     # NOTE: Without this assertion, the function will create the destination
     # directory (not just all the subdirectories)
     erikpgjohansson.solo.asserts.is_dir(destDir)
 
-    def copy_file(oldPath, newDirPath):
-        # Should be able to handle:
-        # * Old & new path being identical.
-        # * Overwriting destination file.
-
-        newPath = os.path.join(newDirPath, os.path.basename(oldPath))
-        oldPath = os.path.realpath(oldPath)
-        newPath = os.path.realpath(newPath)
-        if oldPath == newPath:
-            L.info('    Skipping unnecessary copy to itself.')
-            return
-
-        if 0:
-            # Can not handle copying to itself (is that bad?!).
-            shutil.copy(oldPath, newDirPath)
-            # shutil.copy(oldPath, newPath)
-        else:
-            # EXPERIMENTAL: Attempt at bugfix for failing randomly when copying
-            # many datasets (brain:nas24).
-            # 2020-11-06: Does not seem to help.
-            # IMPLEMENTATION NOTE: "cp" can not handle source and destination
-            # being the same.
-            # NOTE: Can not handle paths with apostrophe.
-            cmd = f"cp '{oldPath}' '{newDirPath}'"
-            errorCode = os.system(cmd)
-            if errorCode != 0:
-                raise Exception(f'Copy command failed: {cmd}')
-
-    def move_file(oldPath, newDirPath):
-        # NOTE: os.replace() is more cross-platform than os.rename().
-        # NOTE: Can handle old & new path being identical.
-        # NOTE: os.rename requires destination to also be a file.
-        newPath = os.path.join(newDirPath, os.path.basename(oldPath))
-        os.replace(oldPath, newPath)
-
-    # verbStr
-    #   String to be printed: "Copying", "Moving".
-    # maxLenOp : implicit argument.
-    def copy_move_file(cmFunc, verbStr, oldPath, newDirPath):
-        L.info(f'{verbStr} file: {oldPath:<{maxLenOp}} --> {newDirPath}')
-
-        cmFunc(oldPath, newDirPath)
-
-    if mode == 'copy':
-        # copyMoveFileFh = lambda oldPath, newDirPath : copy_move_file(
-        #     copy_file, 'Copying', oldPath, newDirPath,
-        # )
-        def copyMoveFileFh(oldPath, newDirPath):
-            copy_move_file(
-                copy_file, 'Copying', oldPath, newDirPath,
-            )
-    elif mode == 'move':
-        # copyMoveFileFh = lambda oldPath, newDirPath : copy_move_file(
-        #     move_file, 'Moving', oldPath, newDirPath,
-        # )
-        def copyMoveFileFh(oldPath, newDirPath):
-            copy_move_file(move_file, 'Moving', oldPath, newDirPath)
-    else:
-        raise Exception(f'Illegal mode="{mode}".')
-
     '''=================================================
     Collect directories to create and files to move/copy
     ====================================================
@@ -500,34 +739,302 @@ def copy_move_datasets_to_IRFU_dir_tree(
     in order to first find errors in order to avoid interrupting the procedure
     half-way.
     Ex: Finding DSIDs that the code can not handle.'''
-    pathTable = []
-    maxLenOp = 0
+    lsOldDirPath = []
+    lsFilename   = []
     for (oldDirPath, _dirnameList, filenameList) in os.walk(sourceDir):
         for filename in filenameList:
-            oldPath = os.path.join(oldDirPath, filename)
-            maxLenOp = max(len(oldPath), maxLenOp)
+            lsOldDirPath.append(oldDirPath)
+            lsFilename.append(filename)
 
-            relDirPath = get_IDDT_subdir(
-                filename,
-                dtdnInclInstrument=dtdnInclInstrument,
-                instrDirCase=instrDirCase,
+    # IMPLEMENTATION NOTE: Parse all filenames at once (faster), and derive
+    # the subdirectory only once per unique combination of DSID and date.
+    naBParsed, dcNaFn = erikpgjohansson.solo.metadata.parse_filenames(
+        lsFilename,
+    )
+    dcRelDirPath = {}
+
+    lsEntry = []
+    for iFile, (oldDirPath, filename) in enumerate(
+        zip(lsOldDirPath, lsFilename),
+    ):
+        oldPath = os.path.join(oldDirPath, filename)
+
+        if naBParsed[iFile]:
+            dsid      = dcNaFn['dsid'][iFile]
+            beginDt64 = dcNaFn['begin_dt64'][iFile]
+            if np.isnat(beginDt64):
+                raise Exception(
+                    f'Can not generate IDDT subdirectory for filename'
+                    f' without UTC: {filename}',
+                )
+            key = (dsid, beginDt64.astype('datetime64[D]'))
+            try:
+                relDirPath = dcRelDirPath[key]
+            except KeyError:
+                # tv1 = (year, month, day)
+                dt = key[1].item()
+                relDirPath = dcRelDirPath[key] = _derive_IDDT_subdir(
+                    dsid, (dt.year, dt.month, dt.day),
+                    dtdnInclInstrument, instrDirCase,
+                )
+
+            newPath = os.path.join(destDir, relDirPath, filename)
+            lsEntry.append([oldPath, newPath])
+
+        else:
+            L.info(
+                f'Can not identify file and therefore'
+                f' not copy/move it: {oldPath}',
             )
-            if relDirPath:
-                newDirPath = os.path.join(destDir, relDirPath)
-                newPath    = os.path.join(newDirPath, filename)
 
-                pathTable.append((newDirPath, oldPath, newPath))
+    manifest = {
+        'manifest_format_version': _MANIFEST_FORMAT_VERSION,
+        'created':    datetime.datetime.now().isoformat(),
+        'mode':       mode,
+        'source_dir': sourceDir,
+        'dest_dir':   destDir,
+        'dtdn_incl_instrument': dtdnInclInstrument,
+        'instr_dir_case':       instrDirCase,
+        'entries':    lsEntry,
+    }
+
+    if manifestPath is not None:
+        # NOTE: Write atomically, so that a partially written manifest is
+        # never used for resuming.
+        tempPath = f'{manifestPath}.tmp'
+        with open(tempPath, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tempPath, manifestPath)
+        L.info(f'Wrote manifest with {len(lsEntry)} entries: {manifestPath}')
+
+    return manifest
+
+
+def execute_copy_move_manifest(
+    manifest,
+    dirCreationPermissions=0o775,
+    nCopyWorkers=None,
+    journalPath=None,
+):
+    '''
+    Execute a manifest created by plan_copy_move_datasets_to_IRFU_dir_tree().
+
+    Every executed entry is recorded in a journal (if used). Entries which
+    are already recorded in the journal are skipped, i.e. the same manifest
+    can be executed again after an interruption (crash, killed process) and
+    then continues where it stopped.
+
+    Destination directories are created once per unique directory (not once
+    per file).
+
+    NOTE: Entries copied/linked concurrently are journaled in batches (see
+    _N_JOURNAL_BATCH_ENTRIES). After an interruption, the last batch may be
+    copied/linked again. Moves are journaled individually. A move whose
+    source no longer exists, but whose destination does, is regarded as
+    completed (interrupted before journaling).
+
+
+    Parameters
+    ----------
+    manifest : dict (returned from
+        plan_copy_move_datasets_to_IRFU_dir_tree()), or path to JSON file
+        (written by it).
+    journalPath : None, or path to journal file. Is created if it does not
+        exist.
+        None: If "manifest" is a path, then use the manifest path +
+        ".journal". Otherwise, do not use a journal.
+    Other arguments: See copy_move_datasets_to_IRFU_dir_tree().
+
+
+    Returns
+    -------
+    lsOutcome : See copy_move_datasets_to_IRFU_dir_tree(). Only includes
+        entries executed in this call (not skipped entries).
+    '''
+    '''
+    PROPOSAL: Store the method used (e.g. fall back to copy) in the manifest
+              too.
+    '''
+    L = logging.getLogger(__name__)
+
+    # ASSERTIONS
+    if dirCreationPermissions > 0o777:
+        # Useful for catch if mistakenly using hex literal instead of octal.
+        raise Exception('Illegal dirCreationPermissions.')
 
-            else:
+    if type(manifest) is not dict:
+        if journalPath is None:
+            journalPath = f'{manifest}.journal'
+        manifest = _read_manifest(manifest)
+    mode    = manifest['mode']
+    lsEntry = manifest['entries']
+
+    # ==================================
+    # Read journal: Skip completed entries
+    # ==================================
+    setIEntryDone = set()
+    if journalPath is not None:
+        setIEntryDone = _read_journal(journalPath, manifest['created'])
+    lsIEntry = [i for i in range(len(lsEntry)) if i not in setIEntryDone]
+    L.info(
+        f'Executing manifest created {manifest["created"]}:'
+        f' {len(lsIEntry)} entries, skipping {len(setIEntryDone)}'
+        ' already completed entries.',
+    )
+
+    # ============================================
+    # Create directories (once per unique directory)
+    # ============================================
+    # NOTE: Can handle pre-existing destination directory.
+    for newDirPath in sorted({
+        os.path.dirname(lsEntry[i][1]) for i in lsIEntry
+    }):
+        os.makedirs(newDirPath, mode=dirCreationPermissions, exist_ok=True)
+
+    # ===============================
+    # Copy/move/link files, and journal
+    # ===============================
+    verbStr = {
+        'copy': 'Copying', 'move': 'Moving', 'link': 'Linking',
+        'reflink': 'Reflinking',
+    }[mode]
+    maxLenOp = max((len(lsEntry[i][0]) for i in lsIEntry), default=0)
+
+    # List of (oldPath, newPath, method).
+    lsOutcome = []
+    fJournal = None
+    try:
+        if journalPath is not None:
+            fJournal = open(journalPath, 'a')
+            if not setIEntryDone and fJournal.tell() == 0:
+                fJournal.write(f'# {manifest["created"]}\n')
+
+        def journal(lsIEntryDone, lsMethod):
+            if fJournal is not None:
+                fJournal.write(''.join(
+                    f'{i} {method}\n'
+                    for i, method in zip(lsIEntryDone, lsMethod)
+                ))
+                fJournal.flush()
+
+        if mode == 'move':
+            for i in lsIEntry:
+                oldPath, newPath = lsEntry[i]
                 L.info(
-                    f'Can not identify file and therefore'
-                    f' not copy/move it: {oldPath}',
+                    f'{verbStr} file: {oldPath:<{maxLenOp}}'
+                    f' --> {os.path.dirname(newPath)}',
                 )
+                if not os.path.lexists(oldPath) and os.path.lexists(newPath):
+                    # CASE: Interrupted after moving, before journaling.
+                    L.info('    Already moved.')
+                else:
+                    # NOTE: os.replace() is more cross-platform than
+                    # os.rename().
+                    # NOTE: Can handle old & new path being identical.
+                    # NOTE: os.rename requires destination to also be a file.
+                    os.replace(oldPath, newPath)
+                journal([i], ['move'])
+                lsOutcome.append((oldPath, newPath, 'move'))
+        else:
+            for iBegin in range(0, len(lsIEntry), _N_JOURNAL_BATCH_ENTRIES):
+                lsIEntryBatch = lsIEntry[
+                    iBegin:iBegin + _N_JOURNAL_BATCH_ENTRIES
+                ]
+                lsOutcome.extend(_place_files_batch(
+                    mode, verbStr, maxLenOp, lsEntry, lsIEntryBatch,
+                    nCopyWorkers, journal,
+                ))
+    finally:
+        if fJournal is not None:
+            fJournal.close()
+
+    cntMethod = collections.Counter(method for _, _, method in lsOutcome)
+    strMethodCounts = ', '.join(
+        f'{method}={n}' for method, n in sorted(cntMethod.items())
+    )
+    L.info(f'Number of files per method: {strMethodCounts}')
 
-    # =================================
-    # Create directories and move files
-    # =================================
-    for (newDirPath, oldPath, newPath) in pathTable:
-        # NOTE: Can handle pre-existing destination directory.
-        os.makedirs(newDirPath, mode=dirCreationPermissions, exist_ok=True)
-        copyMoveFileFh(oldPath, newDirPath)
+    return lsOutcome
+
+
+def _place_files_batch(
+    mode, verbStr, maxLenOp, lsEntry, lsIEntry, nCopyWorkers, journal,
+):
+    '''Copy/link one batch of manifest entries concurrently, and journal
+    them (including entries skipped since copying to itself).'''
+    L = logging.getLogger(__name__)
+
+    # Should be able to handle:
+    # * Old & new path being identical.
+    # * Overwriting destination file.
+    lsIEntryPlace = []
+    lsIEntrySkip  = []
+    for i in lsIEntry:
+        oldPath, newPath = lsEntry[i]
+        L.info(
+            f'{verbStr} file: {oldPath:<{maxLenOp}}'
+            f' --> {os.path.dirname(newPath)}',
+        )
+        if os.path.realpath(oldPath) == os.path.realpath(newPath):
+            L.info('    Skipping unnecessary copy to itself.')
+            lsIEntrySkip.append(i)
+        else:
+            lsIEntryPlace.append(i)
+    journal(lsIEntrySkip, ['skip'] * len(lsIEntrySkip))
+
+    lsOutcome = []
+    if lsIEntryPlace:
+        lsOldNewPath = [tuple(lsEntry[i]) for i in lsIEntryPlace]
+        lsMethod = erikpgjohansson.solo.fileops.place_files(
+            mode, lsOldNewPath, n_workers=nCopyWorkers,
+        )
+        journal(lsIEntryPlace, lsMethod)
+        for (oldPath, newPath), method in zip(lsOldNewPath, lsMethod):
+            if method != mode:
+                L.info(f'Fell back to {method}: {oldPath} --> {newPath}')
+            lsOutcome.append((oldPath, newPath, method))
+
+    return lsOutcome
+
+
+def _read_manifest(manifestPath):
+    with open(manifestPath) as f:
+        manifest = json.load(f)
+    assert manifest['manifest_format_version'] == _MANIFEST_FORMAT_VERSION, \
+        'Unsupported manifest format version.'
+    return manifest
+
+
+def _read_journal(journalPath, created):
+    '''
+    Read journal, if it exists.
+
+    NOTE: Removes an incomplete last line (interrupted while writing), so
+    that the journal can be appended to.
+
+
+    Returns
+    -------
+    setIEntryDone : Set of indices of completed manifest entries.
+    '''
+    setIEntryDone = set()
+    if not os.path.exists(journalPath):
+        return setIEntryDone
+
+    with open(journalPath) as f:
+        lsLine = f.read().split('\n')
+    if lsLine[-1]:
+        # NOTE: Journal only contains ASCII. ==> n_chars = n_bytes.
+        os.truncate(journalPath, sum(len(line) + 1 for line in lsLine[:-1]))
+
+    # NOTE: Only checks a complete first line (header).
+    if len(lsLine) > 1:
+        assert lsLine[0] == f'# {created}', (
+            f'Journal "{journalPath}" does not belong to the manifest'
+            f' created {created}.'
+        )
+    # NOTE: The last element is an empty string, or an incomplete line.
+    for line in lsLine[1:-1]:
+        setIEntryDone.add(int(line.split(' ')[0]))
+
+    return setIEntryDone
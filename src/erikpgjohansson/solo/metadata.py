@@ -9,7 +9,14 @@ IRF Uppsala, Sweden.
 '''
 
 
+import dataclasses
+import datetime
 import erikpgjohansson.solo.str
+import functools
+import logging
+import numpy as np
+import re
+import types
 
 
 '''
@@ -37,11 +44,43 @@ _RE_YYYYMMDDThhmmssddd = '[0-9]{8,8}T[0-9]{6,9}'
 # may use, but empirically it is always ten.
 _RE_OBT                = '[0-9]{10,10}'
 
-
+# Compiled regexps for every time interval string format. Used by
+# _parse_time_interval_str() after dispatching on string length and
+# separator positions.
+_RC_YYYY        = re.compile(_RE_YYYY)
+_RC_YYYYMM      = re.compile(_RE_YYYYMM)
+_RC_YYYYMMDD    = re.compile(_RE_YYYYMMDD)
+_RC_YYYYMMDD_YYYYMMDD = re.compile(f'{_RE_YYYYMMDD}-{_RE_YYYYMMDD}')
+_RC_YYYYMMDDThhmmssddd = re.compile(_RE_YYYYMMDDThhmmssddd)
+_RC_YYYYMMDDThhmmss_YYYYMMDDThhmmss = re.compile(
+    f'{_RE_YYYYMMDDThhmmss}-{_RE_YYYYMMDDThhmmss}',
+)
+_RC_OBT_OBT     = re.compile(f'{_RE_OBT}-{_RE_OBT}')
+
+# Max number of cached return values for functions which are called many
+# times with the same arguments (functools.lru_cache).
+_CACHE_MAXSIZE = 4096
+
+# Entire dataset filename.
+# IMPLEMENTATION NOTE: The DSID must be matched non-greedily so that an
+# optional "-cdag" at its end is matched by the separate group. The rest of
+# the filename is unambiguous since the time interval string can not contain
+# underscore.
+_RE_FILENAME = re.compile(
+    r'(?P<dsid>.*?)(?P<cdag>-cdag)?'
+    f'_(?P<time_interval_str>{_RE_TIME_INTERVAL_STR})'
+    r'_V(?P<version_str>[0-9][0-9]+)[CIU]?\.(cdf|fits|bin)',
+)
+
+
+@dataclasses.dataclass(frozen=True, slots=True, repr=False)
 class DatasetFilename:
     '''Class which represents (some of) the content of a dataset filename
     which follows official filenaming conventions.
 
+    Immutable. Uses __slots__ to save memory since there may be very many
+    instances (one per dataset file).
+
     Note: The class does not contain all the information in the dataset
     filename.
 
@@ -57,28 +96,41 @@ class DatasetFilename:
         PROBLEM: LL "I" and "C" could maybe be considered part of "version".
     '''
 
-    def __init__(
-        self, dsid, time_interval_str, tv1, item_id, version_str,
-    ):
-        # Always upper case. (Excludes CDAG.)
-        self.dsid              = dsid
-        self.time_interval_str = time_interval_str
-        # Tuple.(year, month, day, hour, minute, second)
-        self.tv1               = tv1
-        # String. Ex: 'solo_HK_rpw-bia_20200301'
-        # As defined by SDT.
-        self.item_id           = item_id
-        # String. Ex: '02'.
-        self.version_str       = version_str
-
-    def __eq__(self, other):
-        '''Useful for tests.
-        '''
-        # NOTE: Do not permit any difference in class.
-        if type(self) is not type(other):
-            return False
-        else:
-            return self.__dict__ == other.__dict__
+    # Always upper case. (Excludes CDAG.)
+    dsid: str
+    time_interval_str: str
+    # Tuple.(year, month, day, hour, minute, second)
+    tv1: tuple
+    # String. Ex: 'solo_HK_rpw-bia_20200301'
+    # As defined by SDT.
+    item_id: str
+    # String. Ex: '02'.
+    version_str: str
+
+    # Fields derived from the above (precomputed). Not compared since they
+    # are redundant.
+    # Integer. Ex: 2.
+    version_nbr: int = dataclasses.field(init=False, compare=False)
+    # String. None if parse_DSID() can not parse the DSID. Ex: 'L2'.
+    level: str = dataclasses.field(init=False, compare=False)
+    # String. None if parse_DSID() can not parse the DSID. Ex: 'MAG'.
+    instrument: str = dataclasses.field(init=False, compare=False)
+    # numpy.datetime64[ms]. Begin time (UTC) according to tv1, with integer
+    # seconds. NaT if tv1 is OBT or not a valid date/time.
+    begin_dt64: np.datetime64 = dataclasses.field(init=False, compare=False)
+
+    def __post_init__(self):
+        # NOTE: Frozen dataclass. ==> Must use object.__setattr__().
+        level, instrument = _parse_DSID_level_instrument(self.dsid)
+        try:
+            begin_dt64 = _convert_TV1_to_DT64(self.tv1)
+        except ValueError:
+            # CASE: Non-existent date/time, e.g. "20200230".
+            begin_dt64 = np.datetime64('NaT', 'ms')
+        object.__setattr__(self, 'version_nbr', int(self.version_str))
+        object.__setattr__(self, 'level',       level)
+        object.__setattr__(self, 'instrument',  instrument)
+        object.__setattr__(self, 'begin_dt64',  begin_dt64)
 
     def __repr__(self):
         s = (
@@ -195,30 +247,22 @@ class DatasetFilename:
         /SOL-SGS-ICD-0005, "Solar Orbiter Interface Control Document for Low
         Latency Data FITS Files", 1/5, SOL-SGS-ICD-0005-LLFITSICD-1.5draft.pdf
         '''
-        ls_str, remaining_str, b_perfect_match = \
-            erikpgjohansson.solo.str.regexp_str_parts(
-                filename, [
-                    '.*',                    # 0
-                    '(|-cdag)',
-                    '_',
-                    _RE_TIME_INTERVAL_STR,   # 3
-                    '_V',
-                    '[0-9][0-9]+',           # 5
-                    '[CIU]?',
-                    r'\.(cdf|fits|bin)',
-                ],
-                -1, 'permit non-match',
-            )
-
-        if not b_perfect_match:
+        # IMPLEMENTATION NOTE: Uses one precompiled regular expression
+        # (_RE_FILENAME) for the entire filename, since this function is
+        # called once per file/dataset (many times). Equivalent to the earlier
+        # implementation which used
+        # erikpgjohansson.solo.str.regexp_str_parts() (backward search) with
+        # the same sub-regexps, except for strings containing line feeds.
+        mo = _RE_FILENAME.fullmatch(filename)
+        if not mo:
             return None
 
         # NOTE: Does not store any separate flag for CDAG/non-CDAG. Only
         #       tolerates it.
-        item_id           = ''.join(ls_str[0:1] + ls_str[2:4])
-        dsid              = ls_str[0].upper()
-        time_interval_str = ls_str[3]
-        version_str       = ls_str[5]
+        time_interval_str = mo.group('time_interval_str')
+        item_id           = mo.group('dsid') + '_' + time_interval_str
+        dsid              = mo.group('dsid').upper()
+        version_str       = mo.group('version_str')
 
         tv1 = _parse_time_interval_str(time_interval_str)
         if tv1 is None:
@@ -231,10 +275,173 @@ class DatasetFilename:
         return dsfn
 
 
+def parse_filenames(filenames):
+    '''
+    Parse many dataset filenames at once (bulk version of
+    DatasetFilename.parse_filename()), and return the results as columns
+    (1D numpy arrays).
+
+    Faster than calling DatasetFilename.parse_filename() per filename since
+    time interval strings and DSIDs (which are shared by many datasets) are
+    only parsed once per unique value.
+
+    Parameters
+    ----------
+    filenames : Iterable of strings.
+
+    Returns
+    -------
+    (na_b_parsed, dc_na)
+    na_b_parsed : 1D numpy bool array.
+        Whether each filename could be parsed, i.e. whether
+        DatasetFilename.parse_filename() returns non-None. Values in dc_na
+        for non-parsed filenames are undefined ("masked"): None, -1 or NaT.
+        NOTE: Exception: Filenames with non-existent dates/times (e.g.
+        "20200230") are logged and regarded as not parsed, so that single
+        stray files do not prevent parsing all other filenames.
+    dc_na : Dictionary of 1D numpy arrays (same length).
+        'dsid'        : object (str). Uppercase. Excludes -CDAG.
+        'item_id'     : object (str).
+        'version_nbr' : int64.
+        'begin_dt64'  : datetime64[ms]. Begin time (UTC) according to the
+                        filename, with integer seconds. NaT if the filename
+                        does not contain UTC (OBT).
+        'level'       : object (str). None if parse_DSID() can not parse the
+                        DSID.
+        'instrument'  : object (str). None if parse_DSID() can not parse the
+                        DSID.
+    '''
+    '''
+    PROPOSAL: Return DST.
+        CON: Module is not SOAR-specific.
+    '''
+    L = logging.getLogger(__name__)
+
+    NAT = np.datetime64('NaT', 'ms')
+
+    # Match all filenames, and collect the unique time interval strings.
+    ls_groups = []
+    dc_tis_dt64 = {}
+    for filename in filenames:
+        mo = _RE_FILENAME.fullmatch(filename)
+        if mo:
+            groups = mo.group(
+                'dsid', 'time_interval_str', 'version_str',
+            ) + (filename,)
+            dc_tis_dt64[groups[1]] = None
+        else:
+            groups = None
+        ls_groups.append(groups)
+
+    # Parse all unique time interval strings at once (vectorized).
+    # None : Can not parse.
+    ls_tis = list(dc_tis_dt64)
+    na_b_tis_parsed, na_tis_dt64 = _parse_time_interval_strs(ls_tis)
+    for tis, b_parsed, dt64 in zip(ls_tis, na_b_tis_parsed, na_tis_dt64):
+        dc_tis_dt64[tis] = dt64 if b_parsed else None
+    # Set of time interval strings with non-existent dates/times.
+    set_tis_invalid = {
+        tis for tis, b_parsed in zip(ls_tis, na_b_tis_parsed)
+        if not b_parsed and _parse_time_interval_str(tis) is not None
+    }
+
+    # Cache. One entry per unique value.
+    dc_dsid_level_instrument = {}
+
+    ls_b_parsed   = []
+    ls_dsid       = []
+    ls_item_id    = []
+    ls_version    = []
+    ls_begin_dt64 = []
+    ls_level      = []
+    ls_instrument = []
+    for groups in ls_groups:
+        if groups:
+            dsid_fn, tis, version_str, filename = groups
+            begin_dt64 = dc_tis_dt64[tis]
+            if tis in set_tis_invalid:
+                L.warning(
+                    'Skipping dataset filename with non-existent date/time:'
+                    f' "{filename}"',
+                )
+        else:
+            begin_dt64 = None
+
+        if begin_dt64 is None:
+            ls_b_parsed.append(False)
+            ls_dsid.append(None)
+            ls_item_id.append(None)
+            ls_version.append(-1)
+            ls_begin_dt64.append(NAT)
+            ls_level.append(None)
+            ls_instrument.append(None)
+            continue
+
+        dsid = dsid_fn.upper()
+        try:
+            level, instrument = dc_dsid_level_instrument[dsid]
+        except KeyError:
+            level, instrument = dc_dsid_level_instrument[dsid] = \
+                _parse_DSID_level_instrument(dsid)
+
+        ls_b_parsed.append(True)
+        ls_dsid.append(dsid)
+        ls_item_id.append(dsid_fn + '_' + tis)
+        ls_version.append(int(version_str))
+        ls_begin_dt64.append(begin_dt64)
+        ls_level.append(level)
+        ls_instrument.append(instrument)
+
+    def object_NA(ls):
+        # NOTE: np.array() could create a non-1D array from sequences.
+        na = np.empty(len(ls), dtype=object)
+        na[:] = ls
+        return na
+
+    na_b_parsed = np.array(ls_b_parsed, dtype=bool)
+    dc_na = {
+        'dsid':        object_NA(ls_dsid),
+        'item_id':     object_NA(ls_item_id),
+        'version_nbr': np.array(ls_version,    dtype='int64'),
+        'begin_dt64':  np.array(ls_begin_dt64, dtype='datetime64[ms]'),
+        'level':       object_NA(ls_level),
+        'instrument':  object_NA(ls_instrument),
+    }
+    return na_b_parsed, dc_na
+
+
+def _convert_TV1_to_DT64(tv1):
+    '''Convert time vector (as returned by _parse_time_interval_str()) to
+    numpy.datetime64[ms] with integer seconds. OBT is converted to NaT.'''
+    if len(tv1) != 6:
+        # CASE: OBT
+        return np.datetime64('NaT', 'ms')
+    # NOTE: datetime.datetime requires integer seconds+microseconds
+    # in separate arguments (as integers). Filenames should only
+    # contain time with microseconds=0 so we ignore them.
+    tv1 = list(tv1)
+    tv1[5] = int(tv1[5])
+    return np.datetime64(datetime.datetime(*tv1), 'ms')
+
+
+def _parse_DSID_level_instrument(dsid):
+    '''Return (level, instrument) from parse_DSID(), or (None, None) if
+    parse_DSID() can not parse the DSID.'''
+    try:
+        _, level, instrument, _ = parse_DSID(dsid)
+    except Exception:
+        return None, None
+    return level, instrument
+
+
+@functools.lru_cache(maxsize=_CACHE_MAXSIZE)
 def parse_item_ID(item_id: str):
     '''
     Parse an "item ID" as SOAR defines it.
 
+    NOTE: Cached (bounded LRU cache). The returned value is therefore
+    immutable.
+
     NOTE: Does not support the RPW consortium-internal "-CDAG" extension to
     the official filenaming conventions, since the "item ID" is not a
     filename, and is only relevant in the contect of SOAR.
@@ -245,7 +452,7 @@ def parse_item_ID(item_id: str):
 
     Returns
     -------
-    Dictionary: if can parse string.
+    Immutable dictionary (types.MappingProxyType): if can parse string.
     None: if can not parse string.
     '''
     '''
@@ -269,7 +476,60 @@ def parse_item_ID(item_id: str):
     if tv1 is None:
         return None
 
-    return {'DSID': dsid, 'time vector 1': tv1}
+    return types.MappingProxyType({'DSID': dsid, 'time vector 1': tv1})
+
+
+def parse_item_IDs(item_ids):
+    '''
+    Parse many item IDs at once (bulk version of parse_item_ID()).
+
+    Faster than calling parse_item_ID() per item ID since time interval
+    strings are only parsed once per unique value (vectorized).
+
+    NOTE: Like parse_item_ID(), item IDs with non-existent dates/times
+    (e.g. "20200230") are parsed.
+
+    Parameters
+    ----------
+    item_ids : Iterable of strings.
+
+    Returns
+    -------
+    (na_b_parsed, na_dsid)
+    na_b_parsed : 1D numpy bool array. Whether each item ID could be parsed.
+    na_dsid : 1D numpy object (str) array. Uppercase. None for item IDs which
+        could not be parsed.
+    '''
+    # IMPLEMENTATION NOTE: The time interval string can not contain
+    # underscore. The DSID is therefore everything before the last
+    # underscore (same as the backward search in parse_item_ID()).
+    ls_dsid_tis = []
+    dc_tis_b_parsed = {}
+    for item_id in item_ids:
+        dsid, sep, tis = item_id.rpartition('_')
+        if sep:
+            ls_dsid_tis.append((dsid, tis))
+            dc_tis_b_parsed[tis] = None
+        else:
+            ls_dsid_tis.append(None)
+
+    ls_tis = list(dc_tis_b_parsed)
+    na_b_tis_parsed, _ = _parse_time_interval_strs(ls_tis)
+    # NOTE: _parse_time_interval_strs() does not parse non-existent
+    # dates/times. ==> Check those strings using the scalar parser.
+    dc_tis_b_parsed = {
+        tis: b_parsed or (_parse_time_interval_str(tis) is not None)
+        for tis, b_parsed in zip(ls_tis, na_b_tis_parsed.tolist())
+    }
+
+    na_b_parsed = np.zeros(len(ls_dsid_tis), dtype=bool)
+    na_dsid = np.empty(len(ls_dsid_tis), dtype=object)
+    for i, dsid_tis in enumerate(ls_dsid_tis):
+        if dsid_tis and dc_tis_b_parsed[dsid_tis[1]]:
+            na_b_parsed[i] = True
+            na_dsid[i] = dsid_tis[0].upper()
+
+    return na_b_parsed, na_dsid
 
 
 def _parse_time_interval_str(time_interval_str: str):
@@ -342,80 +602,161 @@ def _parse_time_interval_str(time_interval_str: str):
         return (int(s),)   # Return size-1 tuple!
 
     # ====================================================================
-    # Try parsing time interval string, by trying one format after another
+    # Parse time interval string
     # ====================================================================
+    # IMPLEMENTATION NOTE: The format is uniquely determined by the string
+    # length and the separator at index 8 (if any). Therefore only tries
+    # (at most) one compiled regexp (fullmatch) instead of trying one format
+    # after another. Is called once per unique time interval string (many
+    # times).
+    #
+    # Lengths: YYYY=4, YYYYMM=6, YYYYMMDD=8, YYYYMMDD-YYYYMMDD=17,
+    # YYYYMMDDThhmmss[ddd]=15-18, YYYYMMDDThhmmss-YYYYMMDDThhmmss=31,
+    # OBT-OBT=21.
+    s = time_interval_str
+    n = len(s)
+    if n == 4:
+        if _RC_YYYY.fullmatch(s):
+            return parse_YYYY(s) + (1, 1, 0, 0, 0.0)
+    elif n == 6:
+        if _RC_YYYYMM.fullmatch(s):
+            return parse_YYYYMM(s) + (1, 0, 0, 0.0)
+    elif n == 8:
+        if _RC_YYYYMMDD.fullmatch(s):
+            return parse_YYYYMMDD(s) + (0, 0, 0.0)
+    elif n == 17 and s[8] == '-':
+        if _RC_YYYYMMDD_YYYYMMDD.fullmatch(s):
+            return parse_YYYYMMDD(s[0:8]) + (0, 0, 0.0)
+    elif 15 <= n <= 18 and s[8] == 'T':
+        if _RC_YYYYMMDDThhmmssddd.fullmatch(s):
+            return parse_YYYYMMDDThhmmssddd(s)
+    elif n == 31 and s[8] == 'T':
+        if _RC_YYYYMMDDThhmmss_YYYYMMDDThhmmss.fullmatch(s):
+            return parse_YYYYMMDDThhmmssddd(s[0:15])
+    elif n == 21 and s[10] == '-':
+        # LL01 filenames contain OBT, not UTC.
+        if _RC_OBT_OBT.fullmatch(s):
+            return parse_OBT(s[0:10])
 
-    _, _, b_perfect_match = \
-        erikpgjohansson.solo.str.regexp_str_parts(
-            time_interval_str,
-            [_RE_YYYY],
-            1, 'permit non-match',
-        )
-    if b_perfect_match:
-        return parse_YYYY(time_interval_str) + (1, 1, 0, 0, 0.0)
-
-    _, _, b_perfect_match = \
-        erikpgjohansson.solo.str.regexp_str_parts(
-            time_interval_str,
-            [_RE_YYYYMM],
-            1, 'permit non-match',
-        )
-    if b_perfect_match:
-        return parse_YYYYMM(time_interval_str) + (1, 0, 0, 0.0)
-
-    _, _, b_perfect_match = \
-        erikpgjohansson.solo.str.regexp_str_parts(
-            time_interval_str,
-            [_RE_YYYYMMDD],
-            1, 'permit non-match',
-        )
-    if b_perfect_match:
-        return parse_YYYYMMDD(time_interval_str) + (0, 0, 0.0)
-
-    ls_str, _, b_perfect_match = \
-        erikpgjohansson.solo.str.regexp_str_parts(
-            time_interval_str,
-            [_RE_YYYYMMDD, '-', _RE_YYYYMMDD],
-            1, 'permit non-match',
-        )
-    if b_perfect_match:
-        return parse_YYYYMMDD(ls_str[0]) + (0, 0, 0.0)
-
-    ls_str, _, b_perfect_match = \
-        erikpgjohansson.solo.str.regexp_str_parts(
-            time_interval_str,
-            [_RE_YYYYMMDDThhmmssddd],
-            1, 'permit non-match',
-        )
-    if b_perfect_match:
-        return parse_YYYYMMDDThhmmssddd(ls_str[0])
+    return None
 
-    ls_str, _, b_perfect_match = \
-        erikpgjohansson.solo.str.regexp_str_parts(
-            time_interval_str,
-            [_RE_YYYYMMDDThhmmss, '-', _RE_YYYYMMDDThhmmss],
-            1, 'permit non-match',
-        )
-    if b_perfect_match:
-        return parse_YYYYMMDDThhmmssddd(ls_str[0])
 
-    # LL01 filenames contain OBT, not UTC.
-    ls_str, _, b_perfect_match = \
-        erikpgjohansson.solo.str.regexp_str_parts(
-            time_interval_str,
-            [_RE_OBT, '-', _RE_OBT],
-            1, 'permit non-match',
-        )
-    if b_perfect_match:
-        return parse_OBT(ls_str[0])
+def _parse_time_interval_strs(ls_tis):
+    '''
+    Vectorized version of _parse_time_interval_str() which returns the
+    (first) timestamp as numpy.datetime64[ms] directly (same value as
+    _convert_TV1_to_DT64(_parse_time_interval_str(tis))).
 
-    return None
+    IMPLEMENTATION NOTE: Operates on the characters (Unicode code points) of
+    all strings at once as a 2D integer array. Does not use any regexps.
 
+    Parameters
+    ----------
+    ls_tis : Sequence of strings.
 
+    Returns
+    -------
+    (na_b_parsed, na_dt64)
+    na_b_parsed : 1D numpy bool array.
+        Whether _parse_time_interval_str() returns non-None, and (for UTC)
+        the string is a valid date/time, i.e. False for e.g. "20200230" (for
+        which _convert_TV1_to_DT64() raises ValueError).
+    na_dt64 : 1D numpy datetime64[ms] array.
+        Begin time (UTC) with integer seconds. NaT for OBT and for strings
+        which can not be parsed.
+    '''
+    # Max length of any time interval string format.
+    N_MAX = 31
+
+    na_len = np.fromiter(map(len, ls_tis), dtype=np.int64, count=len(ls_tis))
+    na_b_len_ok = na_len <= N_MAX
+    # NOTE: Using the real string lengths (na_len) so that strings with
+    # characters which numpy handles specially (trailing NUL) are not
+    # misinterpreted.
+    na_tis = np.array(
+        [tis if b else '' for tis, b in zip(ls_tis, na_b_len_ok)],
+        dtype=f'U{N_MAX}',
+    )
+    # 2D array (n_strings, N_MAX) of code points. Zero-padded.
+    na_c = na_tis.view(np.uint32).reshape(-1, N_MAX).astype(np.int64)
+    na_d = na_c - ord('0')
+    na_b_digit = (na_d >= 0) & (na_d <= 9)
+    # Whether each character position is within the string.
+    na_b_in_str = np.arange(N_MAX)[None, :] < na_len[:, None]
+
+    def all_digits(i1, i2):
+        return np.all(na_b_digit[:, i1:i2], axis=1)
+
+    def char_is(i, c):
+        return na_c[:, i] == ord(c)
+
+    def number(i1, i2):
+        na = np.zeros(na_c.shape[0], dtype=np.int64)
+        for i in range(i1, i2):
+            na = 10 * na + na_d[:, i]
+        return na
+
+    na_b_date = all_digits(0, 8)
+    na_b_YYYY = (na_len == 4) & all_digits(0, 4)
+    na_b_YYYYMM = (na_len == 6) & all_digits(0, 6)
+    na_b_YYYYMMDD = (na_len == 8) & na_b_date
+    na_b_YYYYMMDD_YYYYMMDD = (na_len == 17) & na_b_date & char_is(8, '-')
+    na_b_YYYYMMDD_YYYYMMDD &= all_digits(9, 17)
+    na_b_YYYYMMDDThhmmssddd = (15 <= na_len) & (na_len <= 18) & na_b_date
+    na_b_YYYYMMDDThhmmssddd &= char_is(8, 'T') & all_digits(9, 15)
+    na_b_YYYYMMDDThhmmssddd &= np.all(
+        na_b_digit[:, 15:18] | ~na_b_in_str[:, 15:18], axis=1,
+    )
+    na_b_T_T = (na_len == 31) & na_b_date & char_is(8, 'T')
+    na_b_T_T &= all_digits(9, 15) & char_is(15, '-') & all_digits(16, 24)
+    na_b_T_T &= char_is(24, 'T') & all_digits(25, 31)
+    na_b_OBT = (na_len == 21) & all_digits(0, 10) & char_is(10, '-')
+    na_b_OBT &= all_digits(11, 21)
+
+    na_b_time = na_b_YYYYMMDDThhmmssddd | na_b_T_T
+    na_b_day = na_b_YYYYMMDD | na_b_YYYYMMDD_YYYYMMDD | na_b_time
+    na_b_utc = na_b_YYYY | na_b_YYYYMM | na_b_day
+    na_b_parsed = na_b_utc | na_b_OBT
+
+    # Field values. Default values (1970-01-01T00:00:00) for rows/formats
+    # which do not have them.
+    year   = np.where(na_b_utc,  number(0, 4),   1970)
+    month  = np.where(na_b_YYYY, 1, np.where(na_b_utc, number(4, 6), 1))
+    day    = np.where(na_b_day,  number(6, 8),   1)
+    hour   = np.where(na_b_time, number(9, 11),  0)
+    minute = np.where(na_b_time, number(11, 13), 0)
+    second = np.where(na_b_time, number(13, 15), 0)
+
+    # Valid date/time (as required by datetime.datetime).
+    na_b_valid = (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+    na_b_valid &= (hour <= 23) & (minute <= 59) & (second <= 59)
+    month = np.where(na_b_valid, month, 1)
+    na_month_dt64 = ((year - 1970) * 12 + (month - 1)).astype('datetime64[M]')
+    na_month_day1_dt64 = na_month_dt64.astype('datetime64[D]')
+    na_n_days_in_month = (
+        (na_month_dt64 + 1).astype('datetime64[D]') - na_month_day1_dt64
+    ).astype(np.int64)
+    na_b_valid &= day <= na_n_days_in_month
+    # NOTE: Non-existent dates/times are regarded as not parsable (rather
+    # than raising exception), so that single stray files do not prevent
+    # parsing all other filenames.
+    na_b_utc &= na_b_valid
+    na_b_parsed &= na_b_valid | na_b_OBT
+
+    na_s = (((day - 1) * 24 + hour) * 60 + minute) * 60 + second
+    na_dt64 = na_month_day1_dt64.astype('datetime64[ms]') + na_s * 1000
+    na_dt64[~na_b_utc] = np.datetime64('NaT', 'ms')
+
+    return na_b_parsed, na_dt64
+
+
+@functools.lru_cache(maxsize=_CACHE_MAXSIZE)
 def parse_DSID(dsid):
     '''
     Split a DSID into its constituent parts.
 
+    NOTE: Cached (bounded LRU cache). Exceptions are not cached.
+
 
     Parameters
     ----------
@@ -9,9 +9,9 @@ Initially created 2021-01-18 by Erik P G Johansson, IRF Uppsala, Sweden.
 
 
 import datetime
+import erikpgjohansson.solo.soar.dsss as dsss
 import erikpgjohansson.solo.soar.mirror
 import logging
-import numpy as np
 import os
 
 
@@ -19,34 +19,23 @@ import os
 '''
 
 
-class DatasetsSubset(erikpgjohansson.solo.soar.mirror.DatasetsSubset):
-
-    def dataset_in_subset(self, instrument, level, begin_dt64, dsid):
-        # IMPLEMENTATION NOTE: Assertions to ensure that a bad interface
-        # (e.g. interface changes, bad calls) does not accidentally lead to
-        # returning False, leading to deleting many datasets.
-        assert type(instrument) is str
-        assert type(level) is str
-        assert isinstance(begin_dt64, np.datetime64)
-        assert type(dsid) is str
-
-        # NOTE: Include all time periods. ==> Do not check begin_dt64.
-
-        if dsid in ('SOLO_LL02_SWA-PAS-MOM', 'SOLO_LL02_MAG'):
-            return True
-        elif instrument == 'EPD' and level in ['L1', 'L2']:
-            return True
-        elif instrument == 'MAG' and level in ['L2']:
-            return True
-        elif instrument == 'SWA' and level in ['L1', 'L2']:
-            return True
-        elif dsid == 'SOLO_L3_SWA-EAS-NMPAD-PSD':
-            # NOTE: One can falsely be led to believe that this is the only L3
-            # SWA DSID, but that is wrong. There is at least also
-            # "solo_L3_swa-his-comp-10min".
-            return True
-        else:
-            return False
+# NOTE: Include all time periods. ==> No begin time windows.
+LS_DSSS_RULES = (
+    dsss.Rule(dsids=('SOLO_LL02_SWA-PAS-MOM', 'SOLO_LL02_MAG')),
+    dsss.Rule(instruments=('EPD',), levels=('L1', 'L2')),
+    dsss.Rule(instruments=('MAG',), levels=('L2',)),
+    dsss.Rule(instruments=('SWA',), levels=('L1', 'L2')),
+    # NOTE: One can falsely be led to believe that this is the only L3 SWA
+    # DSID, but that is wrong. There is at least also
+    # "solo_L3_swa-his-comp-10min".
+    dsss.Rule(dsids=('SOLO_L3_SWA-EAS-NMPAD-PSD',)),
+)
+
+
+class DatasetsSubset(dsss.RuleDatasetsSubset):
+
+    def __init__(self):
+        super().__init__(LS_DSSS_RULES)
 
 
 def sync():
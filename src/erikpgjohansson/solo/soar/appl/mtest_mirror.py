@@ -9,6 +9,7 @@ Initially created 2021-04-23 by Erik P G Johansson, IRF Uppsala, Sweden.
 
 
 import datetime
+import erikpgjohansson.solo.soar.dsss
 import erikpgjohansson.solo.soar.mirror
 import logging
 import numpy as np
@@ -80,10 +81,15 @@ def sync():
         style='{',
     )
 
+    # NOTE: DatasetsSubset only depends on the day of the begin time.
+    dsss = erikpgjohansson.solo.soar.dsss.CachedDatasetsSubset(
+        DatasetsSubset(), np.timedelta64(1, 'D'),
+    )
+
     erikpgjohansson.solo.soar.mirror.sync(
         sync_dir                  = os.path.join(ROOT_DIR, 'mirror'),
         temp_download_dir         = os.path.join(ROOT_DIR, 'download'),
-        dsss                      = DatasetsSubset(),
+        dsss                      = dsss,
         delete_outside_subset     = True,
         n_max_datasets_net_remove = 25,
         removal_dir               = removal_dir,
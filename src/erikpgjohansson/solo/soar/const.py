@@ -31,9 +31,10 @@ datasets is retrieved.'''
 
 FILE_REMOVAL_COMMAND_LIST = ['remove_to_trash', 'SOAR_sync']
 # FILE_REMOVAL_COMMAND_LIST = ['rm', '-v']
-'''Command and arguments to use for removing old local datasets.
-Paths to actual files or directory (!) to remove are added as additional
-arguments at the end.
+'''Command and arguments to use for removing old local datasets, if
+explicitly requested (erikpgjohansson.solo.soar.mirror.sync(...,
+use_removal_command=True)). Paths to actual files or directory (!) to remove
+are added as additional arguments at the end.
 
 NOTE: "remove_to_trash" is one of Erik P G Johansson's private bash scripts
 that moves files/directories to an automatically selected "trash" directory
@@ -43,6 +44,24 @@ that moves files/directories to an automatically selected "trash" directory
 CREATE_DIR_PERMISSIONS = 0o755
 
 
+N_DIR_SCAN_WORKERS = 16
+'''Number of threads to use for listing directories and stat'ing files when
+scanning the local datasets (erikpgjohansson.solo.soar.scan). Many threads
+hide the latency of network filesystems (NFS/NAS).'''
+
+
+N_REMOVAL_WORKERS = 16
+'''Number of threads to use for removing (unlinking, renaming, hard linking)
+local datasets with the built-in removers (erikpgjohansson.solo.soar.remove).
+Many threads hide the latency of network filesystems (NFS/NAS).'''
+
+
+N_DOWNLOAD_THROUGHPUT_RECORDS = 20
+'''Number of most recent measured download throughputs (batch downloads) to
+keep for estimating download times. See
+erikpgjohansson.solo.soar.utils.record_download_throughput().'''
+
+
 N_EXCESS_DATASETS_PRINT = 25
 '''Number of local datasets to log, and that would be removed if it were not
 for the triggering of the n_max_datasets_net_remove failsafe.'''
@@ -0,0 +1,436 @@
+'''
+Module for DSSSs (subclasses of
+erikpgjohansson.solo.soar.mirror.DatasetsSubset) which are specified as data
+(declaratively) instead of as code.
+
+A RuleDatasetsSubset is a list of rules. Every rule is a set of conditions on
+instrument, processing level, DSID and dataset begin time, plus whether
+matching datasets should be included or excluded. Like a firewall, the first
+rule which matches a dataset decides. Datasets which match no rule are
+excluded. The rules are compiled once to DSTQs, which are evaluated with
+vectorized numpy operations on categorical columns.
+
+A CachedDatasetsSubset wraps any DSSS and evaluates it once per unique
+combination of instrument, level, DSID (and optionally begin time bin).
+
+Ex:
+    dsss = RuleDatasetsSubset([
+        Rule(include=False, dsid_glob='SOLO_L2_MAG-*-BURST'),
+        Rule(instruments=('MAG',), levels=('L2',)),
+        Rule(dsids=('SOLO_LL02_MAG',)),
+    ])
+'''
+
+
+import dataclasses
+import erikpgjohansson.solo.iddt
+import erikpgjohansson.solo.metadata
+import erikpgjohansson.solo.soar.dst
+import erikpgjohansson.solo.soar.dstq as dstq
+import erikpgjohansson.solo.soar.mirror
+import fnmatch
+import numpy as np
+import typing
+
+
+'''
+PROPOSAL: Rule field for data source (SOLO, RGTS).
+PROPOSAL: Use the ADQL condition when downloading SDTs.
+    NOTE: Requires changing dwld.SoarDownloader.download_SDT_JSON().
+'''
+
+
+# Names of the DST columns used internally for evaluating rules. Same names as
+# in DSTs returned from erikpgjohansson.solo.soar.dwld.download_SDT_DST().
+_KEY_INSTRUMENT = 'instrument'
+_KEY_LEVEL      = 'processing_level'
+_KEY_BEGIN_DT64 = 'begin_time_FN'
+_KEY_DSID       = 'dsid'
+
+
+@dataclasses.dataclass(frozen=True)
+class Rule:
+    '''
+    One rule in a RuleDatasetsSubset. A dataset matches the rule iff it
+    satisfies all specified (non-None) conditions. A rule without conditions
+    matches all datasets.
+
+    Fields
+    ------
+    include : Whether matching datasets are included (True) or excluded
+        (False).
+    instruments : Tuple of instrument names, e.g. ('EPD', 'MAG').
+    levels : Tuple of processing levels, e.g. ('L1', 'L2').
+    dsids : Tuple of DSIDs (uppercase).
+    dsid_glob : Glob pattern for DSIDs (fnmatch; case-sensitive), e.g.
+        'SOLO_L2_MAG-*'.
+    start_dt64, stop_dt64 : numpy.datetime64. Begin time window
+        (start <= begin time < stop). Datasets with unknown begin time (NaT)
+        never match a rule with a time window.
+    '''
+    include:     bool = True
+    instruments: typing.Optional[tuple] = None
+    levels:      typing.Optional[tuple] = None
+    dsids:       typing.Optional[tuple] = None
+    dsid_glob:   typing.Optional[str] = None
+    start_dt64:  typing.Optional[np.datetime64] = None
+    stop_dt64:   typing.Optional[np.datetime64] = None
+
+    def __post_init__(self):
+        assert type(self.include) is bool
+        for ls_str in (self.instruments, self.levels, self.dsids):
+            # NOTE: Tuple, not a string (which is also iterable).
+            if ls_str is not None:
+                assert type(ls_str) is tuple
+                assert all(type(s) is str for s in ls_str)
+        if self.dsids is not None:
+            assert all(s.upper() == s for s in self.dsids), \
+                'DSIDs must be uppercase.'
+        assert self.dsid_glob is None or type(self.dsid_glob) is str
+        for dt64 in (self.start_dt64, self.stop_dt64):
+            assert dt64 is None or isinstance(dt64, np.datetime64)
+
+    def get_DSTQ(self) -> dstq.Query:
+        '''Return DSTQ for the datasets which match the rule.'''
+        ls_query = []
+        if self.instruments is not None:
+            ls_query.append(dstq.IsIn(_KEY_INSTRUMENT, self.instruments))
+        if self.levels is not None:
+            ls_query.append(dstq.IsIn(_KEY_LEVEL, self.levels))
+        if self.dsids is not None:
+            ls_query.append(dstq.IsIn(_KEY_DSID, self.dsids))
+        if self.dsid_glob is not None:
+            # NOTE: fnmatch.translate() returns a regexp which is anchored at
+            # the end but not at the beginning.
+            ls_query.append(dstq.Regex(
+                _KEY_DSID, '^' + fnmatch.translate(self.dsid_glob),
+            ))
+        if (self.start_dt64 is not None) or (self.stop_dt64 is not None):
+            ls_query.append(
+                dstq.Range(_KEY_BEGIN_DT64, self.start_dt64, self.stop_dt64),
+            )
+        return dstq.And(*ls_query)
+
+    def get_ADQL_condition(self) -> typing.Optional[str]:
+        '''
+        Return ADQL condition (for SOAR table v_public_files) which is
+        satisfied by (at least) all datasets matching the rule.
+
+        NOTE: The condition is a superset. Conditions which can not be
+        expressed exactly (begin time, some globs) are omitted.
+
+        Returns
+        -------
+        None, if there is no condition (all datasets).
+        Otherwise string.
+        '''
+        def isin(column, ls_value):
+            if not ls_value:
+                # CASE: Empty set. ==> Nothing matches.
+                return '(1=0)'
+            return '(' + ' OR '.join(
+                f'{column}={_quote_ADQL(value)}' for value in ls_value
+            ) + ')'
+
+        ls_cond = []
+        if self.instruments is not None:
+            ls_cond.append(isin('instrument', self.instruments))
+        if self.levels is not None:
+            ls_cond.append(isin('processing_level', self.levels))
+        if self.dsids is not None:
+            ls_like = [_convert_DSID_glob_to_LIKE(s) for s in self.dsids]
+            if not ls_like:
+                ls_cond.append('(1=0)')
+            elif None not in ls_like:
+                ls_cond.append('(' + ' OR '.join(
+                    f'LOWER(item_id) LIKE {_quote_ADQL(like)}'
+                    for like in ls_like
+                ) + ')')
+        if self.dsid_glob is not None:
+            like = _convert_DSID_glob_to_LIKE(self.dsid_glob)
+            if like is not None:
+                ls_cond.append(f'LOWER(item_id) LIKE {_quote_ADQL(like)}')
+
+        if not ls_cond:
+            return None
+        return '(' + ' AND '.join(ls_cond) + ')'
+
+    def get_IDDT_filter(self) -> erikpgjohansson.solo.iddt.IddtSubtreeFilter:
+        '''
+        Return IDDT subtree filter which selects (at least) all IDDT
+        subdirectories which may contain datasets matching the rule.
+
+        NOTE: The filter is a superset. The DSID glob is ignored. DSIDs are
+        only used for deriving instruments and levels (if not specified).
+        '''
+        instruments = self.instruments
+        levels      = self.levels
+        if self.dsids is not None:
+            try:
+                ls_tpl = [
+                    erikpgjohansson.solo.metadata.parse_DSID(dsid)
+                    for dsid in self.dsids
+                ]
+            except Exception:
+                # CASE: Some DSID can not be parsed. ==> Do not use DSIDs.
+                ls_tpl = None
+            if ls_tpl is not None:
+                if instruments is None:
+                    instruments = tuple(sorted({tpl[2] for tpl in ls_tpl}))
+                if levels is None:
+                    levels = tuple(sorted({tpl[1] for tpl in ls_tpl}))
+
+        return erikpgjohansson.solo.iddt.IddtSubtreeFilter(
+            instruments=instruments,
+            levels=levels,
+            start_dt64=self.start_dt64,
+            stop_dt64=self.stop_dt64,
+        )
+
+
+def _convert_DSID_glob_to_LIKE(dsid_glob: str):
+    '''
+    Convert DSID (or DSID glob) to an ADQL LIKE pattern for lowercase item
+    IDs, which matches (at least) all item IDs for the DSIDs. Must be
+    compared with LOWER(item_id).
+
+    Item IDs are DSID + "_" + time interval string, where the DSID is usually
+    lowercase except for the level, but not always.
+    Ex: 'SOLO_L1_SWA-EAS2-NM3D' has item IDs 'solo_L1_swa-eas2-NM3D_...'.
+    Since LIKE is case-sensitive, the comparison is made on lowercase.
+    Ex: 'SOLO_L2_MAG-RTN-NORMAL' --> 'solo_l2_mag-rtn-normal_%'
+
+    NOTE: Underscores are not escaped and thus match any character in LIKE.
+    ==> Superset.
+
+    Returns
+    -------
+    None, if the glob can not be converted.
+    '''
+    if any(c in dsid_glob for c in '[]%'):
+        return None
+
+    like = f'{dsid_glob.lower()}_%'
+    return like.replace('*', '%').replace('?', '_')
+
+
+def _quote_ADQL(value: str):
+    '''Return ADQL string literal (quoted, with quotes escaped).'''
+    value = value.replace("'", "''")
+    return f"'{value}'"
+
+
+class RuleDatasetsSubset(erikpgjohansson.solo.soar.mirror.DatasetsSubset):
+    '''DSSS specified as a list of rules. The first rule which matches a
+    dataset decides whether it is included. Datasets which match no rule are
+    excluded.'''
+
+    def __init__(self, ls_rule):
+        ls_rule = tuple(ls_rule)
+        assert all(isinstance(rule, Rule) for rule in ls_rule)
+
+        self._ls_rule = ls_rule
+        # Compile rules once.
+        self._ls_query_include = tuple(
+            (rule.get_DSTQ(), rule.include) for rule in ls_rule
+        )
+
+    @property
+    def rules(self):
+        return self._ls_rule
+
+    # OVERRIDE
+    def dataset_in_subset(self, instrument, level, begin_dt64, dsid):
+        # IMPLEMENTATION NOTE: Assertions to ensure that a bad interface
+        # (e.g. interface changes, bad calls) does not accidentally lead to
+        # returning False, leading to deleting many datasets.
+        assert type(instrument) is str
+        assert type(level) is str
+        assert isinstance(begin_dt64, np.datetime64)
+        assert type(dsid) is str
+
+        # NOTE: Does not call self.datasets_in_subset() since a subclass may
+        # override it to call this method.
+        return bool(self._derive_NA_b(
+            np.array([instrument], dtype=object),
+            np.array([level], dtype=object),
+            np.array([begin_dt64]),
+            np.array([dsid], dtype=object),
+        )[0])
+
+    # OVERRIDE
+    def datasets_in_subset(
+        self, na_instrument, na_level, na_begin_dt64, na_dsid,
+    ):
+        for na in (na_instrument, na_level, na_dsid):
+            assert type(na) is np.ndarray
+            assert na.dtype == object
+            assert na.shape == na_instrument.shape
+        assert np.issubdtype(na_begin_dt64.dtype, np.datetime64)
+        assert na_begin_dt64.shape == na_instrument.shape
+
+        return self._derive_NA_b(
+            na_instrument, na_level, na_begin_dt64, na_dsid,
+        )
+
+    def _derive_NA_b(self, na_instrument, na_level, na_begin_dt64, na_dsid):
+        dst = erikpgjohansson.solo.soar.dst.DatasetsTable({
+            _KEY_INSTRUMENT: na_instrument,
+            _KEY_LEVEL:      na_level,
+            _KEY_BEGIN_DT64: na_begin_dt64,
+            _KEY_DSID:       na_dsid,
+        })
+
+        na_b_subset  = np.zeros(na_instrument.shape, dtype=bool)
+        na_b_decided = np.zeros(na_instrument.shape, dtype=bool)
+        for query, include in self._ls_query_include:
+            na_b = query.derive_NA_b(dst) & ~na_b_decided
+            na_b_subset[na_b] = include
+            na_b_decided |= na_b
+
+        return na_b_subset
+
+    def get_ADQL_condition(self) -> typing.Optional[str]:
+        '''
+        Return ADQL condition (for SOAR table v_public_files) which is
+        satisfied by (at least) all datasets in the subset. Intended for
+        reducing the size of downloaded SDTs (server-side filtering). The
+        result must still be filtered using the DSSS itself.
+
+        Returns
+        -------
+        None, if there is no condition (all datasets).
+        Otherwise string.
+        '''
+        # NOTE: Exclude rules are ignored (superset). The subset is a subset
+        # of the union of all include rules.
+        ls_cond = []
+        for rule in self._ls_rule:
+            if rule.include:
+                cond = rule.get_ADQL_condition()
+                if cond is None:
+                    return None
+                ls_cond.append(cond)
+
+        if not ls_cond:
+            # CASE: No datasets at all.
+            return '(1=0)'
+        return '(' + ' OR '.join(ls_cond) + ')'
+
+    # OVERRIDE
+    def get_IDDT_filters(self) -> typing.Optional[tuple]:
+        # NOTE: Exclude rules are ignored (superset), like for
+        # get_ADQL_condition().
+        tpl_filter = tuple(
+            rule.get_IDDT_filter() for rule in self._ls_rule if rule.include
+        )
+        if erikpgjohansson.solo.iddt.IddtSubtreeFilter() in tpl_filter:
+            # CASE: Some rule selects all subdirectories.
+            return None
+        return tpl_filter
+
+
+class CachedDatasetsSubset(erikpgjohansson.solo.soar.mirror.DatasetsSubset):
+    '''
+    Wrapper around any DSSS which evaluates the wrapped DSSS only once per
+    unique combination of instrument, level, DSID and (optionally) begin
+    time bin. The results are broadcast to all datasets.
+
+    Intended for DSSSs which are slow per dataset (e.g. only implement
+    dataset_in_subset()), since many datasets (SDT rows) share the same
+    instrument, level and DSID.
+
+    NOTE: The caller must guarantee that the wrapped DSSS does not depend on
+    the begin time, or only on the begin time bin (i.e. it returns the same
+    result for all begin times in the same bin). Otherwise the result is
+    wrong.
+    '''
+
+    def __init__(
+        self, dsss: erikpgjohansson.solo.soar.mirror.DatasetsSubset,
+        time_bin: typing.Optional[np.timedelta64] = None,
+    ):
+        '''
+        Parameters
+        ----------
+        dsss : The wrapped DSSS.
+        time_bin : None, or numpy.timedelta64.
+            None: The wrapped DSSS does not depend on the begin time.
+                It is then called with arbitrary begin times (from one of the
+                datasets).
+            timedelta64: The wrapped DSSS only depends on which time bin the
+                begin time is in. Bins are aligned with 1970-01-01T00:00:00.
+                The wrapped DSSS is then called with the beginning of the bin.
+        '''
+        assert isinstance(
+            dsss, erikpgjohansson.solo.soar.mirror.DatasetsSubset,
+        )
+        if time_bin is not None:
+            assert isinstance(time_bin, np.timedelta64)
+            assert time_bin > np.timedelta64(0)
+
+        self._dsss = dsss
+        self._time_bin = time_bin
+
+    # OVERRIDE
+    def dataset_in_subset(self, instrument, level, begin_dt64, dsid):
+        return self._dsss.dataset_in_subset(
+            instrument, level, begin_dt64, dsid,
+        )
+
+    # OVERRIDE
+    def get_IDDT_filters(self):
+        return self._dsss.get_IDDT_filters()
+
+    # OVERRIDE
+    def datasets_in_subset(
+        self, na_instrument, na_level, na_begin_dt64, na_dsid,
+    ):
+        assert np.issubdtype(na_begin_dt64.dtype, np.datetime64)
+        for na in (na_level, na_begin_dt64, na_dsid):
+            assert na.shape == na_instrument.shape
+
+        if self._time_bin is None:
+            ls_na = [na_instrument, na_level, na_dsid]
+        else:
+            na_begin_dt64 = _floor_DT64(na_begin_dt64, self._time_bin)
+            ls_na = [na_instrument, na_level, na_dsid, na_begin_dt64]
+
+        # Derive one integer code per unique combination of values.
+        na_code = np.zeros(na_instrument.shape, dtype=np.int64)
+        for na in ls_na:
+            na_unique, na_i_inverse = erikpgjohansson.solo.soar.dst.factorize(
+                na,
+            )
+            # NOTE: Re-densify codes after every column to avoid overflow.
+            _, na_code = np.unique(
+                na_code * na_unique.size + na_i_inverse, return_inverse=True,
+            )
+            na_code = na_code.reshape(-1)
+
+        _, na_i_first, na_i_inverse = np.unique(
+            na_code, return_index=True, return_inverse=True,
+        )
+
+        na_b_unique = self._dsss.datasets_in_subset(
+            na_instrument[na_i_first],
+            na_level[na_i_first],
+            na_begin_dt64[na_i_first],
+            na_dsid[na_i_first],
+        )
+        return na_b_unique[na_i_inverse.reshape(-1)]
+
+
+def _floor_DT64(na_dt64: np.ndarray, time_bin: np.timedelta64):
+    '''Round datetime64 array down to the beginning of the time bin. NaT is
+    kept.'''
+    unit = np.datetime_data(na_dt64.dtype)[0]
+    bin_int = int(time_bin / np.timedelta64(1, unit))
+    assert bin_int > 0, 'time_bin is smaller than the time unit of the array.'
+
+    na_b_nat = np.isnat(na_dt64)
+    na_int = na_dt64.view(np.int64)
+    na_int = (na_int // bin_int) * bin_int
+    na_dt64_floor = na_int.view(na_dt64.dtype)
+    na_dt64_floor[na_b_nat] = np.datetime64('NaT')
+    return na_dt64_floor
@@ -5,13 +5,15 @@ Module for the DST class.
 
 import codetiming
 import collections
-import datetime
+import dataclasses
 import erikpgjohansson.solo.asserts
+import erikpgjohansson.solo.iddt
 import erikpgjohansson.solo.metadata
+import erikpgjohansson.solo.soar.inventory
+import erikpgjohansson.solo.soar.scan
 import erikpgjohansson.solo.soar.utils
 import logging
 import numpy as np
-import os
 
 
 '''
@@ -59,16 +61,47 @@ class DatasetsTable:
             erikpgjohansson.solo.soar.utils.assert_1D_NA(na)
 
         # Dictionary of numpy arrays.
+        # NOTE: For views, these are the (unindexed) arrays of the DST from
+        # which the view was created.
         self._dc_na = {}
 
         # Number of elements per (1D) numpy array.
         self._n = None   # Undefined length.
 
+        # None, or 1D integer NA with indices into the arrays in self._dc_na.
+        # Non-None iff the DST is a view.
+        self._na_i = None
+
+        # Cache of columns which have been materialized (views only).
+        self._dc_na_view = {}
+
+        # Cache of factorized columns. See factorize().
+        self._dc_factorized = {}
+
         for key, na in dc.items():
             self._set_item(key, na)
 
     def __getitem__(self, key):
-        return self._dc_na[key]
+        if self._na_i is None:
+            return self._dc_na[key]
+
+        # CASE: View. Materialize column on demand (first time only).
+        na = self._dc_na_view.get(key)
+        if na is None:
+            na = self._dc_na[key][self._na_i]
+            self._dc_na_view[key] = na
+        return na
+
+    def keys(self):
+        return self._dc_na.keys()
+
+    @property
+    def is_view(self):
+        '''Whether the DST is a (lazy) view of another DST.
+
+        Read-only property.
+        '''
+        return self._na_i is not None
 
     def _set_item(self, key, na):
         '''
@@ -94,16 +127,147 @@ class DatasetsTable:
         # Set self._dc_na
         self._dc_na[key] = na
 
-    def index(self, na_bi: np.ndarray):
+    def index(self, na_bi: np.ndarray, view=False):
         '''
         Create new DST using the same keys and subset of arrays, defined by
         one shared set of indices.
+
+        Parameters
+        ----------
+        na_bi
+            Boolean or integer indices.
+        view : bool
+            False: Return DST with copies of all columns (eager indexing).
+            True: Return a lazy view which only stores integer indices into
+            the arrays of this DST. Indices are composed if this DST is itself
+            a view. A column is only indexed (copied) when it is first read.
+            Useful for chains of row selections where only some columns are
+            read. Results are identical to eager indexing.
+        '''
+        '''
+        PROPOSAL: Make view=True the default.
+            CON: Views keep references to the (larger) original arrays, and
+                 thus prevent those from being garbage collected.
         '''
         assert type(na_bi) is np.ndarray
+        assert type(view) is bool
 
-        return DatasetsTable(
-            {key: na[na_bi] for key, na in self._dc_na.items()},
-        )
+        # NOTE: A DST without columns (n_rows is None) yields a DST without
+        # columns, also for view=True.
+        if (not view) or (self.n_rows is None):
+            return DatasetsTable(
+                {key: self[key][na_bi] for key in self._dc_na.keys()},
+            )
+
+        # Convert to integer indices into this DST.
+        if na_bi.dtype == bool:
+            assert na_bi.shape == (self.n_rows,), (
+                'Boolean indices have the wrong shape.'
+            )
+            na_i = np.flatnonzero(na_bi)
+        else:
+            # NOTE: Uses numpy's indexing for handling negative indices and
+            # for asserting that indices are within bounds.
+            na_i = np.arange(self.n_rows)[na_bi]
+
+        # Compose with the indices of this DST, if it is itself a view.
+        if self._na_i is not None:
+            na_i = self._na_i[na_i]
+
+        dst = DatasetsTable()
+        dst._dc_na = self._dc_na
+        dst._n     = na_i.size
+        dst._na_i  = na_i
+        return dst
+
+    def factorize(self, key):
+        '''
+        Return the factorization of one column. Cached, since the DST is
+        immutable.
+
+        Useful for evaluating expensive operations once per unique value
+        instead of once per row (categorical columns).
+
+        Returns
+        -------
+        See factorize() (module function).
+        '''
+        t = self._dc_factorized.get(key)
+        if t is None:
+            t = factorize(self[key])
+            self._dc_factorized[key] = t
+        return t
+
+    def select(self, query, view=False):
+        '''
+        Create new DST with the rows for which a query is true.
+
+        Parameters
+        ----------
+        query : erikpgjohansson.solo.soar.dstq.Query
+        view : bool
+            See index().
+        '''
+        # IMPLEMENTATION NOTE: Not importing erikpgjohansson.solo.soar.dstq
+        # (for asserting on the type) since it imports this module.
+        na_b = query.derive_NA_b(self)
+        return self.index(na_b, view=view)
+
+    def get_sort_indices(self, ls_key, descending=False):
+        '''
+        Return (integer) indices which sort the rows by one or multiple
+        columns. The sort is stable. The first key is the primary sort key.
+
+        NOTE: NaT sorts last (first if descending).
+        '''
+        if type(ls_key) is str:
+            ls_key = [ls_key]
+        assert len(ls_key) > 0
+        assert type(descending) is bool
+
+        ls_na_code = []
+        for key in ls_key:
+            na_code = _derive_sort_codes(self[key])
+            if descending:
+                na_code = -na_code
+            ls_na_code.append(na_code)
+
+        # NOTE: numpy.lexsort() uses the LAST key as the primary sort key.
+        return np.lexsort(ls_na_code[::-1])
+
+    def sort(self, ls_key, descending=False, view=False):
+        '''
+        Create new DST with the rows sorted by one or multiple columns.
+
+        See get_sort_indices().
+        '''
+        na_i = self.get_sort_indices(ls_key, descending=descending)
+        return self.index(na_i, view=view)
+
+    def top_k(self, key, k, descending=True, view=False):
+        '''
+        Create new DST with the k rows with the largest (or smallest) values
+        in one column, sorted. Faster than a complete sort for small k.
+        Ties are resolved by row order.
+        '''
+        assert type(k) is int and k >= 0
+        n = self.n_rows if self.n_rows else 0
+        k = min(k, n)
+
+        na_code = _derive_sort_codes(self[key])
+        if descending:
+            na_code = -na_code
+
+        if 0 < k < n:
+            # NOTE: Include all rows which tie with the k:th value so that
+            # ties can then be resolved by row order.
+            kth_code = np.partition(na_code, k-1)[k-1]
+            na_i = np.flatnonzero(na_code <= kth_code)
+        else:
+            na_i = np.arange(n)
+
+        na_i = na_i[np.argsort(na_code[na_i], kind='stable')][:k]
+        return self.index(na_i, view=view)
 
     @property
     def n_rows(self):
@@ -121,17 +285,344 @@ class DatasetsTable:
     def __add__(self, dst2):
         '''Add (concatenate) other DST with this DST.'''
         assert isinstance(dst2, DatasetsTable)
-        assert self._dc_na.keys() == dst2._dc_na.keys()
+        assert self.keys() == dst2.keys()
 
         dc = {}
-        for key in self._dc_na.keys():
-            dc[key] = np.concatenate((self._dc_na[key], dst2[key]))
+        for key in self.keys():
+            dc[key] = np.concatenate((self[key], dst2[key]))
 
         return DatasetsTable(dc)
 
 
+def factorize(na: np.ndarray):
+    '''
+    Convert 1D array to (1) array of unique values, and (2) array of indices
+    into the unique values, so that na == na_unique[na_i_inverse].
+
+    Equivalent to numpy.unique(na, return_inverse=True), except that the
+    unique values are not sorted for object arrays. For object arrays (e.g.
+    strings), this uses a dictionary which is much faster than numpy's
+    object sorting when there are few unique values (categorical columns).
+
+    Returns
+    -------
+    (na_unique, na_i_inverse)
+    '''
+    erikpgjohansson.solo.soar.utils.assert_1D_NA(na)
+
+    if na.dtype == object:
+        dc_i = {}
+        na_i_inverse = np.fromiter(
+            (dc_i.setdefault(value, len(dc_i)) for value in na),
+            dtype=np.int64, count=na.size,
+        )
+        na_unique = np.empty(len(dc_i), dtype=object)
+        na_unique[:] = list(dc_i.keys())
+    else:
+        na_unique, na_i_inverse = np.unique(na, return_inverse=True)
+        na_i_inverse = na_i_inverse.astype(np.int64, copy=False)
+
+    return na_unique, na_i_inverse
+
+
+def _derive_sort_codes(na: np.ndarray):
+    '''Convert 1D array to int64 array with the same sort order.'''
+    # NOTE: numpy.unique() sorts NaT last.
+    _, na_code = np.unique(na, return_inverse=True)
+    return na_code.astype(np.int64, copy=False)
+
+
+@dataclasses.dataclass(frozen=True)
+class DstDiff:
+    '''
+    Immutable. Difference between two DSTs ("old" and "new"), as returned by
+    diff().
+    '''
+    # Rows in new DST whose key is not in the old DST.
+    dst_added : DatasetsTable
+    # Rows in old DST whose key is not in the new DST.
+    dst_removed : DatasetsTable
+    # Rows in old/new DST whose key is in both DSTs, but where there is no row
+    # in the other DST with the same key AND the same compared values.
+    dst_changed_old : DatasetsTable
+    dst_changed_new : DatasetsTable
+
+
+@codetiming.Timer('diff', logger=None)
+def diff(
+    dst_old: DatasetsTable, dst_new: DatasetsTable, key, compare=(),
+    view=False,
+):
+    '''
+    Find the difference between two DSTs, by comparing rows by key
+    (one or multiple columns), and optionally by other values (columns) for
+    rows with the same key.
+
+    Ex: Compare two SDTs with
+        key=('item_id', 'item_version'), compare=('file_size',)
+        ==> new items and new versions, removed items and versions, and
+            changed file sizes.
+
+    NOTE: Rows are compared as sets, i.e. a DST may contain multiple rows with
+    the same key (e.g. multiple versions of the same item ID if the key is only
+    the item ID).
+
+
+    Parameters
+    ----------
+    dst_old, dst_new
+        DSTs with (at least) the specified columns.
+    key : String, or list/tuple of strings. Non-empty.
+        Names of columns which together define the identity of a row.
+    compare : String, or list/tuple of strings.
+        Names of columns which are compared for rows with the same key.
+    view : bool
+        Whether to return DST views. See DatasetsTable.index().
+
+
+    Returns
+    -------
+    DstDiff
+    '''
+    na_b_added, na_b_removed, na_b_changed_old, na_b_changed_new = \
+        derive_diff_NA_b(dst_old, dst_new, key, compare)
+
+    return DstDiff(
+        dst_added       = dst_new.index(na_b_added,       view=view),
+        dst_removed     = dst_old.index(na_b_removed,     view=view),
+        dst_changed_old = dst_old.index(na_b_changed_old, view=view),
+        dst_changed_new = dst_new.index(na_b_changed_new, view=view),
+    )
+
+
+def derive_diff_NA_b(
+    dst_old: DatasetsTable, dst_new: DatasetsTable, key, compare=(),
+):
+    '''
+    Same as diff(), except that it returns boolean indices.
+
+    ALGORITHM: Hash join. Every combination of values in the key (and
+    compare) columns is hashed to one uint64 value, after which set
+    membership is derived by sorting and binary search (numpy) only. No
+    per-row Python tuples are created and the only per-row Python operation
+    is hash() (cached for str). Matches are verified by comparing the actual
+    values. If that reveals a hash collision, then an exact (slower)
+    sort-merge on integer-encoded keys is used instead (identical
+    combinations <=> identical codes).
+
+
+    Returns
+    -------
+    (na_b_added, na_b_removed, na_b_changed_old, na_b_changed_new)
+        Boolean indices into dst_new, dst_old, dst_old, dst_new respectively.
+    '''
+    assert isinstance(dst_old, DatasetsTable)
+    assert isinstance(dst_new, DatasetsTable)
+    if type(key) is str:
+        key = (key,)
+    if type(compare) is str:
+        compare = (compare,)
+    assert len(key) > 0
+    assert not set(key) & set(compare), 'key and compare overlap.'
+
+    # Hash every column (once).
+    dc_na_hash_old = {}
+    dc_na_hash_new = {}
+    for k in tuple(key) + tuple(compare):
+        dc_na_hash_old[k] = _hash_NA(dst_old[k])
+        dc_na_hash_new[k] = _hash_NA(dst_new[k])
+
+    def isin(ls_column):
+        '''Set membership of rows old-->new and new-->old.'''
+        ls_na_old = [dst_old[k] for k in ls_column]
+        ls_na_new = [dst_new[k] for k in ls_column]
+
+        tup = _isin_hashed(
+            ls_na_old, ls_na_new,
+            [dc_na_hash_old[k] for k in ls_column],
+            [dc_na_hash_new[k] for k in ls_column],
+        )
+        if tup is None:
+            # CASE: Hash collision (or columns which can not be hashed).
+            na_code_old, na_code_new = _encode_key_columns(
+                ls_na_old, ls_na_new,
+            )
+            tup = (
+                _isin_sorted(na_code_old, na_code_new),
+                _isin_sorted(na_code_new, na_code_old),
+            )
+        return tup
+
+    na_b_old_in_new, na_b_new_in_old = isin(key)
+    na_b_added   = ~na_b_new_in_old
+    na_b_removed = ~na_b_old_in_new
+
+    if compare:
+        na_b_old_in_new, na_b_new_in_old = isin(tuple(key) + tuple(compare))
+        na_b_changed_old = ~na_b_removed & ~na_b_old_in_new
+        na_b_changed_new = ~na_b_added   & ~na_b_new_in_old
+    else:
+        na_b_changed_old = np.zeros(dst_old.n_rows or 0, dtype=bool)
+        na_b_changed_new = np.zeros(dst_new.n_rows or 0, dtype=bool)
+
+    return na_b_added, na_b_removed, na_b_changed_old, na_b_changed_new
+
+
+def _encode_key_columns(ls_na_1, ls_na_2):
+    '''
+    Encode rows from two tables (lists of 1D arrays; same columns in the same
+    order) as int64 codes, such that two rows have the same code if and only
+    if they have the same values in all columns.
+
+    Returns
+    -------
+    (na_code_1, na_code_2)
+    '''
+    assert len(ls_na_1) == len(ls_na_2) > 0
+    n1 = ls_na_1[0].size
+
+    na_code = None
+    for na_1, na_2 in zip(ls_na_1, ls_na_2):
+        _, na_code_col = factorize(np.concatenate((na_1, na_2)))
+        n_unique_col = int(na_code_col.max()) + 1 if na_code_col.size else 1
+
+        if na_code is None:
+            na_code = na_code_col
+        else:
+            # Combine codes (mixed radix). Re-densify first if the combined
+            # code could overflow int64.
+            if na_code.size \
+                    and int(na_code.max()) + 1 > _INT64_MAX // n_unique_col:
+                _, na_code = np.unique(na_code, return_inverse=True)
+                na_code = na_code.astype(np.int64, copy=False)
+            na_code = na_code * n_unique_col + na_code_col
+
+    return na_code[:n1], na_code[n1:]
+
+
+_INT64_MAX = np.iinfo(np.int64).max
+
+# Odd 64-bit constant (golden ratio) for mixing hashes of multiple columns.
+_HASH_MIX_FACTOR = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _hash_NA(na):
+    '''
+    Hash 1D array to uint64 array, such that equal values have equal hashes.
+    Return None if the array type is not supported.
+    '''
+    if na.dtype == object:
+        return np.fromiter(
+            map(hash, na), dtype=np.int64, count=na.size,
+        ).view(np.uint64)
+    elif (na.dtype.kind in 'iu' and na.dtype.itemsize == 8) \
+            or na.dtype.kind in 'mM':
+        # NOTE: Values are their own hashes. All NaT have the same bits.
+        return na.view(np.uint64)
+    elif na.dtype.kind in 'iub':
+        return na.astype(np.int64).view(np.uint64)
+    else:
+        # Ex: Floats, for which equal values (0.0, -0.0) may have different
+        # bits.
+        return None
+
+
+def _isin_hashed(ls_na_1, ls_na_2, ls_na_hash_1, ls_na_hash_2):
+    '''
+    Set membership of rows in one table (list of 1D arrays) in another table
+    (same columns in the same order) and vice versa, using hashes.
+
+    Parameters
+    ----------
+    ls_na_1, ls_na_2 : Lists of 1D arrays. Columns.
+    ls_na_hash_1, ls_na_hash_2 : Lists of 1D uint64 arrays, or None.
+        Hashes of the corresponding columns (_hash_NA()).
+
+    Returns
+    -------
+    None, if there was a hash collision or if column types are not supported.
+    Otherwise (na_b_1in2, na_b_2in1).
+    '''
+    assert len(ls_na_1) == len(ls_na_2) == len(ls_na_hash_1) \
+        == len(ls_na_hash_2) > 0
+
+    def hash_rows(ls_na_hash):
+        if any(na_hash is None for na_hash in ls_na_hash):
+            return None
+        # NOTE: Copy since it may be a view of the column.
+        na_hash = ls_na_hash[0].copy()
+        for na_hash_col in ls_na_hash[1:]:
+            # NOTE: uint64 arithmetic wraps around.
+            na_hash *= _HASH_MIX_FACTOR
+            na_hash ^= na_hash_col
+        return na_hash
+
+    na_hash_1 = hash_rows(ls_na_hash_1)
+    na_hash_2 = hash_rows(ls_na_hash_2)
+    if (na_hash_1 is None) or (na_hash_2 is None):
+        return None
+
+    # IMPLEMENTATION NOTE: Binary search of sorted values (instead of
+    # unsorted) is much faster for large arrays (memory access pattern).
+    na_i_sort_1 = np.argsort(na_hash_1)
+    na_i_sort_2 = np.argsort(na_hash_2)
+    na_hash_1_sorted = na_hash_1[na_i_sort_1]
+    na_hash_2_sorted = na_hash_2[na_i_sort_2]
+
+    def isin(na_i_sort_a, na_hash_a_sorted, na_i_sort_b, na_hash_b_sorted):
+        '''
+        Returns
+        -------
+        (na_b_isin, na_i_a, na_i_b)
+            Membership a-->b, and indices to (unsorted) matching rows.
+        '''
+        na_b_isin = np.zeros(na_hash_a_sorted.shape, dtype=bool)
+        if na_hash_b_sorted.size == 0:
+            return na_b_isin, na_i_sort_a[:0], na_i_sort_b[:0]
+
+        na_j = np.searchsorted(na_hash_b_sorted, na_hash_a_sorted)
+        na_j[na_j == na_hash_b_sorted.size] = 0
+        na_b_isin_sorted = (na_hash_b_sorted[na_j] == na_hash_a_sorted)
+        na_i_a = na_i_sort_a[na_b_isin_sorted]
+        na_b_isin[na_i_a] = True
+        return na_b_isin, na_i_a, na_i_sort_b[na_j[na_b_isin_sorted]]
+
+    na_b_1in2, na_i_1a, na_i_2a = isin(
+        na_i_sort_1, na_hash_1_sorted, na_i_sort_2, na_hash_2_sorted,
+    )
+    na_b_2in1, na_i_2b, na_i_1b = isin(
+        na_i_sort_2, na_hash_2_sorted, na_i_sort_1, na_hash_1_sorted,
+    )
+
+    # Verify matches (both directions): The matched rows must have identical
+    # values. Not the case if there are hash collisions.
+    na_i_1 = np.concatenate((na_i_1a, na_i_1b))
+    na_i_2 = np.concatenate((na_i_2a, na_i_2b))
+    for na_1, na_2 in zip(ls_na_1, ls_na_2):
+        if not np.array_equal(na_1[na_i_1], na_2[na_i_2]):
+            return None
+
+    return na_b_1in2, na_b_2in1
+
+
+def _isin_sorted(na_a, na_b):
+    '''Equivalent to numpy.isin() for 1D int64 arrays. Sort b and use binary
+    search.'''
+    if na_b.size == 0:
+        return np.zeros(na_a.shape, dtype=bool)
+
+    na_b_sorted = np.sort(na_b)
+    na_i = np.searchsorted(na_b_sorted, na_a)
+    # NOTE: na_i == na_b_sorted.size for values larger than all in na_b.
+    na_i[na_i == na_b_sorted.size] = 0
+    return na_b_sorted[na_i] == na_a
+
+
 @codetiming.Timer('derive_DST_from_dir', logger=None)
-def derive_DST_from_dir(root_dir):
+def derive_DST_from_dir(
+    root_dir, n_workers=None, inventory_path=None, full_rescan=False,
+    iddt_filters=None,
+):
     '''
     Derive a DST from a directory tree datasets. Searches directory
     recursively.
@@ -142,6 +633,24 @@ def derive_DST_from_dir(root_dir):
     Parameters
     ----------
     root_dir : String. Path to pre-existing directory.
+    n_workers : None or int >= 1.
+        Number of threads used for listing directories and stat'ing files.
+        None: Use erikpgjohansson.solo.soar.const.N_DIR_SCAN_WORKERS.
+    inventory_path : None or string.
+        None: Scan the entire directory tree.
+        String: Path to a persistent inventory (SQLite database file; is
+        created if it does not exist) from which the content of directories
+        which have not changed since the last scan is taken. See
+        erikpgjohansson.solo.soar.inventory.
+    full_rescan : bool
+        Whether to scan the entire directory tree also when using an
+        inventory (and then replace the content of the inventory).
+    iddt_filters : None, or tuple of
+            erikpgjohansson.solo.iddt.IddtSubtreeFilter.
+        None: Scan the entire directory tree.
+        Tuple: Assume that root_dir is an IDDT and only scan subdirectories
+        which are selected by any of the filters (pruning). Files in other
+        subdirectories are ignored. Can not be combined with inventory_path.
 
     Returns
     -------
@@ -149,55 +658,96 @@ def derive_DST_from_dir(root_dir):
     '''
     erikpgjohansson.solo.asserts.is_dir(root_dir)
 
-    ls_file_name            = []
-    ls_file_path            = []
-    ls_file_version_nbr     = []
-    ls_item_id              = []
-    ls_file_size            = []
-    ls_instrument           = []
-    ls_level                = []
-    ls_begin_time_file_name = []    # Time derived from filename.
-    for (dirPath, _subDirNameList, dirFileNamesList) in os.walk(root_dir):
-        for fileName in dirFileNamesList:
-
-            dsfn = \
-                erikpgjohansson.solo.metadata.DatasetFilename.parse_filename(
-                    fileName,
-                )
-            # IMPLEMENTATION NOTE:
-            # erikpgjohansson.solo.metadata.DatasetFilename.parse_filename()
-            # returns None for non-parsable filenames.
-            if dsfn:
-                _dataSrc, level, instrument, _descriptor = \
-                    erikpgjohansson.solo.metadata.parse_DSID(dsfn.dsid)
-
-                filePath = os.path.join(dirPath, fileName)
-                ls_file_path        += [filePath]
-                ls_file_name        += [fileName]
-                ls_file_version_nbr += [int(dsfn.version_str)]
-                ls_item_id          += [dsfn.item_id]
-                ls_file_size        += [os.stat(filePath).st_size]
-                ls_instrument       += [instrument]
-                ls_level            += [level]
-
-                # NOTE: datetime.datetime requires integer seconds+microseconds
-                # in separate arguments (as integers). Filenames should only
-                # contain time with microseconds=0 so we ignore them.
-                tv1    = list(dsfn.tv1)
-                tv1[5] = int(tv1[5])
-                ls_begin_time_file_name += [datetime.datetime(*tv1)]
+    if iddt_filters is None:
+        select_subdir = None
+    else:
+        assert inventory_path is None
+        iddt_filters = tuple(iddt_filters)
+        assert all(
+            isinstance(f, erikpgjohansson.solo.iddt.IddtSubtreeFilter)
+            for f in iddt_filters
+        )
+
+        def select_subdir(tpl_dir_name):
+            return any(f.select_subdir(tpl_dir_name) for f in iddt_filters)
+
+    if inventory_path is None:
+        # IMPLEMENTATION NOTE: Lists directories concurrently since this is
+        # slow on network filesystems. Same result (and order) as os.walk().
+        ls_entry = erikpgjohansson.solo.soar.scan.scan_dir_tree(
+            root_dir, n_workers, select_subdir=select_subdir,
+        )
+        ls_file_name = [entry.name for entry in ls_entry]
+        ls_file_path = [entry.path for entry in ls_entry]
+
+        def get_file_sizes(na_i):
+            return erikpgjohansson.solo.soar.scan.get_file_sizes(
+                [ls_entry[i] for i in na_i], n_workers,
+            )
+    else:
+        inv = erikpgjohansson.solo.soar.inventory.DirTreeInventory(
+            inventory_path,
+        )
+        ls_file_name, ls_file_path, ls_file_size = inv.scan(
+            root_dir, n_workers=n_workers, full_rescan=full_rescan,
+        )
+        na_file_size_all = np.array(ls_file_size, dtype='int64')
+
+        def get_file_sizes(na_i):
+            return na_file_size_all[na_i]
+
+    return derive_DST_from_files(ls_file_name, ls_file_path, get_file_sizes)
+
+
+def derive_DST_from_files(ls_file_name, ls_file_path, get_file_sizes):
+    '''
+    Derive a DST from a list of files.
+
+    NOTE: Ignores filenames that can not be parsed as datasets.
+
+
+    Parameters
+    ----------
+    ls_file_name : List of filenames.
+    ls_file_path : List of paths to the same files.
+    get_file_sizes : Function na_i --> na_file_size.
+        Returns the file sizes (1D int64 array) for the files with the
+        specified indices (1D int array) into ls_file_name/ls_file_path. Is
+        only called (once) for the files which are datasets, so that only
+        those need to be stat'ed.
+
+    Returns
+    -------
+    dst
+    '''
+    # IMPLEMENTATION NOTE: Parse all filenames at once (faster).
+    # Non-parsable filenames are ignored.
+    na_b_parsed, dc_na_fn = erikpgjohansson.solo.metadata.parse_filenames(
+        ls_file_name,
+    )
+
+    # ASSERTION: All datasets have DSIDs which can be parsed by
+    # erikpgjohansson.solo.metadata.parse_DSID().
+    na_b_bad_dsid = na_b_parsed & (dc_na_fn['level'] == None)   # noqa: E711
+    for dsid in set(dc_na_fn['dsid'][na_b_bad_dsid]):
+        # NOTE: Raises exception.
+        erikpgjohansson.solo.metadata.parse_DSID(dsid)
+
+    na_file_path = np.array(ls_file_path, dtype=object)[na_b_parsed]
+    na_file_size = get_file_sizes(np.flatnonzero(na_b_parsed))
+    erikpgjohansson.solo.soar.utils.assert_1D_NA(na_file_size)
+    assert na_file_size.size == na_file_path.size
 
     dst = DatasetsTable({
-        'file_name':        np.array(ls_file_name,        dtype=object),
-        'file_path':        np.array(ls_file_path,        dtype=object),
-        'item_version':     np.array(ls_file_version_nbr, dtype='int64'),
-        'item_id':          np.array(ls_item_id,          dtype=object),
-        'file_size':        np.array(ls_file_size,        dtype='int64'),
-        'begin_time_FN':    np.array(
-            ls_begin_time_file_name, dtype='datetime64[ms]',
-        ),
-        'instrument':       np.array(ls_instrument,       dtype=object),
-        'processing_level': np.array(ls_level,            dtype=object),
+        'file_name':        np.array(ls_file_name, dtype=object)[na_b_parsed],
+        'file_path':        na_file_path,
+        'item_version':     dc_na_fn['version_nbr'][na_b_parsed],
+        'item_id':          dc_na_fn['item_id'][na_b_parsed],
+        'file_size':        na_file_size,
+        # NOTE: Time derived from filename.
+        'begin_time_FN':    dc_na_fn['begin_dt64'][na_b_parsed],
+        'instrument':       dc_na_fn['instrument'][na_b_parsed],
+        'processing_level': dc_na_fn['level'][na_b_parsed],
     })
     # NOTE: Key name "processing_level" chosen to be in agreement with
     # erikpgjohansson.solo.soar.dwld.SoarDownloader.download_SDT_DST().
@@ -0,0 +1,208 @@
+'''
+Module for queries (filter expressions) on DSTs.
+
+A query is a tree of objects (predicates combined with &, |, ~) which is
+evaluated to a boolean numpy array (one value per DST row) using vectorized
+numpy operations only. Predicates on string (object) columns, which can not
+be vectorized by numpy, are evaluated once per unique value and then
+broadcast to all rows (categorical columns).
+
+Ex:
+    q = (
+        dstq.IsIn('instrument', ['EPD', 'MAG'])
+        & dstq.Range(
+            'begin_time_FN',
+            np.datetime64('2022-01-01'), np.datetime64('2023-01-01'),
+        )
+        & ~dstq.Prefix('item_id', 'solo_LL02_')
+    )
+    dst2 = dst.select(q)
+
+DSTQ = DST Query
+'''
+
+
+import abc
+import erikpgjohansson.solo.soar.dst
+import numpy as np
+import re
+
+
+'''
+PROPOSAL: Predicates for numeric comparisons (<, <=, >, >=).
+    NOTE: Can already be handled by Range.
+PROPOSAL: Overload comparison operators on a column object.
+    Ex: dstq.Column('instrument') == 'EPD'
+    CON: Overkill.
+'''
+
+
+class Query(abc.ABC):
+    '''Abstract class for a query which can be evaluated on a DST.'''
+
+    @abc.abstractmethod
+    def derive_NA_b(
+        self, dst: erikpgjohansson.solo.soar.dst.DatasetsTable,
+    ) -> np.ndarray:
+        '''
+        Evaluate the query on a DST.
+
+        Returns
+        -------
+        na_b : 1D numpy bool array. One value per row.
+        '''
+        raise NotImplementedError()
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class _CategoricalQuery(Query):
+    '''Query which evaluates a Python function once per unique value of a
+    column.'''
+
+    def __init__(self, key):
+        assert type(key) is str
+        self._key = key
+
+    @abc.abstractmethod
+    def _value_in_query(self, value) -> bool:
+        raise NotImplementedError()
+
+    def derive_NA_b(self, dst):
+        na_unique, na_i_inverse = dst.factorize(self._key)
+        na_b_unique = np.fromiter(
+            (self._value_in_query(value) for value in na_unique),
+            dtype=bool, count=na_unique.size,
+        )
+        return na_b_unique[na_i_inverse]
+
+
+class Eq(Query):
+    '''Column value is equal to a specified value.'''
+
+    def __init__(self, key, value):
+        assert type(key) is str
+        self._key = key
+        self._value = value
+
+    def derive_NA_b(self, dst):
+        return np.asarray(dst[self._key] == self._value, dtype=bool)
+
+
+class IsIn(Query):
+    '''Column value is equal to any one of multiple specified values.'''
+
+    def __init__(self, key, ls_value):
+        assert type(key) is str
+        self._key = key
+        self._ls_value = tuple(ls_value)
+
+    def derive_NA_b(self, dst):
+        na = dst[self._key]
+        if na.dtype == object:
+            # IMPLEMENTATION NOTE: numpy.isin() sorts object arrays, which is
+            # slow. Few values are compared one at a time instead.
+            na_b = np.zeros(na.shape, dtype=bool)
+            for value in self._ls_value:
+                na_b |= (na == value)
+            return na_b
+        else:
+            return np.isin(na, np.array(self._ls_value, dtype=na.dtype))
+
+
+class Range(Query):
+    '''Column value is within a half-open range: begin <= value < end.
+
+    Intended for datetime64 columns but works for any ordered numpy type.
+    NaT is never within any range.
+    '''
+
+    def __init__(self, key, begin=None, end=None):
+        '''
+        Parameters
+        ----------
+        key
+        begin : None, or lower bound (inclusive). None=no lower bound.
+        end   : None, or upper bound (exclusive). None=no upper bound.
+        '''
+        assert type(key) is str
+        self._key = key
+        self._begin = begin
+        self._end = end
+
+    def derive_NA_b(self, dst):
+        na = dst[self._key]
+
+        na_b = np.ones(na.shape, dtype=bool)
+        if np.issubdtype(na.dtype, np.datetime64):
+            na_b &= ~np.isnat(na)
+        if self._begin is not None:
+            na_b &= (na >= self._begin)
+        if self._end is not None:
+            na_b &= (na < self._end)
+        return na_b
+
+
+class Prefix(_CategoricalQuery):
+    '''String column value begins with a specified prefix.'''
+
+    def __init__(self, key, prefix: str):
+        super().__init__(key)
+        assert type(prefix) is str
+        self._prefix = prefix
+
+    def _value_in_query(self, value):
+        return type(value) is str and value.startswith(self._prefix)
+
+
+class Regex(_CategoricalQuery):
+    '''String column value matches a regular expression (re.search(), i.e.
+    not anchored unless the regular expression is).'''
+
+    def __init__(self, key, regexp: str):
+        super().__init__(key)
+        assert type(regexp) is str
+        self._pattern = re.compile(regexp)
+
+    def _value_in_query(self, value):
+        return type(value) is str and bool(self._pattern.search(value))
+
+
+class And(Query):
+    def __init__(self, *ls_query):
+        assert all(isinstance(q, Query) for q in ls_query)
+        self._ls_query = ls_query
+
+    def derive_NA_b(self, dst):
+        na_b = np.ones(dst.n_rows if dst.n_rows else 0, dtype=bool)
+        for q in self._ls_query:
+            na_b &= q.derive_NA_b(dst)
+        return na_b
+
+
+class Or(Query):
+    def __init__(self, *ls_query):
+        assert all(isinstance(q, Query) for q in ls_query)
+        self._ls_query = ls_query
+
+    def derive_NA_b(self, dst):
+        na_b = np.zeros(dst.n_rows if dst.n_rows else 0, dtype=bool)
+        for q in self._ls_query:
+            na_b |= q.derive_NA_b(dst)
+        return na_b
+
+
+class Not(Query):
+    def __init__(self, query):
+        assert isinstance(query, Query)
+        self._query = query
+
+    def derive_NA_b(self, dst):
+        return ~self._query.derive_NA_b(dst)
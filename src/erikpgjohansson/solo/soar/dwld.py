@@ -32,7 +32,6 @@ Created by Erik P G Johansson 2020-10-12, IRF Uppsala, Sweden.
 
 import abc
 import codetiming
-import datetime
 import erikpgjohansson.solo.asserts
 import erikpgjohansson.solo.soar.const as const
 import erikpgjohansson.solo.soar.dst
@@ -380,7 +379,7 @@ class SoarDownloaderImpl(SoarDownloader):
 
 
 @codetiming.Timer('download_SDT_DST', logger=None)
-def download_SDT_DST(sodl: SoarDownloader):
+def download_SDT_DST(sodl: SoarDownloader, ls_instrument=None):
     '''
     Download table of datasets (+metadata) from SOAR.
 
@@ -402,11 +401,20 @@ def download_SDT_DST(sodl: SoarDownloader):
 
     NOTE: See notes at top of file.
     NOTE: Same dataset may have multiple versions in list.
+
+    Parameters
+    ----------
+    ls_instrument : None, or non-empty list/tuple of instruments to download
+        the table for. None: Use
+        erikpgjohansson.solo.soar.const.LS_SOAR_INSTRUMENTS.
     '''
     assert isinstance(sodl, SoarDownloader)
+    if ls_instrument is None:
+        ls_instrument = erikpgjohansson.solo.soar.const.LS_SOAR_INSTRUMENTS
+    assert len(ls_instrument) > 0
 
     ls_dst = []
-    for instrument in erikpgjohansson.solo.soar.const.LS_SOAR_INSTRUMENTS:
+    for instrument in ls_instrument:
         dc_json = sodl.download_SDT_JSON(instrument)
         ls_dst.append(_convert_JSON_SDT_to_DST(dc_json))
 
@@ -467,58 +475,37 @@ class _JsonSdtData:
 
 
 def _filename_NA_to_begin_time_NA(na_filename):
-    n_rows = len(na_filename)
-    na_dt64_begin = np.full(
-        n_rows, np.datetime64('nat'), dtype='datetime64[ms]',
+    # IMPLEMENTATION NOTE: Parse all filenames at once (faster).
+    na_b_parsed, dc_na_fn = erikpgjohansson.solo.metadata.parse_filenames(
+        na_filename,
     )
-    for i_row in range(n_rows):
-        filename = na_filename[i_row]
-        dsfn = erikpgjohansson.solo.metadata.DatasetFilename.\
-            parse_filename(filename)
-
-        # IMPORTANT NOTE:
-        # erikpgjohansson.solo.metadata.DatasetFilename.parse_filename()
-        # might fail for datasets which have a valid non-null
-        # begin_time. Is therefore dependent on how well-implemented
-        # that function is.
-
-        if dsfn and len(dsfn.tv1) == 6:
-            # =========================================================
-            # CASE: Can parse dataset filename and time interval string
-            # =========================================================
-
-            # NOTE: datetime.datetime requires integer seconds+microseconds
-            # in separate arguments (as integers). Filenames should only
-            # contain time with microseconds=0 so we ignore them.
-            tv1    = list(dsfn.tv1)
-            tv1[5] = int(tv1[5])
-            value  = datetime.datetime(*tv1)
-            na_dt64_begin[i_row] = np.datetime64(value, 'ms')
-
-            # NOTE: Ex:
-            # solo_LL02_eui-fsi174-image_20201021T100259_V01C.fits
-            # has begin_time = null, despite having a begin_time_FN.
-
-            # ==> Can therefore not assert that there should be a
-            #     begin_time_FN.
-            #     assert not np.isnat(dst['begin_time'][i_row])
-            # except Exception as E:
-            #     pass   # For setting breakpoints
-            #     raise E
-        else:
-            # ============================
-            # CASE: Can NOT parse filename
-            # ============================
-
-            # ASSERTION: Assert that file is any of the known cases that
-            # erikpgjohansson.solo.metadata.DatasetFilename.parse_filename()    # noqa: E501
-            # can not handle.
-            filename_suffix = pathlib.Path(filename).suffix
-            assert (filename_suffix in const.FILE_SUFFIX_IGNORE_LIST), (
-                f'Can neither parse SOAR file name "{filename}",'
-                f' nor recognize the file suffix "{filename_suffix}"'
-                f' as a file type that should be ignored.'
-            )
+    na_dt64_begin = dc_na_fn['begin_dt64']
+
+    # IMPORTANT NOTE:
+    # erikpgjohansson.solo.metadata.parse_filenames()
+    # might fail for datasets which have a valid non-null
+    # begin_time. Is therefore dependent on how well-implemented
+    # that function is.
+
+    # NOTE: Ex:
+    # solo_LL02_eui-fsi174-image_20201021T100259_V01C.fits
+    # has begin_time = null, despite having a begin_time_FN.
+    # ==> Can therefore not assert that there should be a
+    #     begin_time_FN.
+    #     assert not np.isnat(dst['begin_time'][i_row])
+
+    # CASE: Can NOT parse dataset filename and time interval string (as UTC).
+    na_b_not_parsed = ~na_b_parsed | np.isnat(na_dt64_begin)
+    for filename in na_filename[na_b_not_parsed]:
+        # ASSERTION: Assert that file is any of the known cases that
+        # erikpgjohansson.solo.metadata.parse_filenames()
+        # can not handle.
+        filename_suffix = pathlib.Path(filename).suffix
+        assert (filename_suffix in const.FILE_SUFFIX_IGNORE_LIST), (
+            f'Can neither parse SOAR file name "{filename}",'
+            f' nor recognize the file suffix "{filename_suffix}"'
+            f' as a file type that should be ignored.'
+        )
 
     return na_dt64_begin
 
@@ -0,0 +1,283 @@
+'''
+Module for a persistent (on-disk) inventory of the files in a directory tree.
+
+Used for speeding up repeated scans of the local datasets (the sync
+directory) when only a few directories change between scans. Stores, per
+directory, the directory mtime and the directory entries (subdirectories,
+files, and sizes of dataset files) in an SQLite database. When scanning,
+directories whose mtime has not changed are not listed again.
+
+NOTE: A directory's mtime changes when entries are added, removed or renamed
+in it, but not when an existing file is modified in-place. A dataset file
+which is overwritten in-place (same filename) with a different size will
+therefore not be detected until a full rescan. The mirror code never does
+this (it moves/renames files into place).
+'''
+
+
+import concurrent.futures
+import contextlib
+import erikpgjohansson.solo.metadata
+import erikpgjohansson.solo.soar.const as const
+import erikpgjohansson.solo.soar.scan
+import json
+import logging
+import os
+import sqlite3
+import time
+
+
+'''
+PROPOSAL: Store the inventory as columnar snapshot (e.g. numpy .npz).
+    CON: Can not update individual directories.
+'''
+
+
+_SCHEMA_VERSION = '1'
+
+_MTIME_MARGIN_NS = 2_000_000_000
+'''Directories modified less than this long before being scanned are not
+trusted to be unchanged on the next scan (their mtime is not stored). Protects
+against modifications within the mtime resolution of the filesystem (which
+can be coarse on network filesystems).'''
+
+_MTIME_NS_UNKNOWN = -1
+
+
+class DirTreeInventory:
+    '''Persistent inventory of the files in one directory tree, stored in an
+    SQLite database file.
+
+    Directories are identified by their path relative to the root directory.
+    The database is discarded (full rescan) if it was created for another
+    root directory.
+    '''
+
+    def __init__(self, db_path):
+        '''
+        Parameters
+        ----------
+        db_path : String. Path to SQLite database file. Is created if it does
+            not exist.
+        '''
+        self._db_path = db_path
+
+    def scan(self, root_dir, n_workers=None, full_rescan=False):
+        '''
+        Recursively list all files in a directory tree, and update the
+        inventory. Only lists directories which have changed since the last
+        scan (unless full_rescan=True).
+
+        The result is identical to using
+        erikpgjohansson.solo.soar.scan.scan_dir_tree() (and os.walk()),
+        including the order of the files.
+
+
+        Parameters
+        ----------
+        root_dir : String. Path to directory.
+        n_workers : None or int >= 1.
+            Number of threads. None: Use const.N_DIR_SCAN_WORKERS.
+        full_rescan : bool
+            Whether to ignore the pre-existing inventory and list all
+            directories.
+
+
+        Returns
+        -------
+        (ls_file_name, ls_file_path, ls_file_size)
+        ls_file_size : List of int. File size for files whose filenames are
+            parsed by erikpgjohansson.solo.metadata.parse_filenames() (dataset
+            files). -1 for other files (which are not stat'ed).
+        '''
+        if n_workers is None:
+            n_workers = const.N_DIR_SCAN_WORKERS
+        assert type(n_workers) is int and n_workers >= 1
+
+        L = logging.getLogger(__name__)
+
+        # NOTE: "with con" commits (or rolls back) the transaction, but does
+        # not close the connection.
+        with contextlib.closing(sqlite3.connect(self._db_path)) as con, con:
+            dc_dir_old = self._read(con, root_dir, full_rescan)
+
+            # Dictionary rel_path --> (mtime_ns, ls_subdir_name, ls_file_name,
+            # ls_file_size) for all directories in the tree.
+            dc_dir = {}
+            # Relative paths of directories which were listed (changed).
+            ls_rel_path_listed = []
+
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=n_workers,
+            ) as executor:
+
+                dc_future_rel_path = {}
+
+                def submit(rel_path):
+                    dir_path = os.path.join(root_dir, rel_path) \
+                        if rel_path else root_dir
+                    future = executor.submit(
+                        _scan_dir, dir_path, dc_dir_old.get(rel_path),
+                    )
+                    dc_future_rel_path[future] = rel_path
+
+                submit('')
+                while dc_future_rel_path:
+                    set_done, _ = concurrent.futures.wait(
+                        dc_future_rel_path,
+                        return_when=concurrent.futures.FIRST_COMPLETED,
+                    )
+                    for future in set_done:
+                        rel_path = dc_future_rel_path.pop(future)
+                        dir_tuple, b_listed = future.result()
+                        dc_dir[rel_path] = dir_tuple
+                        if b_listed:
+                            ls_rel_path_listed.append(rel_path)
+                        for subdir_name in dir_tuple[1]:
+                            submit(os.path.join(rel_path, subdir_name))
+
+            dc_dir_update = {
+                rel_path: dc_dir[rel_path] for rel_path in ls_rel_path_listed
+            }
+            self._write(
+                con, root_dir, dc_dir_update, set(dc_dir_old) - set(dc_dir),
+            )
+
+        L.info(
+            f'Scanned {len(dc_dir)} directories under "{root_dir}",'
+            f' of which {len(ls_rel_path_listed)} were listed'
+            ' (new or modified).',
+        )
+
+        # Concatenate the files in the same order as os.walk().
+        ls_file_name = []
+        ls_file_path = []
+        ls_file_size = []
+        ls_rel_path_stack = ['']
+        while ls_rel_path_stack:
+            rel_path = ls_rel_path_stack.pop()
+            dir_path = os.path.join(root_dir, rel_path) \
+                if rel_path else root_dir
+            _, ls_subdir_name, ls_file_name_dir, ls_file_size_dir = \
+                dc_dir[rel_path]
+            ls_file_name.extend(ls_file_name_dir)
+            ls_file_path.extend(
+                os.path.join(dir_path, file_name)
+                for file_name in ls_file_name_dir
+            )
+            ls_file_size.extend(ls_file_size_dir)
+            ls_rel_path_stack.extend(
+                os.path.join(rel_path, subdir_name)
+                for subdir_name in reversed(ls_subdir_name)
+            )
+
+        return ls_file_name, ls_file_path, ls_file_size
+
+    @staticmethod
+    def _read(con, root_dir, full_rescan):
+        '''Create tables (if needed) and read the inventory. Returns (and
+        empties) the inventory if the inventory is for another root
+        directory, another schema version, or if full_rescan=True.'''
+        con.execute(
+            'CREATE TABLE IF NOT EXISTS meta'
+            ' (key TEXT PRIMARY KEY, value TEXT)',
+        )
+        con.execute(
+            'CREATE TABLE IF NOT EXISTS dirs'
+            ' (rel_path TEXT PRIMARY KEY, mtime_ns INTEGER,'
+            ' subdir_names TEXT, file_names TEXT, file_sizes TEXT)',
+        )
+        dc_meta = dict(con.execute('SELECT key, value FROM meta'))
+        if full_rescan or dc_meta != {
+            'schema_version': _SCHEMA_VERSION,
+            'root_dir': os.path.realpath(root_dir),
+        }:
+            # NOTE: Stale rows would otherwise never be deleted, since
+            # _write() only deletes directories known from the inventory.
+            con.execute('DELETE FROM dirs')
+            return {}
+
+        return {
+            rel_path: (
+                mtime_ns, json.loads(subdir_names),
+                json.loads(file_names), json.loads(file_sizes),
+            )
+            for rel_path, mtime_ns, subdir_names, file_names, file_sizes
+            in con.execute('SELECT * FROM dirs')
+        }
+
+    @staticmethod
+    def _write(con, root_dir, dc_dir_update, set_rel_path_remove):
+        '''Write changes to the inventory (one transaction).'''
+        con.execute('DELETE FROM meta')
+        con.executemany(
+            'INSERT INTO meta VALUES (?, ?)', [
+                ('schema_version', _SCHEMA_VERSION),
+                ('root_dir', os.path.realpath(root_dir)),
+            ],
+        )
+        con.executemany(
+            'DELETE FROM dirs WHERE rel_path = ?',
+            [(rel_path,) for rel_path in set_rel_path_remove],
+        )
+        con.executemany(
+            'INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?)', [
+                (
+                    rel_path, mtime_ns, json.dumps(ls_subdir_name),
+                    json.dumps(ls_file_name), json.dumps(ls_file_size),
+                )
+                for rel_path, (
+                    mtime_ns, ls_subdir_name, ls_file_name, ls_file_size,
+                ) in dc_dir_update.items()
+            ],
+        )
+
+
+def _scan_dir(dir_path, dir_tuple_old):
+    '''
+    Scan one directory, unless it has not changed since the last scan.
+
+
+    Parameters
+    ----------
+    dir_path : String.
+    dir_tuple_old : None, or tuple from the last scan.
+
+
+    Returns
+    -------
+    (dir_tuple, b_listed)
+    dir_tuple : (mtime_ns, ls_subdir_name, ls_file_name, ls_file_size)
+    b_listed : Whether the directory was listed (not taken from inventory).
+    '''
+    # NOTE: Must stat directory BEFORE listing it. Modifications in between
+    # will then lead to relisting the directory on the next scan.
+    try:
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+    except OSError:
+        # CASE: Directory disappeared or is not accessible.
+        mtime_ns = _MTIME_NS_UNKNOWN
+
+    if dir_tuple_old is not None and mtime_ns != _MTIME_NS_UNKNOWN:
+        if dir_tuple_old[0] == mtime_ns:
+            # CASE: Directory has not changed.
+            return dir_tuple_old, False
+
+    if time.time_ns() - mtime_ns < _MTIME_MARGIN_NS:
+        mtime_ns = _MTIME_NS_UNKNOWN
+
+    ls_file_entry, ls_subdir_path = \
+        erikpgjohansson.solo.soar.scan.list_dir(dir_path)
+    ls_file_name = [entry.name for entry in ls_file_entry]
+
+    # NOTE: Only stat files which are datasets.
+    na_b_parsed, _ = erikpgjohansson.solo.metadata.parse_filenames(
+        ls_file_name,
+    )
+    ls_file_size = [
+        entry.stat().st_size if b_parsed else -1
+        for entry, b_parsed in zip(ls_file_entry, na_b_parsed)
+    ]
+    ls_subdir_name = [os.path.basename(path) for path in ls_subdir_path]
+
+    return (mtime_ns, ls_subdir_name, ls_file_name, ls_file_size), True
@@ -7,17 +7,24 @@ Initially created 2020-12-21 by Erik P G Johansson, IRF Uppsala, Sweden.
 
 import abc
 import codetiming
+import collections
+import concurrent.futures
+import datetime
 import erikpgjohansson.solo.asserts
 import erikpgjohansson.solo.iddt
 import erikpgjohansson.solo.metadata
 import erikpgjohansson.solo.soar.const as const
 import erikpgjohansson.solo.soar.dst
 import erikpgjohansson.solo.soar.dwld as dwld
+import erikpgjohansson.solo.soar.remove as remove
 import erikpgjohansson.solo.soar.utils as utils
+import erikpgjohansson.solo.soar.watch as watch
+import json
 import logging
+import multiprocessing
 import numpy as np
 import os
-import subprocess
+import time
 import typing
 import sys
 
@@ -153,6 +160,59 @@ class DatasetsSubset(abc.ABC):
         '''
         raise NotImplementedError()
 
+    def datasets_in_subset(
+        self,
+        na_instrument: np.ndarray, na_level: np.ndarray,
+        na_begin_dt64: np.ndarray, na_dsid: np.ndarray,
+    ) -> np.ndarray:
+        '''
+        Batch version of dataset_in_subset(). Determines for multiple datasets
+        at once whether they should be included in the sync.
+
+        The default implementation calls dataset_in_subset() once per dataset.
+        Subclasses can override it with a vectorized implementation, which
+        must return the same result.
+
+        Parameters
+        ----------
+        na_instrument : 1D numpy array of str (object).
+        na_level : 1D numpy array of str (object).
+        na_begin_dt64 : 1D numpy array of numpy.datetime64.
+        na_dsid : 1D numpy array of str (object).
+        --
+        NOTE: All arrays have the same length. One element per dataset.
+
+        Returns
+        -------
+        na_b_subset : 1D numpy bool array. One element per dataset.
+        '''
+        na_b_subset = np.zeros(na_instrument.shape, dtype=bool)
+        for i in range(na_instrument.size):
+            na_b_subset[i] = self.dataset_in_subset(
+                instrument=na_instrument[i],
+                level     =na_level[i],
+                begin_dt64=na_begin_dt64[i],
+                dsid      =str(na_dsid[i]),
+            )
+        return na_b_subset
+
+    def get_IDDT_filters(self) -> typing.Optional[tuple]:
+        '''
+        Return IDDT subtree filters which together select (at least) all IDDT
+        subdirectories which may contain datasets in the subset. Used for
+        only scanning the relevant parts of the sync directory when not
+        deleting datasets outside the subset.
+
+        The default implementation returns None. Subclasses can override it.
+
+        Returns
+        -------
+        None, if there are no filters (all subdirectories may be relevant).
+        Otherwise tuple of erikpgjohansson.solo.iddt.IddtSubtreeFilter. A
+        subdirectory is relevant iff it is selected by any filter.
+        '''
+        return None
+
 
 @codetiming.Timer('sync', logger=None)
 def sync(
@@ -162,11 +222,24 @@ def sync(
     removal_dir=None,
     remove_removal_dir=False,
     sodl: dwld.SoarDownloader = dwld.SoarDownloaderImpl(),
+    inventory_path=None,
+    full_rescan=False,
+    watcher: watch.LocalDatasetsWatcher = None,
+    throughput_path=None,
+    n_shard_processes=None,
+    remover: remove.Remover = None,
+    use_removal_command=False,
 ):
     '''
     Sync local directory with a specified subset of online SOAR datasets.
 
-    NOTE/BUG: Does not correct the locations of misplaced datasets.
+    NOTE: Local datasets which are not in their IDDT subdirectories
+    (misplaced) are relocated (renamed), not downloaded again. Renaming does
+    not count as removal.
+    NOTE: If delete_outside_subset=False (and no inventory or watcher is
+    used), then only the IDDT subtrees selected by dsss.get_IDDT_filters()
+    are scanned. Datasets in the subset which are misplaced outside those
+    subtrees are then not found (and are downloaded again).
 
 
     Parameters
@@ -192,12 +265,56 @@ def sync(
         the directory itself is itself optionally removed (depends on argument
         "remove_removal_dir").
         Removal directory may preexist. Is created if not.
+        NOTE: Unless use_removal_command=True, datasets are moved to a new
+        subdirectory per call (erikpgjohansson.solo.soar.remove.TrashRemover).
+        NOTE: One of removal_dir, remover and use_removal_command=True must
+        be specified. There is no default way of removing datasets.
     remove_removal_dir
         Bool. If using a removal directory, then whether to actually remove the
         removal directory or keep it.
+        NOTE: Unless use_removal_command=True, datasets are still moved to
+        the removal directory, after which all subdirectories created by
+        earlier calls (TrashRemover) are evicted, and the removal directory
+        is removed if empty.
     sodl
         erikpgjohansson.solo.soar.dwld.SoarDownloader object. The default value
         should be used except for automated tests.
+    inventory_path
+        None, or path to a persistent inventory (SQLite database file) of the
+        sync directory. If used, then only directories which have changed
+        since the last run are listed. Is created if it does not exist. See
+        erikpgjohansson.solo.soar.inventory.
+    full_rescan
+        Bool. If using an inventory, then whether to list all directories
+        anyway (and replace the content of the inventory).
+    watcher
+        None, or started erikpgjohansson.solo.soar.watch.LocalDatasetsWatcher
+        for sync_dir. If used, then the table of local datasets is taken from
+        it instead of scanning sync_dir. Useful when syncing repeatedly from
+        a long-running process. Can not be combined with inventory_path.
+    throughput_path
+        None, or path to JSON file in which the measured download throughput
+        is recorded. Is created if it does not exist. Used by plan_sync() for
+        estimating download times.
+    n_shard_processes
+        None, or int >= 1.
+        None: Sync in this process.
+        Int: Sharded sync. Work is partitioned by instrument and distributed
+        over a pool of this many processes. See _sync_sharded(). "dsss" and
+        "sodl" must then be picklable (e.g. not classes defined inside
+        functions).
+    remover
+        None, or erikpgjohansson.solo.soar.remove.Remover used for removing
+        local datasets. Can not be combined with removal_dir or
+        use_removal_command.
+        None: Remove using a built-in remover derived from removal_dir and
+        remove_removal_dir (see above), or using the external command.
+        NOTE: Use remove.UnlinkRemover() for deleting datasets directly
+        (can not be undone).
+    use_removal_command
+        Bool. Whether to remove using the external command
+        const.FILE_REMOVAL_COMMAND_LIST (and removal_dir, remove_removal_dir).
+        See erikpgjohansson.solo.soar.remove.CommandRemover.
 
 
     Return values
@@ -206,9 +323,12 @@ def sync(
     '''
     '''
     BUG: Does not correct the locations of misplaced datasets.
+        -- FIXED: Misplaced datasets are relocated. See
+           _find_misplaced_datasets().
         PROBLEM: How handle symlinks?
             Ex: Might be used for duplicating locations for backward
                 compatibility.
+            NOTE: Symlinks to datasets are relocated as symlinks.
         PROPOSAL: Make relative dataset path part of the information that
                   should be synced.
             CON: Will re-download files that have moved.
@@ -279,55 +399,140 @@ def sync(
         erikpgjohansson.solo.asserts.is_dir(temp_download_dir)
         assert isinstance(dsss, DatasetsSubset)
         assert type(n_max_datasets_net_remove) in [int, float]
+        _assert_removal_args(removal_dir, remover, use_removal_command)
 
         # IMPLEMENTATION NOTE: Useful to print Python executable to verify that
         # the correct Python environment is used.
         L.info(f'sys.executable = "{sys.executable}"')
 
-        # ==============================
-        # Create table of local datasets
-        # ==============================
-        # NOTE: Explicitly includes ALL versions, i.e. also NON-LATEST
-        # versions. There should theoretically only be one version of each
-        # dataset locally, but if there are more, then they should be
-        # included so that they can be removed (or kept in the rare but
-        # possible case of SOAR down-versioning datasets).
-        L.info('Producing table of pre-existing local datasets.')
-        dst_local = erikpgjohansson.solo.soar.dst.derive_DST_from_dir(sync_dir)
-        erikpgjohansson.solo.soar.dst.log_DST(
-            dst_local, 'Pre-existing local datasets that should be synced',
-        )
+        if n_shard_processes is not None:
+            _sync_sharded(
+                sync_dir, temp_download_dir, dsss, delete_outside_subset,
+                n_max_datasets_net_remove, removal_dir, remove_removal_dir,
+                sodl, inventory_path, full_rescan, watcher, throughput_path,
+                n_shard_processes, remover, use_removal_command,
+            )
+        else:
+            dst_soar_missing, dst_local_excess, dst_local_relocate = \
+                _calculate_sync(
+                    sodl, sync_dir, dsss, delete_outside_subset,
+                    n_max_datasets_net_remove, inventory_path, full_rescan,
+                    watcher,
+                )
+
+            _execute_sync_dir_SOAR_update(
+                sodl=sodl,
+                dst_soar_missing=dst_soar_missing,
+                dst_local_excess=dst_local_excess,
+                dst_local_relocate=dst_local_relocate,
+                sync_dir=sync_dir,
+                temp_download_dir=temp_download_dir,
+                removal_dir=removal_dir,
+                remove_removal_dir=remove_removal_dir,
+                throughput_path=throughput_path,
+                remover=remover,
+                use_removal_command=use_removal_command,
+            )
+
+        utils.log_codetiming()   # DEBUG
+        utils.log_cache_info()   # DEBUG
+
+    except Exception as e:
+        L.exception(e)
+        raise e
+
+
+def _sync_sharded(
+    sync_dir, temp_download_dir, dsss: DatasetsSubset,
+    delete_outside_subset, n_max_datasets_net_remove,
+    removal_dir, remove_removal_dir, sodl: dwld.SoarDownloader,
+    inventory_path, full_rescan, watcher, throughput_path,
+    n_processes, remover=None, use_removal_command=False,
+):
+    '''
+    Sharded version of sync(). Uses a pool of processes to avoid that
+    CPU-bound (GIL-bound) steps are serialized across instruments.
+
+    (1) Per instrument in const.LS_SOAR_INSTRUMENTS (one shard per task):
+        Download SDT, convert it to DST, and derive the reference datasets
+        (DSSS, latest versions). The local datasets are scanned in this
+        process at the same time.
+    (2) Centrally: Aggregate the reference datasets and calculate which
+        datasets to download and remove. n_max_datasets_net_remove is
+        enforced globally (for all shards together). Counts per shard are
+        logged.
+    (3) Per dataset instrument (one shard per task): Download, remove and
+        move datasets, like for a non-sharded sync. Every shard uses its own
+        temporary download subdirectory (and removal subdirectory).
+
+    NOTE: Versions are resolved per SDT instrument table. Assumes that the
+    same item ID does not occur in multiple instrument tables.
+    NOTE: Log messages from the worker processes are not handled by the
+    logging configuration of this process.
+    NOTE: "remover" (if not None) must be picklable. It is used by all
+    shards.
+    '''
+    assert type(n_processes) is int and n_processes >= 1
+    if watcher is not None:
+        assert isinstance(watcher, watch.LocalDatasetsWatcher)
+        assert inventory_path is None
+        assert os.path.samefile(watcher.root_dir, sync_dir)
+
+    L = logging.getLogger(__name__)
+    L.info(f'Sharded sync using {n_processes} processes.')
+
+    # IMPLEMENTATION NOTE: Uses "spawn" since forking a process with other
+    # threads (e.g. the thread scanning the local datasets, the watcher) is
+    # unsafe.
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_processes,
+        mp_context=multiprocessing.get_context('spawn'),
+    ) as executor:
+
+        # ==================================================================
+        # Create table of local datasets, and reference datasets (sharded)
+        # ==================================================================
+        with codetiming.Timer('sync: local datasets + SDT', logger=None):
+            dc_future_instrument = {
+                executor.submit(
+                    _derive_reference_DST_shard, sodl, instrument, dsss,
+                ): instrument
+                for instrument in const.LS_SOAR_INSTRUMENTS
+            }
+            dst_local = _derive_local_DST(
+                sync_dir, dsss, delete_outside_subset,
+                inventory_path, full_rescan, watcher,
+            )
+            n_rows_sdt = 0
+            dst_ref = None
+            for future, instrument in dc_future_instrument.items():
+                n_rows_sdt_shard, dst_ref_shard = future.result()
+                L.info(
+                    f'Shard {instrument}: {n_rows_sdt_shard} SDT rows,'
+                    f' {dst_ref_shard.n_rows} reference datasets.',
+                )
+                n_rows_sdt += n_rows_sdt_shard
+                dst_ref = dst_ref_shard if dst_ref is None \
+                    else dst_ref + dst_ref_shard
 
-        # ============
-        # Download SDT
-        # ============
-        L.info('Downloading SDT (SOAR Datasets Table).')
-        dst_sdt = dwld.download_SDT_DST(sodl)
         erikpgjohansson.solo.soar.dst.log_DST(
-            dst_sdt,
-            'SDT (SOAR Datasets Table):'
-            ' Synced and non-synced, all dataset versions,'
-            ' not necessarily all types of datasets.',
+            dst_local, 'Pre-existing local datasets that should be synced',
         )
-
-        # ASSERTION: SDT is not empty
-        # ---------------------------
-        # IMPLEMENTATION NOTE: SOAR might one day return a DST with zero
-        # datasets by mistake or due to bug. This could in turn lead to
-        # deleting all local datasets.
-        assert dst_sdt.n_rows > 0, (
+        # ASSERTION: SDT is not empty. See _calculate_sync().
+        assert n_rows_sdt > 0, (
             'SOAR returned an empty SDT (SOAR Datasets Table),'
             ' making it seem as if SOAR has no datasets.'
             ' This should imply that there is something wrong with either'
             ' (1) SOAR, or (2) this software.'
         )
-
-        dst_ref = _calculate_reference_DST(dst_sdt, dsss)
         erikpgjohansson.solo.soar.dst.log_DST(
             dst_ref,
             'Reference datasets that should be synced with local datasets',
         )
 
+        # ============================================
+        # Calculate update (globally enforced failsafe)
+        # ============================================
         dst_soar_missing, dst_local_excess = _calculate_sync_dir_update(
             dst_ref=dst_ref,
             dst_local=dst_local,
@@ -336,28 +541,501 @@ def sync(
             n_max_datasets_net_remove=n_max_datasets_net_remove,
         )
 
+        # NOTE: Relocations are cheap (renames) and are done centrally.
+        _relocate_files(
+            _find_misplaced_datasets(dst_local, dst_local_excess, sync_dir),
+        )
+
+        # =======================
+        # Execute update (sharded)
+        # =======================
+        ls_instrument = sorted(
+            set(dst_soar_missing['instrument']).union(
+                dst_local_excess['instrument'],
+            ),
+        )
+        dc_future_instrument = {}
+        for instrument in ls_instrument:
+            dst_soar_missing_shard = dst_soar_missing.index(
+                dst_soar_missing['instrument'] == instrument,
+            )
+            dst_local_excess_shard = dst_local_excess.index(
+                dst_local_excess['instrument'] == instrument,
+            )
+            n_download = dst_soar_missing_shard.n_rows
+            n_remove   = dst_local_excess_shard.n_rows
+            L.info(
+                f'Shard {instrument}: {n_download} datasets to download,'
+                f' {n_remove} datasets to remove'
+                f' (net number of datasets to remove:'
+                f' {n_remove - n_download}).',
+            )
+
+            temp_download_subdir = os.path.join(
+                temp_download_dir, instrument.lower(),
+            )
+            os.makedirs(
+                temp_download_subdir, mode=const.CREATE_DIR_PERMISSIONS,
+                exist_ok=True,
+            )
+            removal_subdir = None
+            if removal_dir is not None:
+                removal_subdir = os.path.join(removal_dir, instrument.lower())
+
+            future = executor.submit(
+                _execute_sync_dir_SOAR_update,
+                sodl=sodl,
+                dst_soar_missing=dst_soar_missing_shard,
+                dst_local_excess=dst_local_excess_shard,
+                sync_dir=sync_dir,
+                temp_download_dir=temp_download_subdir,
+                removal_dir=removal_subdir,
+                remove_removal_dir=remove_removal_dir,
+                remover=remover,
+                use_removal_command=use_removal_command,
+            )
+            dc_future_instrument[future] = instrument
+
+        t_begin = time.monotonic()
+        concurrent.futures.wait(dc_future_instrument)
+        sec = time.monotonic() - t_begin
+
+    # NOTE: Raise the first exception (if any) after all shards have
+    # finished. Log all of them.
+    ls_exception = []
+    for future, instrument in dc_future_instrument.items():
+        e = future.exception()
+        if e is not None:
+            L.error(f'Shard {instrument} failed: {e!r}')
+            ls_exception.append(e)
+    if ls_exception:
+        raise ls_exception[0]
+
+    if (throughput_path is not None) and (dst_soar_missing.n_rows > 0):
+        utils.record_download_throughput(
+            throughput_path, dst_soar_missing['file_size'].sum(), sec,
+        )
+
+
+def _derive_reference_DST_shard(
+    sodl: dwld.SoarDownloader, instrument, dsss: DatasetsSubset,
+):
+    '''
+    Download SDT for one instrument and derive the reference datasets. Run
+    in a worker process by _sync_sharded().
+
+    Returns
+    -------
+    (n_rows_sdt, dst_ref)
+    n_rows_sdt : Number of rows in the SDT.
+    dst_ref : DST (not a view, to avoid pickling the entire SDT).
+    '''
+    dst_sdt = dwld.download_SDT_DST(sodl, (instrument,))
+    dst_ref = _calculate_reference_DST(dst_sdt, dsss)
+    dst_ref = dst_ref.index(np.arange(dst_ref.n_rows))
+    return dst_sdt.n_rows, dst_ref
+
+
+def plan_sync(
+    sync_dir, dsss: DatasetsSubset,
+    plan_path=None,
+    delete_outside_subset=False,
+    n_max_datasets_net_remove=10,
+    sodl: dwld.SoarDownloader = dwld.SoarDownloaderImpl(),
+    inventory_path=None,
+    full_rescan=False,
+    watcher: watch.LocalDatasetsWatcher = None,
+    throughput_path=None,
+):
+    '''
+    Calculate what sync() would do ("dry run"), without downloading or
+    removing any datasets. The resulting plan can be reviewed, and then
+    applied using execute_plan() (possibly on another host, and later).
+
+    The plan is a JSON-compatible dictionary with
+    (1) the datasets to download, the local datasets to remove, and the
+        misplaced local datasets to relocate (columns),
+    (2) number of datasets and bytes per instrument and level, and
+    (3) the estimated download time, based on recently measured download
+        throughput (see argument throughput_path).
+
+
+    Parameters
+    ----------
+    plan_path
+        None, or path to JSON file to which the plan is written.
+    throughput_path
+        None, or path to JSON file with recorded download throughput (see
+        sync()). None, or no recorded throughput: No time estimate.
+    Other arguments: See sync().
+
+
+    Returns
+    -------
+    plan : dict
+    '''
+    L = logging.getLogger(__name__)
+
+    try:
+        assert isinstance(sodl, dwld.SoarDownloader)
+        erikpgjohansson.solo.asserts.is_dir(sync_dir)
+        assert isinstance(dsss, DatasetsSubset)
+        assert type(n_max_datasets_net_remove) in [int, float]
+
+        dst_soar_missing, dst_local_excess, dst_local_relocate = \
+            _calculate_sync(
+                sodl, sync_dir, dsss, delete_outside_subset,
+                n_max_datasets_net_remove, inventory_path, full_rescan,
+                watcher,
+            )
+
+        n_bytes_download = int(dst_soar_missing['file_size'].sum())
+        throughput = None
+        estimated_download_time_s = None
+        if throughput_path is not None:
+            throughput = utils.estimate_download_throughput(throughput_path)
+            if throughput is not None:
+                estimated_download_time_s = n_bytes_download / throughput
+
+        plan = {
+            'plan_format_version': _PLAN_FORMAT_VERSION,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'sync_dir': os.path.abspath(sync_dir),
+            'download': {
+                key: dst_soar_missing[key].tolist()
+                for key in _LS_PLAN_DOWNLOAD_KEY
+            },
+            'remove': {
+                key: dst_local_excess[key].tolist()
+                for key in _LS_PLAN_REMOVE_KEY
+            },
+            'relocate': {
+                key: dst_local_relocate[key].tolist()
+                for key in _LS_PLAN_RELOCATE_KEY
+            },
+            'summary': {
+                'download': _summarize_DST(dst_soar_missing),
+                'remove':   _summarize_DST(dst_local_excess),
+                'relocate': {'n_datasets': int(dst_local_relocate.n_rows)},
+            },
+            # Unit: bytes/s
+            'download_throughput': throughput,
+            'estimated_download_time_s': estimated_download_time_s,
+        }
+
+        if estimated_download_time_s is None:
+            s_time = 'n/a (no recorded download throughput)'
+        else:
+            s_time = str(
+                datetime.timedelta(seconds=round(estimated_download_time_s)),
+            )
+        L.info(
+            f'Sync plan: Download {dst_soar_missing.n_rows} datasets'
+            f' ({n_bytes_download / 2**20:.2f} MiB),'
+            f' remove {dst_local_excess.n_rows} datasets,'
+            f' relocate {dst_local_relocate.n_rows} datasets.'
+            f' Estimated download time: {s_time}',
+        )
+
+        if plan_path is not None:
+            with open(plan_path, 'w') as f:
+                json.dump(plan, f, indent=1)
+            L.info(f'Wrote sync plan to "{plan_path}".')
+
+        return plan
+
+    except Exception as e:
+        L.exception(e)
+        raise e
+
+
+def execute_plan(
+    plan, temp_download_dir,
+    removal_dir=None,
+    remove_removal_dir=False,
+    sodl: dwld.SoarDownloader = dwld.SoarDownloaderImpl(),
+    throughput_path=None,
+    remover: remove.Remover = None,
+    use_removal_command=False,
+):
+    '''
+    Apply a sync plan created by plan_sync(): Download and remove the
+    datasets listed in the plan, in the same way as sync().
+
+    NOTE: Does not check whether SOAR has changed since the plan was created.
+    Only checks that the local datasets to remove still exist with the
+    planned file sizes.
+
+
+    Parameters
+    ----------
+    plan : dict (returned from plan_sync()), or path to JSON file (written
+        by plan_sync()).
+    Other arguments: See sync().
+
+
+    Returns
+    -------
+    None.
+    '''
+    L = logging.getLogger(__name__)
+
+    try:
+        assert isinstance(sodl, dwld.SoarDownloader)
+        _assert_removal_args(removal_dir, remover, use_removal_command)
+        if type(plan) is not dict:
+            with open(plan) as f:
+                plan = json.load(f)
+        assert plan['plan_format_version'] == _PLAN_FORMAT_VERSION, \
+            'Unsupported sync plan format version.'
+        sync_dir = plan['sync_dir']
+        erikpgjohansson.solo.asserts.is_dir(sync_dir)
+        erikpgjohansson.solo.asserts.is_dir(temp_download_dir)
+
+        dst_soar_missing = _convert_plan_columns_to_DST(plan['download'])
+        dst_local_excess = _convert_plan_columns_to_DST(plan['remove'])
+        dst_local_relocate = _convert_plan_columns_to_DST(plan['relocate'])
+
+        # ASSERTION: The local datasets have not changed since planning.
+        # IMPLEMENTATION NOTE: Protects against removing datasets which have
+        # been replaced since the plan was created.
+        for file_path, file_size in zip(
+            dst_local_excess['file_path'], dst_local_excess['file_size'],
+        ):
+            b_ok = os.path.isfile(file_path)
+            b_ok = b_ok and (os.stat(file_path).st_size == file_size)
+            assert b_ok, (
+                f'Local dataset "{file_path}" which should be removed'
+                ' does not exist, or has another size than when planning.'
+            )
+
+        L.info(f'Executing sync plan created {plan["created"]}.')
         _execute_sync_dir_SOAR_update(
             sodl=sodl,
             dst_soar_missing=dst_soar_missing,
             dst_local_excess=dst_local_excess,
+            dst_local_relocate=dst_local_relocate,
             sync_dir=sync_dir,
             temp_download_dir=temp_download_dir,
             removal_dir=removal_dir,
             remove_removal_dir=remove_removal_dir,
+            throughput_path=throughput_path,
+            remover=remover,
+            use_removal_command=use_removal_command,
         )
 
-        utils.log_codetiming()   # DEBUG
-
     except Exception as e:
         L.exception(e)
         raise e
 
 
+_PLAN_FORMAT_VERSION = 1
+
+_LS_PLAN_DOWNLOAD_KEY = (
+    'item_id', 'file_name', 'file_size', 'instrument', 'processing_level',
+)
+'''DST columns stored in sync plans for datasets to download.'''
+
+_LS_PLAN_REMOVE_KEY = (
+    'file_path', 'file_name', 'file_size', 'instrument', 'processing_level',
+)
+'''DST columns stored in sync plans for local datasets to remove.'''
+
+_LS_PLAN_RELOCATE_KEY = ('file_path', 'new_file_path', 'file_name')
+'''DST columns stored in sync plans for local datasets to relocate.'''
+
+
+def _summarize_DST(dst):
+    '''Summarize DST as number of datasets and bytes per instrument and
+    level (JSON-compatible).'''
+    dc_sum = collections.defaultdict(lambda: [0, 0])
+    for instrument, level, file_size in zip(
+        dst['instrument'], dst['processing_level'], dst['file_size'],
+    ):
+        dc_sum[(instrument, level)][0] += 1
+        dc_sum[(instrument, level)][1] += int(file_size)
+
+    return {
+        'n_datasets': int(dst.n_rows),
+        'n_bytes':    int(dst['file_size'].sum()),
+        'instrument_level': [
+            {
+                'instrument': instrument, 'processing_level': level,
+                'n_datasets': n_datasets, 'n_bytes': n_bytes,
+            }
+            for (instrument, level), (n_datasets, n_bytes)
+            in sorted(dc_sum.items())
+        ],
+    }
+
+
+def _convert_plan_columns_to_DST(dc_ls):
+    '''Convert columns stored in a sync plan to DST.'''
+    return erikpgjohansson.solo.soar.dst.DatasetsTable({
+        key: np.array(
+            ls, dtype='int64' if key == 'file_size' else object,
+        )
+        for key, ls in dc_ls.items()
+    })
+
+
+def _calculate_sync(
+    sodl: dwld.SoarDownloader, sync_dir, dsss: DatasetsSubset,
+    delete_outside_subset, n_max_datasets_net_remove,
+    inventory_path, full_rescan, watcher,
+):
+    '''Calculate which datasets should be downloaded and which local
+    datasets should be removed. Does not modify any files. See sync() for
+    arguments.
+
+    Returns
+    -------
+    (dst_soar_missing, dst_local_excess, dst_local_relocate)
+    dst_local_relocate : See _find_misplaced_datasets().
+    '''
+    if watcher is not None:
+        assert isinstance(watcher, watch.LocalDatasetsWatcher)
+        assert inventory_path is None
+        assert os.path.samefile(watcher.root_dir, sync_dir)
+
+    # ==================================================================
+    # Create table of local datasets, and download SDT (concurrently)
+    # ==================================================================
+    # IMPLEMENTATION NOTE: Scanning the local datasets is disk-bound and
+    # downloading the SDT is network-bound. They are independent and are
+    # therefore done concurrently (scan in a separate thread).
+    with codetiming.Timer('sync: local datasets + SDT', logger=None):
+        dst_local, dst_sdt = _derive_local_DST_download_SDT(
+            sodl, sync_dir, dsss, delete_outside_subset,
+            inventory_path, full_rescan, watcher,
+        )
+    erikpgjohansson.solo.soar.dst.log_DST(
+        dst_local, 'Pre-existing local datasets that should be synced',
+    )
+    erikpgjohansson.solo.soar.dst.log_DST(
+        dst_sdt,
+        'SDT (SOAR Datasets Table):'
+        ' Synced and non-synced, all dataset versions,'
+        ' not necessarily all types of datasets.',
+    )
+
+    # ASSERTION: SDT is not empty
+    # ---------------------------
+    # IMPLEMENTATION NOTE: SOAR might one day return a DST with zero
+    # datasets by mistake or due to bug. This could in turn lead to
+    # deleting all local datasets.
+    assert dst_sdt.n_rows > 0, (
+        'SOAR returned an empty SDT (SOAR Datasets Table),'
+        ' making it seem as if SOAR has no datasets.'
+        ' This should imply that there is something wrong with either'
+        ' (1) SOAR, or (2) this software.'
+    )
+
+    dst_ref = _calculate_reference_DST(dst_sdt, dsss)
+    erikpgjohansson.solo.soar.dst.log_DST(
+        dst_ref,
+        'Reference datasets that should be synced with local datasets',
+    )
+
+    dst_soar_missing, dst_local_excess = _calculate_sync_dir_update(
+        dst_ref=dst_ref,
+        dst_local=dst_local,
+        dsss=dsss,
+        b_delete_outside_subset=delete_outside_subset,
+        n_max_datasets_net_remove=n_max_datasets_net_remove,
+    )
+    dst_local_relocate = _find_misplaced_datasets(
+        dst_local, dst_local_excess, sync_dir,
+    )
+    return dst_soar_missing, dst_local_excess, dst_local_relocate
+
+
+def _derive_local_DST_download_SDT(
+    sodl: dwld.SoarDownloader, sync_dir, dsss: DatasetsSubset,
+    delete_outside_subset, inventory_path, full_rescan, watcher,
+):
+    '''
+    Create table of local datasets and download the SDT, concurrently.
+
+    The local datasets are scanned in a separate thread while the SDT is
+    downloaded in the calling thread. Exceptions in either are propagated
+    (after both have finished). If both fail, then the exception from the
+    SDT download is propagated and the other one is logged.
+
+    Returns
+    -------
+    (dst_local, dst_sdt)
+    '''
+    L = logging.getLogger(__name__)
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix='sync_local_DST',
+    ) as executor:
+        future_dst_local = executor.submit(
+            _derive_local_DST,
+            sync_dir, dsss, delete_outside_subset,
+            inventory_path, full_rescan, watcher,
+        )
+
+        L.info('Downloading SDT (SOAR Datasets Table).')
+        try:
+            dst_sdt = dwld.download_SDT_DST(sodl)
+        except BaseException:
+            # NOTE: Can not abort the scan. Waits for it to finish.
+            e_local = future_dst_local.exception()
+            if e_local is not None:
+                L.error(
+                    'Producing table of pre-existing local datasets'
+                    ' also failed.', exc_info=e_local,
+                )
+            raise
+
+        dst_local = future_dst_local.result()
+
+    return dst_local, dst_sdt
+
+
+def _derive_local_DST(
+    sync_dir, dsss: DatasetsSubset, delete_outside_subset,
+    inventory_path, full_rescan, watcher,
+):
+    '''Create table of local datasets. See sync().'''
+    # NOTE: Explicitly includes ALL versions, i.e. also NON-LATEST
+    # versions. There should theoretically only be one version of each
+    # dataset locally, but if there are more, then they should be
+    # included so that they can be removed (or kept in the rare but
+    # possible case of SOAR down-versioning datasets).
+    L = logging.getLogger(__name__)
+
+    L.info('Producing table of pre-existing local datasets.')
+    if watcher is None:
+        # NOTE: Local datasets outside the subset are ignored anyway when
+        # not deleting them. ==> Only need to scan the IDDT subtrees which
+        # may contain datasets in the subset. The inventory covers the
+        # entire tree and is therefore not combined with pruning.
+        tpl_iddt_filter = None
+        if not delete_outside_subset and inventory_path is None:
+            tpl_iddt_filter = dsss.get_IDDT_filters()
+        return erikpgjohansson.solo.soar.dst.derive_DST_from_dir(
+            sync_dir,
+            inventory_path=inventory_path, full_rescan=full_rescan,
+            iddt_filters=tpl_iddt_filter,
+        )
+    else:
+        if full_rescan:
+            watcher.rescan()
+        return watcher.get_DST()
+
+
 def offline_cleanup(
     sync_dir, temp_download_dir, dsss: DatasetsSubset,
     b_delete_outside_subset=False,
     removal_dir=None,
     remove_removal_dir=False,
+    inventory_path=None,
+    full_rescan=False,
+    remover: remove.Remover = None,
+    use_removal_command=False,
 ):
     '''
     Given a temporary download directory and a local sync directory, both of
@@ -371,8 +1049,12 @@ def offline_cleanup(
     (1) cleaning up a non-nominal state (e.g. after a crash,
         after having killed the process, or after a bug), and
     (2) inserting manually downloaded datasets.
+
+    Arguments removal_dir, remove_removal_dir, inventory_path, full_rescan,
+    remover and use_removal_command: See sync().
     '''
     assert isinstance(dsss, DatasetsSubset)
+    _assert_removal_args(removal_dir, remover, use_removal_command)
 
     L = logging.getLogger(__name__)
 
@@ -392,7 +1074,9 @@ def offline_cleanup(
     )
 
     L.info('Producing table of pre-existing local datasets.')
-    dst_local = erikpgjohansson.solo.soar.dst.derive_DST_from_dir(sync_dir)
+    dst_local = erikpgjohansson.solo.soar.dst.derive_DST_from_dir(
+        sync_dir, inventory_path=inventory_path, full_rescan=full_rescan,
+    )
 
     dst_ref = _calculate_reference_DST(dst_local, dsss)
     dst_ref_missing, dst_local_excess = _calculate_sync_dir_update(
@@ -414,10 +1098,10 @@ def offline_cleanup(
     n_datasets = dst_local_excess.n_rows
     L.info(f'Removing {n_datasets} local datasets')
     ls_files_remove = dst_local_excess['file_path'].tolist()
-    stdout_str = _remove_files(
-        ls_files_remove, removal_dir, remove_removal_dir,
+    _remove_local_datasets(
+        ls_files_remove, removal_dir, remove_removal_dir, remover,
+        use_removal_command,
     )
-    L.info(stdout_str)
 
 
 @codetiming.Timer('_calculate_reference_DST', logger=None)
@@ -425,12 +1109,15 @@ def _calculate_reference_DST(dst, dsss: DatasetsSubset):
     ''''''
     '''
     PROPOSAL: Return logical indices, not DST.
+
+    NOTE: Returns a DST view (see DatasetsTable.index()). Columns are only
+    indexed when they are read.
     '''
     # =====================================================================
     # Select subset of SOAR datasets (item IDs) to be synced (all versions)
     # =====================================================================
     na_b_subset = _find_DST_subset(dsss, dst)
-    dst_subset = dst.index(na_b_subset)
+    dst_subset = dst.index(na_b_subset, view=True)
 
     # =========================================================================
     # Only keep latest version of each dataset in table
@@ -442,7 +1129,9 @@ def _calculate_reference_DST(dst, dsss: DatasetsSubset):
         dst_subset['item_id'],
         dst_subset['item_version'],
     )
-    dst_subset_latest_version = dst_subset.index(na_b_latest_version)
+    dst_subset_latest_version = dst_subset.index(
+        na_b_latest_version, view=True,
+    )
     return dst_subset_latest_version
 
 
@@ -501,7 +1190,7 @@ def _calculate_sync_dir_update(
         # "Hide"/ignore local datasets which are not recognized by
         # DSSS.
         na_b_local_subset = _find_DST_subset(dsss, dst_local)
-        dst_local = dst_local.index(na_b_local_subset)
+        dst_local = dst_local.index(na_b_local_subset, view=True)
         L.info(
             'NOTE: Only syncing against subset of local datasets.'
             ' Will NOT delete datasets outside the specified subset.',
@@ -515,8 +1204,8 @@ def _calculate_sync_dir_update(
         dst_ref['file_size'], dst_local['file_size'],
     )
 
-    dst_soar_missing = dst_ref.index(na_b_soar_missing)
-    dst_local_excess = dst_local.index(na_b_local_excess)
+    dst_soar_missing = dst_ref.index(na_b_soar_missing, view=True)
+    dst_local_excess = dst_local.index(na_b_local_excess, view=True)
 
     erikpgjohansson.solo.soar.dst.log_DST(
         dst_soar_missing, 'Online SOAR datasets that need to be downloaded',
@@ -555,7 +1244,8 @@ def _calculate_sync_dir_update(
 def _execute_sync_dir_SOAR_update(
     sodl: dwld.SoarDownloader,
     dst_soar_missing, dst_local_excess, sync_dir, temp_download_dir,
-    removal_dir, remove_removal_dir,
+    removal_dir, remove_removal_dir, throughput_path=None,
+    dst_local_relocate=None, remover=None, use_removal_command=False,
 ):
     '''Execute a pre-calculated syncing of local directory by downloading
     specified datasets and removing specified local datasets.
@@ -581,6 +1271,12 @@ def _execute_sync_dir_SOAR_update(
 
     L = logging.getLogger(__name__)
 
+    # ==========================
+    # Relocate misplaced datasets
+    # ==========================
+    if dst_local_relocate is not None:
+        _relocate_files(dst_local_relocate)
+
     # =================
     # Download datasets
     # =================
@@ -593,12 +1289,18 @@ def _execute_sync_dir_SOAR_update(
         download_latest_datasets_batch = \
             utils.download_latest_datasets_batch_nonparallel
 
+    t_begin = time.monotonic()
     download_latest_datasets_batch(
         sodl,
         dst_soar_missing['item_id'],
         dst_soar_missing['file_size'],
         temp_download_dir,
     )
+    if (throughput_path is not None) and (n_datasets > 0):
+        utils.record_download_throughput(
+            throughput_path,
+            dst_soar_missing['file_size'].sum(), time.monotonic() - t_begin,
+        )
 
     # =====================
     # Remove local datasets
@@ -610,10 +1312,10 @@ def _execute_sync_dir_SOAR_update(
     n_datasets = dst_local_excess.n_rows
     L.info(f'Removing {n_datasets} local datasets')
     ls_files_remove = dst_local_excess['file_path'].tolist()
-    stdout_str = _remove_files(
-        ls_files_remove, removal_dir, remove_removal_dir,
+    _remove_local_datasets(
+        ls_files_remove, removal_dir, remove_removal_dir, remover,
+        use_removal_command,
     )
-    L.info(stdout_str)
 
     # =================================================
     # Move downloaded datasets into sync directory tree
@@ -628,38 +1330,158 @@ def _execute_sync_dir_SOAR_update(
     )
 
 
-def _remove_files(ls_paths_remove, removal_dir, remove_removal_dir):
-    assert type(ls_paths_remove) in (list, tuple)
-    assert type(remove_removal_dir) is bool
+def _find_misplaced_datasets(dst_local, dst_local_excess, sync_dir):
+    '''
+    Find local datasets which are not in their IDDT subdirectories under the
+    sync directory, and which are not going to be removed anyway.
+
+    NOTE: Includes datasets outside the subset (if they are in dst_local).
+    NOTE: Ignores datasets for which no IDDT subdirectory can be derived, and
+    datasets whose correct path is already occupied by another local dataset,
+    or is the correct path of multiple local datasets.
+
+
+    Returns
+    -------
+    dst_local_relocate : DST with columns
+        'file_path'     : Current path.
+        'new_file_path' : Correct path.
+        'file_name'
+    '''
+    na_file_path = dst_local['file_path']
+    na_file_name = dst_local['file_name']
+
+    ls_rel_dir_path = erikpgjohansson.solo.iddt.get_IDDT_subdirs(
+        na_file_name.tolist(),
+    )
+    na_new_file_path = np.array([
+        None if rel_dir_path is None
+        else os.path.join(sync_dir, rel_dir_path, file_name)
+        for rel_dir_path, file_name in zip(ls_rel_dir_path, na_file_name)
+    ], dtype=object)
+
+    # NOTE: Compares normalized paths, since sync_dir may e.g. end with a
+    # slash.
+    set_path = {os.path.normpath(path) for path in na_file_path}
+    set_path_excess = {
+        os.path.normpath(path) for path in dst_local_excess['file_path']
+    }
+    cnt_new_path = collections.Counter(
+        os.path.normpath(path) for path in na_new_file_path
+        if path is not None
+    )
+
+    na_b_relocate = np.zeros(na_file_path.shape, dtype=bool)
+    for i, (path, new_path) in enumerate(zip(na_file_path, na_new_file_path)):
+        if new_path is None:
+            continue
+        path     = os.path.normpath(path)
+        new_path = os.path.normpath(new_path)
+        if (path == new_path) or (path in set_path_excess):
+            continue
+        if (new_path in set_path) or (cnt_new_path[new_path] > 1):
+            continue
+        na_b_relocate[i] = True
+
+    return erikpgjohansson.solo.soar.dst.DatasetsTable({
+        'file_path':     na_file_path[na_b_relocate],
+        'new_file_path': na_new_file_path[na_b_relocate],
+        'file_name':     na_file_name[na_b_relocate],
+    })
+
+
+def _relocate_files(dst_local_relocate):
+    '''
+    Move (rename) misplaced local datasets to their correct locations.
+    Renames are batched per destination directory (the directory is only
+    created once).
+
+    NOTE: Skips (and logs) files whose destination already exists, so that
+    no file is ever overwritten.
+    '''
     L = logging.getLogger(__name__)
 
-    for path_remove in ls_paths_remove:
-        # NOTE: Could be excessive logging/printing if
-        # const.FILE_REMOVAL_COMMAND_LIST also logs/prints.
-        L.info(f'Dataset selected for removal: {path_remove}')
+    dc_ls_path = collections.defaultdict(list)
+    for path, new_path in zip(
+        dst_local_relocate['file_path'], dst_local_relocate['new_file_path'],
+    ):
+        dc_ls_path[os.path.dirname(new_path)].append((path, new_path))
 
-    if removal_dir is not None:
-        L.info(f'Using removal directory "{removal_dir}"')
-        # NOTE: Permit pre-existing removal directory.
-        # NOTE: os.makedirs() can create directory recursively.
+    n_relocated = 0
+    for new_dir_path, ls_path in dc_ls_path.items():
         os.makedirs(
-            removal_dir, mode=const.CREATE_DIR_PERMISSIONS, exist_ok=True,
+            new_dir_path, mode=const.CREATE_DIR_PERMISSIONS, exist_ok=True,
         )
-        for path_remove in ls_paths_remove:
-            file_name = os.path.basename(path_remove)
-            final_path = os.path.join(removal_dir, file_name)
-            os.replace(path_remove, final_path)
+        for path, new_path in ls_path:
+            if os.path.lexists(new_path):
+                L.warning(
+                    f'Can not relocate misplaced dataset "{path}"'
+                    f' since the destination already exists: "{new_path}"',
+                )
+                continue
+            L.info(f'Relocating misplaced dataset: {path} --> {new_dir_path}')
+            os.replace(path, new_path)
+            n_relocated += 1
 
-        # NOTE: Replaces value of "ls_paths_remove".
-        ls_paths_remove = [removal_dir]
+    L.info(
+        f'Relocated {n_relocated} misplaced datasets'
+        f' to {len(dc_ls_path)} directories.',
+    )
 
-        if not remove_removal_dir:
-            return ''
 
-    stdoutBytes = subprocess.check_output(
-        const.FILE_REMOVAL_COMMAND_LIST + ls_paths_remove,
+def _assert_removal_args(removal_dir, remover, use_removal_command):
+    assert type(use_removal_command) is bool
+    if remover is not None:
+        assert isinstance(remover, remove.Remover)
+        assert removal_dir is None, \
+            'Can not combine removal_dir with remover.'
+        assert not use_removal_command, \
+            'Can not combine use_removal_command with remover.'
+    # NOTE: Deliberately no default, so that datasets are never deleted
+    # permanently unless explicitly requested.
+    b_ok = (remover is not None) or (removal_dir is not None)
+    b_ok = b_ok or use_removal_command
+    assert b_ok, (
+        'No way of removing local datasets specified. Specify removal_dir,'
+        ' remover, or use_removal_command=True.'
     )
-    return str(stdoutBytes, 'utf-8')
+
+
+def _remove_local_datasets(
+    ls_paths_remove, removal_dir, remove_removal_dir, remover,
+    use_removal_command,
+):
+    '''
+    Remove local datasets, using a remover. If no remover is specified, then
+    one is derived from the other arguments (see sync()).
+
+    NOTE: Raises exception only after having attempted to remove all files.
+    '''
+    assert type(ls_paths_remove) in (list, tuple)
+    assert type(remove_removal_dir) is bool
+
+    b_remove_removal_dir = False
+    if remover is None:
+        if use_removal_command:
+            remover = remove.CommandRemover(removal_dir, remove_removal_dir)
+        elif remove_removal_dir:
+            # NOTE: Evicts the new (and all old) batch directories
+            # immediately.
+            remover = remove.TrashRemover(removal_dir, max_age_s=0)
+            b_remove_removal_dir = True
+        else:
+            remover = remove.TrashRemover(removal_dir)
+
+    ls_outcome = remover.remove(ls_paths_remove)
+    if b_remove_removal_dir:
+        try:
+            os.rmdir(removal_dir)
+        except OSError:
+            # CASE: Removal directory contains other files.
+            pass
+    n_failed = remove.log_outcomes(ls_outcome)
+    if n_failed:
+        raise Exception(f'Failed to remove {n_failed} local datasets.')
 
 
 def _find_file_name_size_difference(
@@ -693,7 +1515,7 @@ def _find_file_name_size_difference(
     '''
     PROPOSAL: Move to utils.
         CON: Not generic enough.
-    PROPOSAL: Test code.
+    PROPOSAL: Test code. -- IMPLEMENTED
     '''
     # ==========
     # ASSERTIONS
@@ -707,27 +1529,17 @@ def _find_file_name_size_difference(
     # =========
     # ALGORITHM
     # =========
-    # NOTE: It is suspect that there is not some way of doing this using
-    # numpy functionality, but I have not yet found any numpy functionality
-    # for doing this in a better way.
-
-    na_file_name_size1 = np.array(
-        list(zip(na_file_name1, na_file_size1)),
-        dtype=[
-            ('file_name', na_file_name1.dtype),
-            ('file_size', na_file_size1.dtype),
-        ],
-    )
-    na_file_name_size2 = np.array(
-        list(zip(na_file_name2, na_file_size2)),
-        dtype=[
-            ('file_name', na_file_name2.dtype),
-            ('file_size', na_file_size2.dtype),
-        ],
-    )
-
-    na_b_diff12 = ~np.isin(na_file_name_size1, na_file_name_size2)
-    na_b_diff21 = ~np.isin(na_file_name_size2, na_file_name_size1)
+    # NOTE: Uses the generic DST diff (hash join). No per-row tuples are
+    # created and execution time scales ~linearly with the number of rows.
+    # See tests/mtest_erikpgjohansson_solo_soar_mirror.py for a benchmark.
+    DST = erikpgjohansson.solo.soar.dst.DatasetsTable
+    dst1 = DST({'file_name': na_file_name1, 'file_size': na_file_size1})
+    dst2 = DST({'file_name': na_file_name2, 'file_size': na_file_size2})
+
+    na_b_diff21, na_b_diff12, _, _ = \
+        erikpgjohansson.solo.soar.dst.derive_diff_NA_b(
+            dst1, dst2, key=('file_name', 'file_size'),
+        )
 
     # ASSERTIONS
     # NOTE: Many re-implementations have failed this assertion.
@@ -761,20 +1573,26 @@ def _find_DST_subset(
     na_level      = dst['processing_level']
     na_dt64_begin = dst['begin_time_FN']
 
-    na_dsid = np.array(
-        tuple(
-            erikpgjohansson.solo.metadata.parse_item_ID(item_id)['DSID']
-            for item_id in dst['item_id']
-        ),
+    # IMPLEMENTATION NOTE: Does not call
+    # erikpgjohansson.solo.metadata.parse_item_ID() per row since it is slow.
+    na_b_parsed, na_dsid = erikpgjohansson.solo.metadata.parse_item_IDs(
+        dst['item_id'],
+    )
+    if not na_b_parsed.all():
+        item_id = dst['item_id'][np.flatnonzero(~na_b_parsed)[0]]
+        raise AssertionError(f'Can not parse item ID "{item_id}".')
+
+    na_b_subset = dsss.datasets_in_subset(
+        na_instrument=na_instrument,
+        na_level     =na_level,
+        na_begin_dt64=na_dt64_begin,
+        na_dsid      =na_dsid,
     )
 
-    na_b_subset = np.zeros(na_instrument.shape, dtype=bool)
-    for i in range(na_instrument.size):
-        na_b_subset[i] = dsss.dataset_in_subset(
-            instrument=na_instrument[i],
-            level     =na_level[i],
-            begin_dt64=na_dt64_begin[i],
-            dsid      =str(na_dsid[i]),
-        )
+    # ASSERTION
+    # NOTE: Important since a bad DSSS (e.g. one returning too few True)
+    # could lead to deleting many datasets.
+    utils.assert_1D_NA(na_b_subset, np.dtype('bool'))
+    assert na_b_subset.shape == na_instrument.shape
 
     return na_b_subset
@@ -0,0 +1,452 @@
+'''
+Module for removing (local) files, e.g. datasets which have been replaced by
+later versions when syncing.
+
+Provides multiple removal backends ("removers") with the same interface:
+    UnlinkRemover   : Delete files directly.
+    TrashRemover    : Move files to a trash directory, from which old files
+                      are evicted based on age and/or total size (retention).
+    SnapshotRemover : Hard link files into a snapshot directory (preserving
+                      the relative paths), then delete the originals.
+    CommandRemover  : Use an external command (e.g.
+                      const.FILE_REMOVAL_COMMAND_LIST), optionally via a
+                      removal directory.
+All removers except CommandRemover operate on multiple files concurrently
+(thread pool), which hides latency on network filesystems, and report the
+outcome for every file.
+'''
+
+
+import abc
+import concurrent.futures
+import dataclasses
+import datetime
+import erikpgjohansson.solo.soar.const as const
+import logging
+import os
+import shutil
+import subprocess
+import time
+import typing
+
+
+'''
+PROPOSAL: Retention for removal directory of CommandRemover.
+PROPOSAL: Use trash directory on the same filesystem as each file
+          (e.g. per mount point).
+    PRO: Renames and hard links only work within one filesystem.
+'''
+
+
+@dataclasses.dataclass(frozen=True)
+class RemovalOutcome:
+    '''
+    Immutable. Outcome of removing one file.
+
+    Fields
+    ------
+    path : Path to the removed file.
+    error : None if the file was removed. Otherwise string describing the
+        error (exception).
+    '''
+    path:  str
+    error: typing.Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class Remover(abc.ABC):
+    '''Class for removing files. Subclasses implement different ways of
+    removing files.'''
+
+    @abc.abstractmethod
+    def remove(self, ls_path) -> list:
+        '''
+        Remove files.
+
+        Does not raise exception for individual files which can not be
+        removed. Those are reported in the returned outcomes instead.
+
+
+        Parameters
+        ----------
+        ls_path : List of paths to files.
+
+
+        Returns
+        -------
+        ls_outcome : List of RemovalOutcome. One per file, in the same order.
+        '''
+        raise NotImplementedError()
+
+
+class UnlinkRemover(Remover):
+    '''Delete files directly (no way of undoing).'''
+
+    def __init__(self, n_workers=None):
+        '''
+        Parameters
+        ----------
+        n_workers : None or int >= 1.
+            Number of threads. None: Use const.N_REMOVAL_WORKERS.
+        '''
+        self._n_workers = n_workers
+
+    # OVERRIDE
+    def remove(self, ls_path):
+        return _run_per_file(os.unlink, ls_path, self._n_workers)
+
+
+class _BatchDirRemover(Remover):
+    '''
+    Base class for removers which keep removed files in one new "batch
+    directory" per call to remove() under a common directory. Batch
+    directories are evicted (deleted) after every call, according to the
+    retention settings.
+
+    Batch directory names begin with the time of creation, so that
+    directories (and files) from earlier calls are recognized and can be
+    evicted in order of age.
+    '''
+
+    _BATCH_DIR_TIME_FORMAT = '%Y-%m-%dT%H.%M.%S'
+    _BATCH_DIR_TIME_LEN = 19
+
+    def __init__(
+        self, parent_dir, max_age_s=None, max_size_bytes=None,
+        n_workers=None,
+    ):
+        '''
+        Parameters
+        ----------
+        parent_dir : Path to directory under which batch directories are
+            created. Is created if it does not exist.
+        max_age_s : None, or number. Evict batch directories older than this.
+        max_size_bytes : None, or number. Evict the oldest batch directories
+            until the total size of the files in all batch directories is at
+            most this.
+        n_workers : None or int >= 1.
+            Number of threads. None: Use const.N_REMOVAL_WORKERS.
+        --
+        NOTE: None means no limit.
+        '''
+        for x in (max_age_s, max_size_bytes):
+            assert x is None or x >= 0
+        self._parent_dir     = parent_dir
+        self._max_age_s      = max_age_s
+        self._max_size_bytes = max_size_bytes
+        self._n_workers      = n_workers
+
+    # OVERRIDE
+    def remove(self, ls_path):
+        os.makedirs(
+            self._parent_dir, mode=const.CREATE_DIR_PERMISSIONS,
+            exist_ok=True,
+        )
+        if not ls_path:
+            # NOTE: Do not create empty batch directories.
+            self.evict()
+            return []
+
+        # NOTE: Unique name, also if there are concurrent calls (e.g. from
+        # multiple processes).
+        batch_dir = _mkdtemp(
+            self._parent_dir,
+            datetime.datetime.now().strftime(self._BATCH_DIR_TIME_FORMAT),
+        )
+
+        ls_outcome = self._remove_to_batch_dir(ls_path, batch_dir)
+        self.evict()
+        return ls_outcome
+
+    @abc.abstractmethod
+    def _remove_to_batch_dir(self, ls_path, batch_dir):
+        raise NotImplementedError()
+
+    def evict(self):
+        '''
+        Evict (delete) batch directories according to the retention settings.
+        Is called automatically by remove().
+        '''
+        L = logging.getLogger(__name__)
+
+        # List of (batch_time, batch_dir), oldest first.
+        ls_batch = []
+        for entry in os.scandir(self._parent_dir):
+            try:
+                batch_time = datetime.datetime.strptime(
+                    entry.name[:self._BATCH_DIR_TIME_LEN],
+                    self._BATCH_DIR_TIME_FORMAT,
+                ).timestamp()
+            except ValueError:
+                # CASE: Not a batch directory. ==> Ignore.
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                ls_batch.append((batch_time, entry.path))
+        ls_batch.sort()
+
+        ls_batch_dir_evict = []
+        if self._max_age_s is not None:
+            time_min = time.time() - self._max_age_s
+            ls_batch_dir_evict.extend(
+                batch_dir for batch_time, batch_dir in ls_batch
+                if batch_time < time_min
+            )
+            ls_batch = ls_batch[len(ls_batch_dir_evict):]
+        if self._max_size_bytes is not None:
+            ls_size = [_get_dir_tree_size(path) for _, path in ls_batch]
+            n_bytes = sum(ls_size)
+            for (_, batch_dir), size in zip(ls_batch, ls_size):
+                if n_bytes <= self._max_size_bytes:
+                    break
+                ls_batch_dir_evict.append(batch_dir)
+                n_bytes -= size
+
+        for batch_dir in ls_batch_dir_evict:
+            L.info(f'Evicting "{batch_dir}"')
+            # NOTE: Ignores errors, e.g. if another process evicts the same
+            # directory concurrently.
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+
+class TrashRemover(_BatchDirRemover):
+    '''
+    Move files to a trash directory (one batch subdirectory per call), with
+    retention-based eviction. See _BatchDirRemover.
+
+    NOTE: The trash directory must be on the same filesystem as the files.
+    NOTE: Files with the same name in the same call are kept (renamed) as
+    "name", "name.1", "name.2" etc.
+    '''
+
+    def __init__(
+        self, trash_dir, max_age_s=None, max_size_bytes=None,
+        n_workers=None,
+    ):
+        super().__init__(trash_dir, max_age_s, max_size_bytes, n_workers)
+
+    # OVERRIDE
+    def _remove_to_batch_dir(self, ls_path, batch_dir):
+        # Derive destination paths (unique filenames).
+        dc_n_name = {}
+        ls_new_path = []
+        for path in ls_path:
+            name = os.path.basename(path)
+            n = dc_n_name.get(name, 0)
+            dc_n_name[name] = n + 1
+            ls_new_path.append(
+                os.path.join(batch_dir, f'{name}.{n}' if n else name),
+            )
+
+        dc_new_path = dict(zip(ls_path, ls_new_path))
+
+        def move(path):
+            os.rename(path, dc_new_path[path])
+
+        return _run_per_file(move, ls_path, self._n_workers)
+
+
+class SnapshotRemover(_BatchDirRemover):
+    '''
+    Hard link files into a snapshot directory (one batch subdirectory per
+    call), preserving their paths relative to a root directory, and then
+    delete the originals. With retention-based eviction. See
+    _BatchDirRemover.
+
+    NOTE: The snapshot directory must be on the same filesystem as the files.
+    '''
+
+    def __init__(
+        self, snapshot_dir, root_dir, max_age_s=None, max_size_bytes=None,
+        n_workers=None,
+    ):
+        '''
+        Parameters
+        ----------
+        root_dir : Path to directory which contains all files which will be
+            removed (e.g. the sync directory).
+        Other arguments: See _BatchDirRemover.
+        '''
+        super().__init__(snapshot_dir, max_age_s, max_size_bytes, n_workers)
+        self._root_dir = root_dir
+
+    # OVERRIDE
+    def _remove_to_batch_dir(self, ls_path, batch_dir):
+
+        def link_unlink(path):
+            rel_path = os.path.relpath(path, self._root_dir)
+            if rel_path.startswith(os.pardir):
+                raise ValueError(
+                    f'File is not under root directory "{self._root_dir}".',
+                )
+            new_path = os.path.join(batch_dir, rel_path)
+            os.makedirs(
+                os.path.dirname(new_path),
+                mode=const.CREATE_DIR_PERMISSIONS, exist_ok=True,
+            )
+            os.link(path, new_path, follow_symlinks=False)
+            os.unlink(path)
+
+        return _run_per_file(link_unlink, ls_path, self._n_workers)
+
+
+class CommandRemover(Remover):
+    '''
+    Remove files using an external command, optionally after first moving
+    them to a removal directory. The command is called once (for all files,
+    or for the removal directory).
+
+    NOTE: This was the only way of removing files before the other removers
+    were added. The default command (const.FILE_REMOVAL_COMMAND_LIST) uses a
+    private script which is not available at all sites.
+    NOTE: If the command fails, then all files not moved to the removal
+    directory are reported as failed.
+    '''
+
+    def __init__(
+        self, removal_dir=None, remove_removal_dir=False,
+        ls_command=None,
+    ):
+        '''
+        Parameters
+        ----------
+        removal_dir
+            None or path to "removal directory" to which files are moved
+            before the directory itself is optionally removed (depends on
+            argument "remove_removal_dir"). Removal directory may preexist.
+            Is created if not.
+        remove_removal_dir
+            Bool. If using a removal directory, then whether to actually
+            remove the removal directory or keep it.
+        ls_command : None, or list of strings. Command and arguments. Paths
+            are added as additional arguments at the end. None: Use
+            const.FILE_REMOVAL_COMMAND_LIST.
+        '''
+        assert type(remove_removal_dir) is bool
+        if ls_command is None:
+            ls_command = const.FILE_REMOVAL_COMMAND_LIST
+        self._removal_dir        = removal_dir
+        self._remove_removal_dir = remove_removal_dir
+        self._ls_command         = list(ls_command)
+
+    # OVERRIDE
+    def remove(self, ls_path):
+        L = logging.getLogger(__name__)
+
+        ls_outcome = [RemovalOutcome(path) for path in ls_path]
+        ls_path_command = list(ls_path)
+
+        if self._removal_dir is not None:
+            L.info(f'Using removal directory "{self._removal_dir}"')
+            # NOTE: Permit pre-existing removal directory.
+            os.makedirs(
+                self._removal_dir, mode=const.CREATE_DIR_PERMISSIONS,
+                exist_ok=True,
+            )
+            for i, path in enumerate(ls_path):
+                final_path = os.path.join(
+                    self._removal_dir, os.path.basename(path),
+                )
+                try:
+                    os.replace(path, final_path)
+                except OSError as e:
+                    ls_outcome[i] = RemovalOutcome(path, repr(e))
+
+            if not self._remove_removal_dir:
+                return ls_outcome
+            ls_path_command = [self._removal_dir]
+
+        if not ls_path_command:
+            return ls_outcome
+
+        try:
+            stdout_bytes = subprocess.check_output(
+                self._ls_command + ls_path_command,
+            )
+            L.info(str(stdout_bytes, 'utf-8'))
+        except (OSError, subprocess.CalledProcessError) as e:
+            L.error(f'File removal command failed: {e!r}')
+            ls_outcome = [
+                outcome if not outcome.ok
+                else RemovalOutcome(outcome.path, repr(e))
+                for outcome in ls_outcome
+            ]
+
+        return ls_outcome
+
+
+def log_outcomes(ls_outcome):
+    '''
+    Log the outcomes of removing files.
+
+    Returns
+    -------
+    n_failed : Number of files which could not be removed.
+    '''
+    L = logging.getLogger(__name__)
+
+    n_failed = 0
+    for outcome in ls_outcome:
+        if outcome.ok:
+            L.info(f'Removed: {outcome.path}')
+        else:
+            L.error(f'Failed to remove: {outcome.path}: {outcome.error}')
+            n_failed += 1
+    L.info(
+        f'Removed {len(ls_outcome) - n_failed} files,'
+        f' failed to remove {n_failed} files.',
+    )
+    return n_failed
+
+
+def _run_per_file(func, ls_path, n_workers):
+    '''
+    Call func(path) for every file concurrently (thread pool), and return
+    the outcomes. Exceptions (OSError, ValueError) are caught and reported in
+    the outcomes.
+    '''
+    if n_workers is None:
+        n_workers = const.N_REMOVAL_WORKERS
+    assert type(n_workers) is int and n_workers >= 1
+
+    def run(path):
+        try:
+            func(path)
+        except (OSError, ValueError) as e:
+            return RemovalOutcome(path, repr(e))
+        return RemovalOutcome(path)
+
+    if len(ls_path) <= 1:
+        return [run(path) for path in ls_path]
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=n_workers,
+    ) as executor:
+        return list(executor.map(run, ls_path))
+
+
+def _mkdtemp(parent_dir, prefix):
+    '''Create new directory with unique name beginning with prefix.'''
+    i = 0
+    while True:
+        dir_path = os.path.join(parent_dir, f'{prefix}_{os.getpid()}_{i}')
+        try:
+            os.mkdir(dir_path, mode=const.CREATE_DIR_PERMISSIONS)
+            return dir_path
+        except FileExistsError:
+            i += 1
+
+
+def _get_dir_tree_size(root_dir):
+    '''Total size of all files in directory tree (not following
+    symlinks).'''
+    n_bytes = 0
+    for dir_path, _, ls_file_name in os.walk(root_dir):
+        for file_name in ls_file_name:
+            try:
+                n_bytes += os.lstat(os.path.join(dir_path, file_name)).st_size
+            except OSError:
+                pass
+    return n_bytes
@@ -0,0 +1,212 @@
+'''
+Module for listing the files in directory trees (the local datasets).
+
+Optimized for network filesystems (e.g. NFS/NAS) on which every metadata
+operation (listing a directory, stat) has a high latency. Such latency is
+hidden by performing many operations concurrently in threads.
+'''
+
+
+import concurrent.futures
+import erikpgjohansson.solo.soar.const as const
+import numpy as np
+import os
+
+
+'''
+PROPOSAL: Use processes instead of threads.
+    CON: The operations are I/O-bound. The GIL is released while waiting.
+'''
+
+
+def scan_dir_tree(
+    root_dir, n_workers=None, visit_dir=None, select_subdir=None,
+):
+    '''
+    Recursively list all files (non-directories) in a directory tree. Lists
+    multiple directories concurrently using a thread pool.
+
+    The result is identical to using os.walk(root_dir) (top-down, not
+    following symlinks to directories, ignoring directories that can not be
+    listed), including the order of the files.
+
+
+    Parameters
+    ----------
+    root_dir : String. Path to directory.
+    n_workers : None or int >= 1.
+        Number of threads. None: Use const.N_DIR_SCAN_WORKERS.
+    visit_dir : None, or function dir_path --> (ignored).
+        Called (in a worker thread) for every directory, immediately before
+        it is listed. Exceptions are propagated.
+    select_subdir : None, or function tpl_dir_name --> bool.
+        Called (in the main thread) for every subdirectory with the tuple of
+        directory names from root_dir to the subdirectory, e.g.
+        ('mag', 'L2'). Subdirectories for which it returns False are neither
+        listed nor descended into (pruned). None: Descend into all
+        subdirectories.
+
+
+    Returns
+    -------
+    ls_entry : List of os.DirEntry. One per file. Can be used for obtaining
+        file name, path and (possibly cached) stat data.
+    '''
+    if n_workers is None:
+        n_workers = const.N_DIR_SCAN_WORKERS
+    assert type(n_workers) is int and n_workers >= 1
+
+    # Dictionary path --> (ls_file_entry, ls_subdir_path), for all listed
+    # directories. ls_subdir_path only contains selected subdirectories.
+    dc_dir = {}
+    # Dictionary path --> tpl_dir_name, for all listed directories.
+    dc_tpl_dir_name = {root_dir: ()}
+
+    def visit_list_dir(dir_path):
+        if visit_dir:
+            visit_dir(dir_path)
+        return list_dir(dir_path)
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=n_workers,
+    ) as executor:
+        # IMPLEMENTATION NOTE: Only submits new tasks from the main thread
+        # (not from tasks) to avoid deadlocks and to be able to propagate
+        # exceptions.
+        dc_future_path = {
+            executor.submit(visit_list_dir, root_dir): root_dir,
+        }
+        while dc_future_path:
+            set_done, _ = concurrent.futures.wait(
+                dc_future_path,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in set_done:
+                dir_path = dc_future_path.pop(future)
+                ls_file_entry, ls_subdir_path = future.result()
+                if select_subdir:
+                    ls_subdir_path = [
+                        subdir_path for subdir_path in ls_subdir_path
+                        if _select_subdir(
+                            select_subdir, dc_tpl_dir_name, dir_path,
+                            subdir_path,
+                        )
+                    ]
+                dc_dir[dir_path] = (ls_file_entry, ls_subdir_path)
+                for subdir_path in ls_subdir_path:
+                    dc_future_path[
+                        executor.submit(visit_list_dir, subdir_path)
+                    ] = subdir_path
+
+    # Concatenate the files in the same order as os.walk() (top-down,
+    # depth-first, subdirectories in listing order).
+    ls_entry = []
+    ls_dir_path_stack = [root_dir]
+    while ls_dir_path_stack:
+        ls_file_entry, ls_subdir_path = dc_dir[ls_dir_path_stack.pop()]
+        ls_entry.extend(ls_file_entry)
+        ls_dir_path_stack.extend(reversed(ls_subdir_path))
+
+    return ls_entry
+
+
+def _select_subdir(select_subdir, dc_tpl_dir_name, dir_path, subdir_path):
+    '''Call select_subdir() for a subdirectory, and if selected, store its
+    tuple of directory names in dc_tpl_dir_name.'''
+    tpl_dir_name = dc_tpl_dir_name[dir_path] \
+        + (os.path.basename(subdir_path),)
+    if not select_subdir(tpl_dir_name):
+        return False
+    dc_tpl_dir_name[subdir_path] = tpl_dir_name
+    return True
+
+
+def get_file_sizes(ls_entry, n_workers=None):
+    '''
+    Get the file sizes for multiple files. Uses (follows) symlinks like
+    os.stat(). Uses a thread pool.
+
+    NOTE: os.DirEntry caches stat data. Depending on OS (e.g. Windows), the
+    stat data may already have been obtained when listing the directory, in
+    which case no more filesystem operations are needed.
+
+
+    Parameters
+    ----------
+    ls_entry : List of os.DirEntry.
+    n_workers : None or int >= 1.
+        Number of threads. None: Use const.N_DIR_SCAN_WORKERS.
+
+
+    Returns
+    -------
+    na_file_size : 1D numpy int64 array.
+    '''
+    if n_workers is None:
+        n_workers = const.N_DIR_SCAN_WORKERS
+    assert type(n_workers) is int and n_workers >= 1
+
+    def get_sizes(ls_entry_chunk):
+        return [entry.stat().st_size for entry in ls_entry_chunk]
+
+    # IMPLEMENTATION NOTE: Submits chunks of files, rather than individual
+    # files, to limit the overhead per file.
+    n_chunks   = 4 * n_workers
+    chunk_size = max(1, -(-len(ls_entry) // n_chunks))
+    ls_ls_entry = [
+        ls_entry[i:i + chunk_size]
+        for i in range(0, len(ls_entry), chunk_size)
+    ]
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=n_workers,
+    ) as executor:
+        ls_file_size = []
+        for ls_file_size_chunk in executor.map(get_sizes, ls_ls_entry):
+            ls_file_size.extend(ls_file_size_chunk)
+
+    return np.array(ls_file_size, dtype='int64')
+
+
+def list_dir(dir_path):
+    '''
+    List one directory.
+
+    Uses the same rules as os.walk(followlinks=False, onerror=None).
+
+
+    Returns
+    -------
+    (ls_file_entry, ls_subdir_path)
+    ls_file_entry : List of os.DirEntry for non-directories.
+    ls_subdir_path : List of paths to subdirectories to descend into.
+    '''
+    ls_file_entry  = []
+    ls_subdir_path = []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                # NOTE: is_dir() and is_symlink() normally do not require any
+                # filesystem operation (uses d_type).
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if not is_dir:
+                    ls_file_entry.append(entry)
+                    continue
+
+                # NOTE: Symlinks to directories are neither descended into
+                # nor counted as files.
+                try:
+                    is_symlink = entry.is_symlink()
+                except OSError:
+                    is_symlink = False
+                if not is_symlink:
+                    ls_subdir_path.append(entry.path)
+    except OSError:
+        # CASE: Can not list directory. ==> Ignore directory (like os.walk).
+        return [], []
+
+    return ls_file_entry, ls_subdir_path
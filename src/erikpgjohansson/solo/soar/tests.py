@@ -6,6 +6,7 @@ Help code for automatic tests.
 import erikpgjohansson.solo.soar.const as const
 import erikpgjohansson.solo.soar.dwld
 import erikpgjohansson.solo.soar.mirror
+import numpy as np
 import os
 import time
 
@@ -221,6 +222,11 @@ class DatasetsSubsetEverything(
     def dataset_in_subset(self, instrument, level, begin_dt64, dsid):
         return True
 
+    def datasets_in_subset(
+        self, na_instrument, na_level, na_begin_dt64, na_dsid,
+    ):
+        return np.ones(na_instrument.shape, dtype=bool)
+
 
 class DirProducer:
     def __init__(self, root_dir):
@@ -10,9 +10,14 @@ import codetiming
 import concurrent.futures
 import datetime
 import erikpgjohansson.solo.asserts
+import erikpgjohansson.solo.iddt
+import erikpgjohansson.solo.metadata
+import erikpgjohansson.solo.soar.const as const
 import erikpgjohansson.solo.soar.dwld as dwld
+import json
 import logging
 import numpy as np
+import os
 import threading
 
 
@@ -28,6 +33,7 @@ PROPOSAL: Split up ~SOAR-related functionality into multiple modules.
     PROPOSAL: so.soar.misc, so.soar.other, so.soar.utils
 
 PROPOSAL: Function: Difference between DSTs.
+    -- IMPLEMENTED: erikpgjohansson.solo.soar.dst.diff()
     Find differences between datasets in in two DSTs.
     Find all files/datasets (defined by item ID+version+FILE SIZE)
     * only in dst1,
@@ -431,6 +437,66 @@ def _download_latest_datasets_batch_log_progress(
         L.info(s)
 
 
+def record_download_throughput(throughput_path, n_bytes, sec):
+    '''
+    Record one measured download throughput (one batch download) in a JSON
+    file. Only the const.N_DOWNLOAD_THROUGHPUT_RECORDS most recent
+    measurements are kept.
+
+    Parameters
+    ----------
+    throughput_path : String. Path to JSON file. Is created if it does not
+        exist.
+    n_bytes : Number of downloaded bytes.
+    sec : Wall time used for downloading [s].
+    '''
+    assert n_bytes >= 0
+    assert sec >= 0
+
+    ls_record = _read_download_throughput_records(throughput_path)
+    ls_record.append({
+        'time':    datetime.datetime.now().isoformat(timespec='seconds'),
+        'n_bytes': int(n_bytes),
+        'sec':     float(sec),
+    })
+    ls_record = ls_record[-const.N_DOWNLOAD_THROUGHPUT_RECORDS:]
+
+    # NOTE: Replaces file atomically, so that an interrupted write does not
+    # corrupt it.
+    temp_path = throughput_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(ls_record, f, indent=1)
+    os.replace(temp_path, throughput_path)
+
+
+def estimate_download_throughput(throughput_path):
+    '''
+    Estimate the download throughput from the recent measurements recorded
+    using record_download_throughput().
+
+    Returns
+    -------
+    None, if there are no (non-empty) measurements.
+    Otherwise float. Throughput [bytes/s].
+    '''
+    ls_record = _read_download_throughput_records(throughput_path)
+    n_bytes = sum(record['n_bytes'] for record in ls_record)
+    sec = sum(record['sec'] for record in ls_record)
+    if (n_bytes == 0) or (sec == 0):
+        return None
+    return n_bytes / sec
+
+
+def _read_download_throughput_records(throughput_path):
+    '''Read throughput records. Returns empty list if there is no file.'''
+    if not os.path.exists(throughput_path):
+        return []
+    with open(throughput_path) as f:
+        ls_record = json.load(f)
+    assert type(ls_record) is list
+    return ls_record
+
+
 @codetiming.Timer('find_latest_versions', logger=None)
 def find_latest_versions(
     na_item_id: np.ndarray, na_item_id_version_nbr: np.ndarray,
@@ -519,3 +585,31 @@ def log_codetiming():
     for key, value in codetiming.Timer.timers.items():
         L.info(f'{key:40s} {value:10.2f} [s]')
     L.info('')
+
+
+def log_cache_info():
+    '''Log hit rates etc. for cached (memoized) functions. Useful for
+    profiling.'''
+    TITLE = 'Cached functions (functools.lru_cache)'
+    DC_FUNC = {
+        'metadata.parse_DSID':
+            erikpgjohansson.solo.metadata.parse_DSID,
+        'metadata.parse_item_ID':
+            erikpgjohansson.solo.metadata.parse_item_ID,
+        'iddt.convert_DSID_to_DTDN':
+            erikpgjohansson.solo.iddt.convert_DSID_to_DTDN,
+    }
+
+    L = logging.getLogger(__name__)
+    L.info('')
+    L.info(TITLE)
+    L.info('-' * len(TITLE))
+    for name, func in DC_FUNC.items():
+        ci = func.cache_info()
+        n_calls = ci.hits + ci.misses
+        hit_rate = ci.hits / n_calls if n_calls else float('nan')
+        L.info(
+            f'{name:40s} {n_calls:10} calls, hit rate {hit_rate:6.1%},'
+            f' size {ci.currsize}/{ci.maxsize}',
+        )
+    L.info('')
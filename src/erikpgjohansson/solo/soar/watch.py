@@ -0,0 +1,531 @@
+'''
+Module for keeping an in-memory table (DST) of the local datasets up-to-date,
+without rescanning the directory tree, by watching for filesystem changes.
+
+Uses Linux inotify (through ctypes; no extra dependencies) when available.
+Falls back to periodic full rescans (1) on other OSes, (2) on network
+filesystems (on which inotify does not report changes made by other
+hosts), and (3) when running out of inotify watches. An inotify event queue
+overflow triggers a full rescan.
+
+Useful for mirrors which sync often (e.g. every few minutes) from a
+long-running process.
+'''
+
+
+import ctypes
+import erikpgjohansson.solo.asserts
+import erikpgjohansson.solo.metadata
+import erikpgjohansson.solo.soar.dst
+import erikpgjohansson.solo.soar.scan
+import errno
+import logging
+import numpy as np
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+
+
+'''
+PROPOSAL: Use fanotify (entire filesystem).
+    CON: Requires root.
+PROPOSAL: Support macOS (FSEvents) and Windows (ReadDirectoryChangesW).
+'''
+
+
+# inotify constants. See "man inotify", /usr/include/linux/inotify.h.
+_IN_MODIFY      = 0x00000002
+_IN_ATTRIB      = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM  = 0x00000040
+_IN_MOVED_TO    = 0x00000080
+_IN_CREATE      = 0x00000100
+_IN_DELETE      = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF   = 0x00000800
+_IN_Q_OVERFLOW  = 0x00004000
+_IN_IGNORED     = 0x00008000
+_IN_ONLYDIR     = 0x01000000
+_IN_DONTFOLLOW  = 0x02000000
+_IN_ISDIR       = 0x40000000
+_IN_NONBLOCK    = 0o4000
+_IN_CLOEXEC     = 0o2000000
+
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_ATTRIB | _IN_MOVED_FROM | _IN_MOVED_TO
+_WATCH_MASK |= _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+_WATCH_MASK |= _IN_ONLYDIR | _IN_DONTFOLLOW
+'''Events to watch for. NOTE: Does not include IN_MODIFY since files are
+normally moved into place (and the size is updated on IN_CLOSE_WRITE).'''
+
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len].
+_EVENT_STRUCT = struct.Struct('iIII')
+
+_READ_BUFFER_SIZE = 256 * 1024
+
+_NETWORK_FS_TYPES = frozenset([
+    'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ncpfs', 'afs', '9p', 'ceph',
+    'glusterfs', 'fuse.glusterfs', 'lustre', 'gpfs', 'fuse.sshfs',
+    'fuse.rclone', 'davfs',
+])
+'''Filesystem types (as in /proc/self/mounts) on which inotify is not used
+since it does not report changes made from other hosts.'''
+
+_RETRY_DELAY_MIN_S = 1
+_RETRY_DELAY_MAX_S = 60
+'''Delay before the background thread retries after an exception. Doubles
+for every consecutive exception, up to the max (or rescan_interval_s).'''
+
+
+class LocalDatasetsWatcher:
+    '''Keeps an up-to-date in-memory table (DST) of the datasets under a
+    directory tree (e.g. the sync directory), using inotify or periodic full
+    rescans.
+
+    Changes are processed by a background thread. get_DST() also processes
+    all pending changes before returning the DST.
+
+    The DST is the same as would be returned by
+    erikpgjohansson.solo.soar.dst.derive_DST_from_dir(), except possibly for
+    the order of the rows.
+
+    Example
+    -------
+    with LocalDatasetsWatcher(sync_dir) as watcher:
+        while True:
+            erikpgjohansson.solo.soar.mirror.sync(..., watcher=watcher)
+            time.sleep(300)
+    '''
+
+    def __init__(
+        self, root_dir, n_workers=None, rescan_interval_s=3600,
+        use_inotify=None,
+    ):
+        '''
+        Parameters
+        ----------
+        root_dir : String. Path to pre-existing directory.
+        n_workers : None or int >= 1.
+            Number of threads for full rescans. None: Use
+            erikpgjohansson.solo.soar.const.N_DIR_SCAN_WORKERS.
+        rescan_interval_s : Number.
+            Time between full rescans, when not using inotify.
+        use_inotify : None or bool.
+            None: Use inotify if available and root_dir is not on a network
+            filesystem.
+        '''
+        erikpgjohansson.solo.asserts.is_dir(root_dir)
+        assert rescan_interval_s > 0
+
+        if use_inotify is None:
+            use_inotify = _inotify_supported(root_dir)
+        elif use_inotify:
+            assert _get_libc() is not None, 'inotify is not available.'
+
+        self._root_dir          = root_dir
+        self._n_workers         = n_workers
+        self._rescan_interval_s = rescan_interval_s
+        self._use_inotify       = use_inotify
+
+        # Protects all state below. Reentrant since event processing can
+        # trigger rescans.
+        self._lock = threading.RLock()
+        # inotify file descriptor. None when not using inotify.
+        self._fd = None
+        # Protects the wd dictionaries when adding watches from worker
+        # threads (while the thread holding self._lock waits for them).
+        self._wd_lock = threading.Lock()
+        # Dictionaries wd <--> directory path.
+        self._dc_wd_path = {}
+        self._dc_path_wd = {}
+        # Dictionary file path --> (file name, file size), for datasets only.
+        self._dc_file = {}
+        # Whether a full rescan is needed before the state can be used.
+        self._b_rescan = True
+        self._t_last_rescan = None
+        self._n_rescans = 0
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def root_dir(self):
+        return self._root_dir
+
+    @property
+    def uses_inotify(self):
+        '''Whether changes are detected using inotify (otherwise periodic
+        full rescans).'''
+        return self._use_inotify
+
+    @property
+    def n_rescans(self):
+        '''Number of full rescans so far. Useful for monitoring and
+        testing.'''
+        return self._n_rescans
+
+    def start(self):
+        '''Do an initial full scan and start the background thread.'''
+        assert self._thread is None, 'Watcher has already been started.'
+        with self._lock:
+            self._update()
+        self._thread = threading.Thread(
+            target=self._run, name='LocalDatasetsWatcher', daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        '''Stop the background thread and release inotify resources.'''
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._close_inotify()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def rescan(self):
+        '''Force a full rescan (e.g. if changes are suspected to have been
+        missed).'''
+        with self._lock:
+            self._b_rescan = True
+            self._update()
+
+    def get_DST(self):
+        '''
+        Return DST for the current datasets. Processes all pending changes
+        first.
+        '''
+        with self._lock:
+            self._update()
+            ls_file_path = list(self._dc_file)
+            ls_file_name = [name for name, _ in self._dc_file.values()]
+            na_file_size = np.array(
+                [size for _, size in self._dc_file.values()], dtype='int64',
+            )
+
+        return erikpgjohansson.solo.soar.dst.derive_DST_from_files(
+            ls_file_name, ls_file_path, lambda na_i: na_file_size[na_i],
+        )
+
+    def _run(self):
+        '''Background thread.'''
+        L = logging.getLogger(__name__)
+
+        retry_delay_s = None
+        while not self._stop_event.is_set():
+            fd = self._fd
+            if fd is not None:
+                # IMPLEMENTATION NOTE: Timeout so that the thread can be
+                # stopped. Also needed since fd may be replaced when
+                # rescanning.
+                try:
+                    select.select([fd], [], [], 0.5)
+                except (OSError, ValueError):
+                    # CASE: fd closed by other thread.
+                    pass
+            else:
+                self._stop_event.wait(0.5)
+
+            try:
+                with self._lock:
+                    self._update()
+                retry_delay_s = None
+            except Exception as e:
+                # NOTE: Do not let the thread die. Retry with full rescan
+                # soon, but back off if the error persists.
+                L.exception(e)
+                with self._lock:
+                    self._b_rescan = True
+                if retry_delay_s is None:
+                    retry_delay_s = _RETRY_DELAY_MIN_S
+                else:
+                    retry_delay_s = min(
+                        2 * retry_delay_s, _RETRY_DELAY_MAX_S,
+                        self._rescan_interval_s,
+                    )
+                self._stop_event.wait(retry_delay_s)
+
+    # ==========================================================
+    # Internal methods. Must be called with self._lock acquired.
+    # ==========================================================
+
+    def _update(self):
+        '''Process pending events, and do full rescan if needed.'''
+        if not self._b_rescan:
+            if self._fd is not None:
+                self._read_events()
+            else:
+                t_since_rescan = time.monotonic() - self._t_last_rescan
+                if t_since_rescan >= self._rescan_interval_s:
+                    self._b_rescan = True
+
+        if self._b_rescan:
+            self._full_rescan()
+
+    def _full_rescan(self):
+        L = logging.getLogger(__name__)
+
+        visit_dir = None
+        if self._use_inotify:
+            # NOTE: Replacing the inotify instance removes all old watches
+            # and pending events.
+            self._close_inotify()
+            self._fd = _get_libc().inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+            if self._fd < 0:
+                self._fd = None
+                self._fall_back_to_rescans(
+                    OSError(ctypes.get_errno(), 'inotify_init1 failed.'),
+                )
+            else:
+                # IMPLEMENTATION NOTE: Adds watch to every directory before
+                # listing it. All changes are therefore either already in
+                # the listing or will be reported as events (or both, which
+                # is harmless).
+                visit_dir = self._add_watch
+
+        try:
+            ls_entry = erikpgjohansson.solo.soar.scan.scan_dir_tree(
+                self._root_dir, self._n_workers, visit_dir=visit_dir,
+            )
+        except OSError as e:
+            if visit_dir is None:
+                raise
+            # CASE: Could not add watch, e.g. due to too many watches
+            #       (ENOSPC; /proc/sys/fs/inotify/max_user_watches).
+            self._fall_back_to_rescans(e)
+            ls_entry = erikpgjohansson.solo.soar.scan.scan_dir_tree(
+                self._root_dir, self._n_workers,
+            )
+
+        self._dc_file = {}
+        self._add_files(ls_entry)
+
+        self._b_rescan      = False
+        self._t_last_rescan = time.monotonic()
+        self._n_rescans    += 1
+        L.info(
+            f'Full rescan of "{self._root_dir}":'
+            f' {len(self._dc_file)} datasets,'
+            f' {len(self._dc_wd_path)} inotify watches.',
+        )
+
+    def _fall_back_to_rescans(self, e):
+        L = logging.getLogger(__name__)
+        L.warning(
+            f'Can not use inotify ({e}). Falling back to periodic full'
+            ' rescans.',
+        )
+        self._close_inotify()
+        self._use_inotify = False
+
+    def _close_inotify(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._dc_wd_path = {}
+        self._dc_path_wd = {}
+
+    def _add_watch(self, dir_path):
+        '''Add inotify watch for directory. Called from worker threads
+        (erikpgjohansson.solo.soar.scan.scan_dir_tree()) while the calling
+        thread holds self._lock.'''
+        wd = _get_libc().inotify_add_watch(
+            self._fd, os.fsencode(dir_path), _WATCH_MASK,
+        )
+        if wd < 0:
+            e = ctypes.get_errno()
+            if e in (errno.ENOENT, errno.ENOTDIR):
+                # CASE: Directory no longer exists (or is a symlink).
+                return
+            raise OSError(e, os.strerror(e), dir_path)
+        with self._wd_lock:
+            self._dc_wd_path[wd] = dir_path
+            self._dc_path_wd[dir_path] = wd
+
+    def _add_files(self, ls_entry):
+        '''Add files which are datasets.'''
+        na_b_parsed, _ = erikpgjohansson.solo.metadata.parse_filenames(
+            [entry.name for entry in ls_entry],
+        )
+        ls_entry = [e for e, b in zip(ls_entry, na_b_parsed) if b]
+        try:
+            ls_file_size = erikpgjohansson.solo.soar.scan.get_file_sizes(
+                ls_entry, self._n_workers,
+            ).tolist()
+        except OSError:
+            # CASE: Some file has been removed since it was listed.
+            # ==> Skip such files. (Later events will also remove them.)
+            ls_file_size = []
+            for entry in ls_entry:
+                try:
+                    ls_file_size.append(entry.stat().st_size)
+                except OSError:
+                    ls_file_size.append(None)
+        for entry, file_size in zip(ls_entry, ls_file_size):
+            if file_size is not None:
+                self._dc_file[entry.path] = (entry.name, file_size)
+
+    def _read_events(self):
+        '''Read and process all pending inotify events.'''
+        while self._fd is not None and not self._b_rescan:
+            try:
+                buf = os.read(self._fd, _READ_BUFFER_SIZE)
+            except BlockingIOError:
+                return
+            i = 0
+            while i < len(buf) and not self._b_rescan:
+                wd, mask, _cookie, name_len = \
+                    _EVENT_STRUCT.unpack_from(buf, i)
+                i += _EVENT_STRUCT.size
+                name = os.fsdecode(buf[i:i + name_len].rstrip(b'\0'))
+                i += name_len
+                self._process_event(wd, mask, name)
+
+    def _process_event(self, wd, mask, name):
+        if mask & _IN_Q_OVERFLOW:
+            # CASE: Events have been lost.
+            L = logging.getLogger(__name__)
+            L.warning('inotify event queue overflow. Doing full rescan.')
+            self._b_rescan = True
+            return
+
+        dir_path = self._dc_wd_path.get(wd)
+        if mask & _IN_IGNORED:
+            # CASE: Watch removed (directory deleted, or rm_watch).
+            if dir_path is not None:
+                del self._dc_wd_path[wd]
+                if self._dc_path_wd.get(dir_path) == wd:
+                    del self._dc_path_wd[dir_path]
+            return
+        if dir_path is None:
+            # CASE: Event for removed watch.
+            return
+
+        if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+            if dir_path == self._root_dir:
+                # CASE: Root directory itself was removed/moved.
+                self._b_rescan = True
+            # NOTE: Other directories are handled via the parent directory's
+            # events.
+            return
+
+        path = os.path.join(dir_path, name)
+        if mask & _IN_ISDIR:
+            if mask & (_IN_DELETE | _IN_MOVED_FROM):
+                self._remove_dir_tree(path)
+            if mask & (_IN_CREATE | _IN_MOVED_TO):
+                # NOTE: Files may have been created in the directory before
+                # the watch was added. ==> Scan directory tree.
+                try:
+                    ls_entry = erikpgjohansson.solo.soar.scan.scan_dir_tree(
+                        path, self._n_workers, visit_dir=self._add_watch,
+                    )
+                except OSError as e:
+                    # CASE: Could not add watch, e.g. due to too many
+                    #       watches (ENOSPC).
+                    self._fall_back_to_rescans(e)
+                    self._b_rescan = True
+                    return
+                self._add_files(ls_entry)
+            return
+
+        if mask & (_IN_DELETE | _IN_MOVED_FROM):
+            self._dc_file.pop(path, None)
+        if mask & (_IN_CREATE | _IN_MOVED_TO | _IN_CLOSE_WRITE | _IN_ATTRIB):
+            self._update_file(name, path)
+
+    def _update_file(self, name, path):
+        na_b_parsed, _ = erikpgjohansson.solo.metadata.parse_filenames([name])
+        if not na_b_parsed[0]:
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            # CASE: File (or symlink target) no longer exists.
+            self._dc_file.pop(path, None)
+            return
+        if stat.S_ISDIR(st.st_mode):
+            # CASE: Symlink to directory. Not a file (like os.walk()).
+            return
+        self._dc_file[path] = (name, st.st_size)
+
+    def _remove_dir_tree(self, dir_path):
+        '''Remove files and watches for directory tree which has been removed
+        or moved away.'''
+        prefix = os.path.join(dir_path, '')
+        for path in [p for p in self._dc_file if p.startswith(prefix)]:
+            del self._dc_file[path]
+        for path in [
+            p for p in self._dc_path_wd
+            if p == dir_path or p.startswith(prefix)
+        ]:
+            wd = self._dc_path_wd.pop(path)
+            # NOTE: Ignore already queued events for the watch.
+            self._dc_wd_path.pop(wd, None)
+            # NOTE: Fails (harmlessly) if the watch is already removed.
+            _get_libc().inotify_rm_watch(self._fd, wd)
+
+
+_libc = None
+
+
+def _get_libc():
+    '''Return ctypes libc object with inotify functions, or None if inotify
+    is not available.'''
+    global _libc
+    if _libc is None:
+        if not sys.platform.startswith('linux'):
+            _libc = False
+        else:
+            try:
+                libc = ctypes.CDLL(None, use_errno=True)
+                libc.inotify_init1.argtypes     = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [
+                    ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32,
+                ]
+                libc.inotify_rm_watch.argtypes  = [ctypes.c_int, ctypes.c_int]
+                _libc = libc
+            except (OSError, AttributeError):
+                _libc = False
+    return _libc or None
+
+
+def _get_fs_type(path):
+    '''Return filesystem type (as in /proc/self/mounts) for the filesystem
+    that contains the path. None if can not be determined.'''
+    path = os.path.realpath(path)
+    fs_type = None
+    mount_point_best = ''
+    try:
+        with open('/proc/self/mounts') as f:
+            for line in f:
+                ls_field = line.split()
+                if len(ls_field) < 3:
+                    continue
+                # NOTE: Spaces etc. in mount points are octal escaped.
+                mount_point = ls_field[1].encode().decode('unicode_escape')
+                if path != mount_point:
+                    if not path.startswith(os.path.join(mount_point, '')):
+                        continue
+                if len(mount_point) >= len(mount_point_best):
+                    mount_point_best = mount_point
+                    fs_type = ls_field[2]
+    except OSError:
+        return None
+    return fs_type
+
+
+def _inotify_supported(root_dir):
+    '''Whether inotify can (and should) be used for the directory.'''
+    if _get_libc() is None:
+        return False
+    return _get_fs_type(root_dir) not in _NETWORK_FS_TYPES
@@ -6,9 +6,71 @@ Initially created by Erik P G Johansson 2020-10-13.
 '''
 
 
+import functools
 import re
 
 
+'''
+PROPOSAL: Compile one combined pattern per (regexp list, direction), e.g.
+          "^(r0)(r1)(r2)" for regexp_str_parts().
+    CON: Not equivalent. A combined pattern backtracks across tokens, whereas
+         tokens are matched one at a time (maximal munch; see
+         regexp_str_parts()). Similarly, for read_token(), a combined
+         backward pattern "(r0|r1)$" selects the leftmost match of any
+         regexp, not the first regexp which matches.
+    ==> Compiled regexps are cached per regexp instead (_compile()).
+'''
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(regexp):
+    '''Compile regular expression. Cached since the same regular expressions
+    are used many times (e.g. once per parsed filename).'''
+    return re.compile(regexp)
+
+
+def _read_token_offset(s, i_begin, i_end, regexp_list, search_dir):
+    '''
+    Same as read_token(), except that it operates on s[i_begin:i_end] and
+    returns string indices instead of substrings. Does not create the
+    substring if i_begin == 0 (always the case for backward search in
+    regexp_str_parts()).
+
+    Returns
+    -------
+    (token, i_begin, i_end, i_regexp)
+        i_begin, i_end : Indices into s for the remaining string.
+    '''
+    for i_regexp in range(len(regexp_list)):
+        if search_dir == 1:
+            pattern = _compile('^' + regexp_list[i_regexp])
+        else:
+            pattern = _compile(regexp_list[i_regexp] + '$')
+
+        # IMPLEMENTATION NOTE: Pattern.search(s, 0, endpos) is equivalent to
+        # searching s[:endpos]. Pattern.search(s, pos) is NOT equivalent to
+        # searching s[pos:] since "^", "\b" and lookbehind assertions then
+        # depend on the characters before pos. ==> Must create substring if
+        # i_begin > 0.
+        if i_begin == 0:
+            mo = pattern.search(s, 0, i_end)
+        else:
+            mo = pattern.search(s[i_begin:i_end])
+
+        if mo:
+            token = mo.group(0)
+            # NOTE: Remaining string is derived from the token length (not the
+            # match position), like read_token() always has.
+            if search_dir == 1:
+                i_begin = i_begin + len(token)
+            else:
+                i_end = i_end - len(token)
+
+            return token, i_begin, i_end, i_regexp
+
+    return None, i_begin, i_end, -1
+
+
 def read_token(s, regexp_list, search_dir):
     '''
 Intended to be analogous to MATLAB code erikpgjohansson.so.str.read_token().
@@ -67,31 +129,17 @@ Created 2020-10-13.
 PROPOSAL: Return string indices to remaining string, not entire remaining
           string.
     PRO: Potentially faster if parsing long strings, e.g. files.
+    -- IMPLEMENTED internally: _read_token_offset(). Used by
+       regexp_str_parts().
 '''
 
-    if search_dir == 1:
-        regexp_modif_func  = lambda s:        '^'+s
-        remaining_str_func = lambda s, token: s[len(token):]
-    elif search_dir == -1:
-        regexp_modif_func  = lambda s:        s+'$'
-        # IMPLEMENTATION NOTE: Can not use s[:-len(token)] since it does NOT
-        # generalize to len(token)==0. ==> Return empty string instead of
-        # entire string.
-        remaining_str_func = lambda s, token: s[:len(s)-len(token)]
-    else:
+    if search_dir not in (1, -1):
         raise Exception('Illegal argument search_dir.')
 
-    for i_regexp in range(len(regexp_list)):
-
-        regexp = regexp_modif_func(regexp_list[i_regexp])
-        mo = re.search(regexp, s)
-        if mo:
-            token = mo.group(0)
-            remaining_str = remaining_str_func(s, token)
-
-            return token, remaining_str, i_regexp
-
-    return None, s, -1
+    token, i_begin, i_end, i_regexp = _read_token_offset(
+        s, 0, len(s), regexp_list, search_dir,
+    )
+    return token, s[i_begin:i_end], i_regexp
 
 
 def regexp_str_parts(s, regexp_list, search_dir, nonmatch_policy):
@@ -189,14 +237,17 @@ Initially created 2020-10-14 by Erik P G Johansson.
     '''========
      ALGORITHM
     ========'''
-    substr_list   = []
-    remaining_str = s
+    # IMPLEMENTATION NOTE: Uses string indices for the remaining string
+    # instead of creating a new substring for every regexp.
+    substr_list = []
+    i_begin     = 0
+    i_end       = len(s)
     for i_re in range(len(regexp_list)):
         # IMPLEMENTATION NOTE: Do not confuse
         # i_re, and
         # j_rt_re  (RE=read_token).
-        (token, remaining_str, j_rt_re) = read_token(
-            remaining_str, [regexp_list[i_re]], search_dir,
+        (token, i_begin, i_end, j_rt_re) = _read_token_offset(
+            s, i_begin, i_end, [regexp_list[i_re]], search_dir,
         )
 
         if j_rt_re == -1:
@@ -208,13 +259,16 @@ Initially created 2020-10-14 by Erik P G Johansson.
                     ),
                 )
             else:
-                return create_return_result(substr_list, remaining_str, False)
+                return create_return_result(
+                    substr_list, s[i_begin:i_end], False,
+                )
 
         substr_list.append(token)
 
     '''==================================
     Check if algorithm matched everything
     =================================='''
+    remaining_str = s[i_begin:i_end]
     if remaining_str:
         if assert_match:
             # Bad error message if "s" is very long (e.g. file).
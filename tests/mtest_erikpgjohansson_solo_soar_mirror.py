@@ -0,0 +1,113 @@
+'''
+*Manual* test code for erikpgjohansson.solo.soar.mirror.
+
+It is useful to *not* do this automatically with other tests since it
+* is slow,
+* measures execution time, which varies between computers and runs.
+'''
+
+
+import erikpgjohansson.solo.soar.mirror
+import numpy as np
+import time
+
+
+def _find_file_name_size_difference_old(
+    na_file_name1, na_file_name2, na_file_size1, na_file_size2,
+):
+    '''
+    Old implementation of
+    erikpgjohansson.solo.soar.mirror._find_file_name_size_difference()
+    (per-row tuples + numpy.isin() on structured arrays). Kept for comparison.
+    '''
+    na_file_name_size1 = np.array(
+        list(zip(na_file_name1, na_file_size1)),
+        dtype=[
+            ('file_name', na_file_name1.dtype),
+            ('file_size', na_file_size1.dtype),
+        ],
+    )
+    na_file_name_size2 = np.array(
+        list(zip(na_file_name2, na_file_size2)),
+        dtype=[
+            ('file_name', na_file_name2.dtype),
+            ('file_size', na_file_size2.dtype),
+        ],
+    )
+
+    na_b_diff12 = ~np.isin(na_file_name_size1, na_file_name_size2)
+    na_b_diff21 = ~np.isin(na_file_name_size2, na_file_name_size1)
+
+    return na_b_diff12, na_b_diff21
+
+
+def _create_file_names_sizes(n_rows, n_differ):
+    '''
+    Create two tables of filenames & sizes which resemble SOAR SDT and local
+    datasets. n_differ rows differ by filename and n_differ rows differ by
+    size only.
+    '''
+    rng = np.random.default_rng(0)
+
+    na_file_name = np.array(
+        [
+            f'solo_L2_mag-rtn-normal_{20200101 + i:08}_V{i % 100:02}.cdf'
+            for i in range(n_rows)
+        ],
+        dtype=object,
+    )
+    na_file_size = rng.integers(1e3, 1e9, size=n_rows, dtype=np.int64)
+
+    # Same rows in different order.
+    na_i = rng.permutation(n_rows)
+    na_file_name1, na_file_size1 = na_file_name, na_file_size
+    na_file_name2, na_file_size2 = na_file_name[na_i], na_file_size[na_i]
+
+    na_file_name2[:n_differ] = [f'other_{i}.cdf' for i in range(n_differ)]
+    na_file_size2[n_differ:2 * n_differ] += 1
+
+    return na_file_name1, na_file_name2, na_file_size1, na_file_size2
+
+
+def mtest_benchmark_find_file_name_size_difference(
+    ls_n_rows=(10**4, 3 * 10**4, 10**5, 10**6), n_differ=1000,
+    n_rows_max_old=3 * 10**4,
+):
+    '''
+    Compare execution time of the current and the old implementation, for
+    increasingly large tables (N x N rows). Also verify that they return the
+    same result.
+
+    NOTE: The old implementation scales ~quadratically (numpy.isin() on
+    structured arrays with object fields). It is therefore only run for up to
+    n_rows_max_old rows (1M x 1M rows would take hours).
+    '''
+    for n_rows in ls_n_rows:
+        args = _create_file_names_sizes(n_rows, n_differ)
+
+        t0 = time.perf_counter()
+        act = erikpgjohansson.solo.soar.mirror._find_file_name_size_difference(
+            *args,
+        )
+        t1 = time.perf_counter()
+        assert act[0].sum() == act[1].sum() == 2 * n_differ
+
+        if n_rows <= n_rows_max_old:
+            exp = _find_file_name_size_difference_old(*args)
+            t2 = time.perf_counter()
+            for act_na_b, exp_na_b in zip(act, exp):
+                assert np.array_equal(act_na_b, exp_na_b)
+            str_old = f'{t2 - t1:7.3f} s'
+        else:
+            str_old = '(not run)'
+
+        print(
+            f'{n_rows:>9} x {n_rows:<9} rows:'
+            f' current: {t1 - t0:7.3f} s,'
+            f' old: {str_old}',
+        )
+
+
+if __name__ == '__main__':
+    if 1:
+        mtest_benchmark_find_file_name_size_difference()
@@ -0,0 +1,160 @@
+import erikpgjohansson.solo.fileops as fileops
+import errno
+import os
+import pytest
+
+
+def test_copy_files(tmp_path):
+    # Includes empty file, file larger than the fallback chunk size, and
+    # path with apostrophe (could not be copied with the old "cp" command).
+    DC_CONTENT = {
+        'empty': b'',
+        'small': b'abc',
+        "it's": b'x',
+        'large': bytes(range(256)) * 2**13,
+    }
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'dest').mkdir()
+    for name, content in DC_CONTENT.items():
+        (tmp_path / 'src' / name).write_bytes(content)
+    os.chmod(tmp_path / 'src' / 'small', 0o640)
+    # Pre-existing destination file. ==> Overwritten.
+    (tmp_path / 'dest' / 'small').write_bytes(b'old content')
+
+    fileops.copy_files(
+        [
+            (str(tmp_path / 'src' / name), str(tmp_path / 'dest' / name))
+            for name in DC_CONTENT
+        ],
+        n_workers=2,
+    )
+
+    for name, content in DC_CONTENT.items():
+        assert (tmp_path / 'dest' / name).read_bytes() == content
+    assert os.stat(tmp_path / 'dest' / 'small').st_mode & 0o777 == 0o640
+    # No temporary files are left.
+    assert sorted(os.listdir(tmp_path / 'dest')) == sorted(DC_CONTENT)
+
+    # Nonexisting source file. ==> Other files are still copied.
+    with pytest.raises(FileNotFoundError):
+        fileops.copy_files([
+            (str(tmp_path / 'src' / 'nonexisting'), str(tmp_path / 'dest1')),
+            (str(tmp_path / 'src' / 'small'), str(tmp_path / 'dest2')),
+        ])
+    assert (tmp_path / 'dest2').read_bytes() == b'abc'
+    assert not (tmp_path / 'dest1').exists()
+
+
+def test_copy_fd_content_fallback(tmp_path, monkeypatch):
+    '''Test falling back to the next copy method when the kernel-side copy
+    system calls are not supported.'''
+
+    def raise_unsupported(*args):
+        raise OSError(errno.EXDEV, 'Not supported.')
+
+    monkeypatch.setattr(os, 'copy_file_range', raise_unsupported)
+    monkeypatch.setattr(os, 'sendfile', raise_unsupported)
+
+    content = bytes(range(256)) * 2**13
+    (tmp_path / 'src').write_bytes(content)
+    fileops.copy_file(str(tmp_path / 'src'), str(tmp_path / 'dest'))
+    assert (tmp_path / 'dest').read_bytes() == content
+
+
+def test_copy_file_retry(tmp_path, monkeypatch, caplog):
+    '''Test retrying after intermittent permission errors.'''
+    (tmp_path / 'src').write_bytes(b'abc')
+
+    ls_call = []
+    write_file_atomic = fileops._write_file_atomic
+
+    def write_file_atomic_fail_twice(src_path, dest_path, write_content):
+        ls_call.append(src_path)
+        if len(ls_call) <= 2:
+            raise PermissionError(errno.EACCES, 'Permission denied')
+        write_file_atomic(src_path, dest_path, write_content)
+
+    monkeypatch.setattr(
+        fileops, '_write_file_atomic', write_file_atomic_fail_twice,
+    )
+
+    fileops.copy_file(
+        str(tmp_path / 'src'), str(tmp_path / 'dest'), retry_delay_s=0,
+    )
+    assert len(ls_call) == 3
+    assert (tmp_path / 'dest').read_bytes() == b'abc'
+    assert caplog.text.count('Failed to copy') == 2
+
+    # Too many failures. ==> Exception.
+    ls_call.clear()
+    with pytest.raises(PermissionError):
+        fileops.copy_file(
+            str(tmp_path / 'src'), str(tmp_path / 'dest3'),
+            n_tries=2, retry_delay_s=0,
+        )
+    assert len(ls_call) == 2
+
+
+def test_place_files(tmp_path, monkeypatch, caplog):
+    (tmp_path / 'src').write_bytes(b'abc')
+    src_path = str(tmp_path / 'src')
+    ino = os.stat(src_path).st_ino
+
+    # Pre-existing destination file. ==> Replaced.
+    (tmp_path / 'dest1').write_bytes(b'old content')
+    ls_method = fileops.place_files(
+        'link', [
+            (src_path, str(tmp_path / 'dest1')),
+            (src_path, str(tmp_path / 'dest2')),
+        ],
+    )
+    assert ls_method == ['link', 'link']
+    for name in ('dest1', 'dest2'):
+        assert os.stat(tmp_path / name).st_ino == ino
+
+    # Destination already is a hard link to the source.
+    assert fileops.place_files(
+        'link', [(src_path, str(tmp_path / 'dest1'))],
+    ) == ['link']
+    assert sorted(os.listdir(tmp_path)) == ['dest1', 'dest2', 'src']
+
+    # Reflinking is not supported on all filesystems (falls back).
+    [method] = fileops.place_files(
+        'reflink', [(src_path, str(tmp_path / 'dest3'))],
+    )
+    assert method in ('reflink', 'link')
+    assert (tmp_path / 'dest3').read_bytes() == b'abc'
+
+    # Intermittent error when linking. ==> Retry.
+    link = os.link
+    ls_call = []
+
+    def link_fail_once(*args, **kwargs):
+        ls_call.append(args)
+        if len(ls_call) == 1:
+            raise OSError(errno.EBUSY, 'Device or resource busy')
+        link(*args, **kwargs)
+
+    monkeypatch.setattr(os, 'link', link_fail_once)
+    caplog.clear()
+    assert fileops.place_files(
+        'link', [(src_path, str(tmp_path / 'dest5'))], retry_delay_s=0,
+    ) == ['link']
+    assert len(ls_call) == 2
+    assert 'Failed to link' in caplog.text
+    assert 'Failed to copy' not in caplog.text
+    os.remove(tmp_path / 'dest5')
+
+    # Hard linking not supported (e.g. different filesystems). ==> Copy.
+    def link_unsupported(*args, **kwargs):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+    monkeypatch.setattr(os, 'link', link_unsupported)
+    assert fileops.place_files(
+        'link', [(src_path, str(tmp_path / 'dest4'))],
+    ) == ['copy']
+    assert (tmp_path / 'dest4').read_bytes() == b'abc'
+    assert os.stat(tmp_path / 'dest4').st_ino != ino
+    assert sorted(os.listdir(tmp_path)) == [
+        'dest1', 'dest2', 'dest3', 'dest4', 'src',
+    ]
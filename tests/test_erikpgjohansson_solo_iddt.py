@@ -1,4 +1,7 @@
 import erikpgjohansson.solo.iddt
+import json
+import numpy as np
+import os
 import pytest
 
 
@@ -65,6 +68,69 @@ def test_get_IDDT_subdir():
         )
 
 
+def test_get_IDDT_subdirs():
+    LS_FILENAME = [
+        'solo_L2_rpw-lfr-surv-cwf-e-cdag_20200213_V01.cdf',
+        'solo_L2_mag-rtn-normal_20200720_V03.cdf',
+        'solo_L1_mag-ibs_20200315_V01.cdf',
+        # Not a dataset.
+        'README.txt',
+        # Can not be handled (HK).
+        'solo_HK_rpw-bia_20201209_V01.cdf',
+    ]
+    assert erikpgjohansson.solo.iddt.get_IDDT_subdirs(LS_FILENAME) == [
+        'rpw/L2/lfr_wf_e/2020/02',
+        'mag/L2/mag-rtn-normal/2020/07',
+        'mag/L1/2020/03/15',
+        None,
+        None,
+    ]
+    # Same result as get_IDDT_subdir().
+    for filename, rel_dir_path in zip(
+        LS_FILENAME[0:3],
+        erikpgjohansson.solo.iddt.get_IDDT_subdirs(
+            LS_FILENAME[0:3], dtdnInclInstrument=False, instrDirCase='upper',
+        ),
+    ):
+        assert rel_dir_path == erikpgjohansson.solo.iddt.get_IDDT_subdir(
+            filename, dtdnInclInstrument=False, instrDirCase='upper',
+        )
+
+
+def test_IddtSubtreeFilter():
+
+    def test(iddt_filter, tpl_dir_name, exp_result):
+        assert iddt_filter.select_subdir(tpl_dir_name) == exp_result
+
+    f = erikpgjohansson.solo.iddt.IddtSubtreeFilter()
+    test(f, ('mag', 'L2', 'mag-rtn-normal', '2020', '01'), True)
+
+    f = erikpgjohansson.solo.iddt.IddtSubtreeFilter(
+        instruments=('MAG',), levels=('L1', 'L2'),
+        start_dt64=np.datetime64('2020-03-15'),
+        stop_dt64=np.datetime64('2020-05-01'),
+    )
+    test(f, (),                                      True)
+    test(f, ('mag',),                                True)
+    test(f, ('MAG',),                                True)
+    test(f, ('epd',),                                False)
+    test(f, ('mag', 'L2'),                           True)
+    test(f, ('mag', 'L3'),                           False)
+    test(f, ('mag', 'L2', 'mag-rtn-normal'),         True)
+    test(f, ('mag', 'L2', 'mag-rtn-normal', '2019'), False)
+    test(f, ('mag', 'L2', 'mag-rtn-normal', '2020'), True)
+    test(f, ('mag', 'L2', 'mag-rtn-normal', '2020', '02'), False)
+    test(f, ('mag', 'L2', 'mag-rtn-normal', '2020', '03'), True)
+    test(f, ('mag', 'L2', 'mag-rtn-normal', '2020', '04'), True)
+    test(f, ('mag', 'L2', 'mag-rtn-normal', '2020', '05'), False)
+    test(f, ('mag', 'L1', '2020', '03', '14'),       False)
+    test(f, ('mag', 'L1', '2020', '03', '15'),       True)
+    # Directories not following the IDDT conventions are selected.
+    test(f, ('mag', 'L1', '2020', '13'),             True)
+    test(f, ('mag', 'L1', 'misc'),                   True)
+    test(f, ('mag', 'L1', '2019', '03', '15', 'x'),  False)
+
+
 def test_convert_DSID_to_DTDN():
 
     def test(dsid, kwargs, expResult):
@@ -116,3 +182,183 @@ def test_convert_DSID_to_DTDN():
     test_exc('SOLO_L1_EPD-SIS-B-HEHIST', {})
     test_exc('SOLO_L2_RPW-LFR-SBM2-CWF-E-CDAG', {})
     test_exc('solo_l2_rpw-lfr-sbm2-cwf-e', {})
+
+
+def test_copy_move_datasets_to_IRFU_dir_tree(tmp_path):
+    '''Test copy and move, with non-datasets which should be ignored.'''
+    # Relative path --> Relative path after copy/move (None=ignored).
+    DC_PATHS = {
+        'solo_L2_rpw-lfr-surv-bp1-cdag_20201001_V02.cdf':
+            'rpw/L2/lfr_bp/2020/10',
+        'subdir/solo_L2_mag-rtn-normal_20200601_V02.cdf':
+            'mag/L2/mag-rtn-normal/2020/06',
+        'subdir/solo_L1_swa-eas-OnbPartMoms_20200820T000000-20200820T235904'
+        '_V01.cdf':
+            'swa/L1/2020/08/20',
+        'subdir/not_a_dataset.txt': None,
+    }
+
+    def get_files(root_dir):
+        return {
+            os.path.relpath(os.path.join(dir_path, filename), root_dir)
+            for dir_path, _, ls_filename in os.walk(root_dir)
+            for filename in ls_filename
+        }
+
+    for mode in ('copy', 'move', 'link', 'reflink'):
+        src_dir  = tmp_path / mode / 'src'
+        dest_dir = tmp_path / mode / 'dest'
+        for rel_path in DC_PATHS:
+            os.makedirs((src_dir / rel_path).parent, exist_ok=True)
+            (src_dir / rel_path).write_text(rel_path)
+        os.makedirs(dest_dir)
+
+        ls_outcome = \
+            erikpgjohansson.solo.iddt.copy_move_datasets_to_IRFU_dir_tree(
+                mode, str(src_dir), str(dest_dir),
+            )
+        assert len(ls_outcome) == 3
+        for _, _, method in ls_outcome:
+            # NOTE: Reflinking is not supported on all filesystems.
+            assert method in {
+                'copy': ('copy',), 'move': ('move',), 'link': ('link',),
+                'reflink': ('reflink', 'link'),
+            }[mode]
+
+        set_exp_dest = set()
+        for rel_path, rel_dir in DC_PATHS.items():
+            if rel_dir:
+                filename = os.path.basename(rel_path)
+                set_exp_dest.add(os.path.join(rel_dir, filename))
+                assert (dest_dir / rel_dir / filename).read_text() == rel_path
+        assert get_files(dest_dir) == set_exp_dest
+
+        if mode != 'move':
+            assert get_files(src_dir) == set(DC_PATHS)
+        else:
+            assert get_files(src_dir) == {'subdir/not_a_dataset.txt'}
+
+
+def test_copy_move_datasets_to_IRFU_dir_tree_manifest(tmp_path, monkeypatch):
+    '''Test planning, and resuming with manifest and journal after an
+    interruption.'''
+    LS_FILENAME = [
+        'solo_L2_mag-rtn-normal_20200601_V02.cdf',
+        'solo_L2_mag-rtn-normal_20200602_V02.cdf',
+        'solo_L2_mag-rtn-normal_20200701_V02.cdf',
+        'solo_L2_rpw-lfr-surv-bp1-cdag_20201001_V02.cdf',
+    ]
+    src_dir  = str(tmp_path / 'src')
+    dest_dir = str(tmp_path / 'dest')
+    manifest_path = str(tmp_path / 'manifest.json')
+    journal_path  = manifest_path + '.journal'
+    os.makedirs(src_dir)
+    os.makedirs(dest_dir)
+    for filename in LS_FILENAME:
+        (tmp_path / 'src' / filename).write_text(filename)
+
+    # ========
+    # Planning
+    # ========
+    manifest = \
+        erikpgjohansson.solo.iddt.plan_copy_move_datasets_to_IRFU_dir_tree(
+            'move', src_dir, dest_dir, manifestPath=manifest_path,
+        )
+    assert sorted(os.listdir(src_dir)) == LS_FILENAME
+    assert os.listdir(dest_dir) == []
+    with open(manifest_path) as f:
+        assert json.load(f) == manifest
+    assert len(manifest['entries']) == 4
+
+    # =================================================
+    # Interrupted execution (fails on the third move)
+    # =================================================
+    os_replace = os.replace
+    ls_makedirs_path = []
+    os_makedirs = os.makedirs
+
+    def replace_fail_3rd(src, dst):
+        if replace_fail_3rd.n_calls == 2:
+            raise KeyboardInterrupt()
+        replace_fail_3rd.n_calls += 1
+        os_replace(src, dst)
+    replace_fail_3rd.n_calls = 0
+
+    def makedirs(path, *args, **kwargs):
+        # NOTE: Ignores recursive calls from os.makedirs() itself.
+        if 'mode' in kwargs:
+            ls_makedirs_path.append(path)
+        os_makedirs(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'replace', replace_fail_3rd)
+    monkeypatch.setattr(os, 'makedirs', makedirs)
+    with pytest.raises(KeyboardInterrupt):
+        erikpgjohansson.solo.iddt.copy_move_datasets_to_IRFU_dir_tree(
+            'move', src_dir, dest_dir, manifestPath=manifest_path,
+        )
+    monkeypatch.setattr(os, 'replace', os_replace)
+
+    # One makedirs() per unique destination directory.
+    assert sorted(ls_makedirs_path) == sorted({
+        os.path.dirname(new_path) for _, new_path in manifest['entries']
+    })
+    with open(journal_path) as f:
+        ls_line = f.read().splitlines()
+    assert len(ls_line) == 1 + 2
+
+    # Simulate interruption after the second move, but before journaling it.
+    with open(journal_path, 'w') as f:
+        f.write('\n'.join(ls_line[:2]) + '\n' + ls_line[2][:1])
+
+    # ======
+    # Resume
+    # ======
+    ls_outcome = erikpgjohansson.solo.iddt.copy_move_datasets_to_IRFU_dir_tree(
+        'move', src_dir, dest_dir, manifestPath=manifest_path,
+    )
+    assert [old_path for old_path, _, _ in ls_outcome] == [
+        old_path for old_path, _ in manifest['entries'][1:]
+    ]
+    assert os.listdir(src_dir) == []
+    for _, new_path in manifest['entries']:
+        assert os.path.isfile(new_path)
+    # Completed. ==> Manifest and journal are removed.
+    assert not os.path.exists(manifest_path)
+    assert not os.path.exists(journal_path)
+
+    # New dataset. ==> Plans anew (does not reuse the completed manifest).
+    filename = 'solo_L2_mag-rtn-normal_20200801_V02.cdf'
+    (tmp_path / 'src' / filename).write_text(filename)
+    ls_outcome = erikpgjohansson.solo.iddt.copy_move_datasets_to_IRFU_dir_tree(
+        'move', src_dir, dest_dir, manifestPath=manifest_path,
+    )
+    assert [old_path for old_path, _, _ in ls_outcome] == [
+        os.path.join(src_dir, filename),
+    ]
+
+    # Manifest for other arguments. ==> Error.
+    (tmp_path / 'src' / filename).write_text(filename)
+    erikpgjohansson.solo.iddt.plan_copy_move_datasets_to_IRFU_dir_tree(
+        'move', src_dir, dest_dir, manifestPath=manifest_path,
+    )
+    with pytest.raises(AssertionError):
+        erikpgjohansson.solo.iddt.copy_move_datasets_to_IRFU_dir_tree(
+            'move', src_dir, dest_dir, instrDirCase='upper',
+            manifestPath=manifest_path,
+        )
+
+    # Re-running a completed manifest does nothing.
+    # NOTE: The first call regards all (already moved) entries as completed.
+    assert len(erikpgjohansson.solo.iddt.execute_copy_move_manifest(
+        manifest, journalPath=journal_path,
+    )) == 4
+    assert erikpgjohansson.solo.iddt.execute_copy_move_manifest(
+        manifest, journalPath=journal_path,
+    ) == []
+
+    # Journal belonging to another manifest. ==> Error.
+    manifest['created'] = 'other'
+    with pytest.raises(AssertionError):
+        erikpgjohansson.solo.iddt.execute_copy_move_manifest(
+            manifest, journalPath=journal_path,
+        )
@@ -1,5 +1,8 @@
 import erikpgjohansson.solo.metadata
+import erikpgjohansson.solo.str
+import numpy as np
 import pytest
+import random
 
 
 def test_DatasetFilename___repr():
@@ -15,6 +18,55 @@ def test_DatasetFilename___repr():
     assert type(act_str) is str
 
 
+def test_DatasetFilename_derived_fields():
+    DSFN = erikpgjohansson.solo.metadata.DatasetFilename
+
+    def test(filename, exp_version_nbr, exp_level, exp_instrument, exp_dt64):
+        dsfn = DSFN.parse_filename(filename)
+        assert dsfn.version_nbr == exp_version_nbr
+        assert dsfn.level       == exp_level
+        assert dsfn.instrument  == exp_instrument
+        assert dsfn.begin_dt64.dtype == np.dtype('datetime64[ms]')
+        np.testing.assert_array_equal(
+            dsfn.begin_dt64, np.datetime64(exp_dt64, 'ms'),
+        )
+
+    test(
+        'solo_L2_mag-rtn-normal_20200301_V02.cdf',
+        2, 'L2', 'MAG', '2020-03-01',
+    )
+    test(
+        'solo_L1_eui-fsi174-image_20200806T083130185_V01.fits',
+        1, 'L1', 'EUI', '2020-08-06T08:31:30',
+    )
+    # OBT.
+    test(
+        'solo_L0_epd-epthet2-ll_0699408000-0699494399_V02.bin',
+        2, None, None, 'NaT',
+    )
+    # DSID which parse_DSID() can not parse.
+    test(
+        'solo_HK_rpw-bia_20200301_V01.cdf',
+        1, None, None, '2020-03-01',
+    )
+
+    dsfn = DSFN.parse_filename('solo_L2_mag-rtn-normal_20200301_V02.cdf')
+
+    # Immutable and without __dict__.
+    with pytest.raises(AttributeError):
+        dsfn.dsid = 'SOLO_L2_MAG-SRF-NORMAL'
+    assert not hasattr(dsfn, '__dict__')
+
+    # Equality.
+    assert dsfn == DSFN.parse_filename(
+        'solo_L2_mag-rtn-normal_20200301_V02.cdf',
+    )
+    assert dsfn != DSFN.parse_filename(
+        'solo_L2_mag-rtn-normal_20200301_V03.cdf',
+    )
+    assert dsfn != 'solo_L2_mag-rtn-normal_20200301_V02.cdf'
+
+
 def test_DatasetFilename():
 
     def test(filename, exp_dsfn):
@@ -147,6 +199,171 @@ def test_DatasetFilename():
     test('solo_L1_eui-fsi174-image_20200806T083130185_V01.txt', None)
 
 
+def test_DatasetFilename_parse_filename_differential():
+    '''
+    Compare DatasetFilename.parse_filename() with the earlier implementation
+    (based on erikpgjohansson.solo.str.regexp_str_parts()) for many
+    (partially random) strings.
+    '''
+
+    def parse_filename_legacy(filename):
+        ls_str, _, b_perfect_match = \
+            erikpgjohansson.solo.str.regexp_str_parts(
+                filename, [
+                    '.*',
+                    '(|-cdag)',
+                    '_',
+                    erikpgjohansson.solo.metadata._RE_TIME_INTERVAL_STR,
+                    '_V',
+                    '[0-9][0-9]+',
+                    '[CIU]?',
+                    r'\.(cdf|fits|bin)',
+                ],
+                -1, 'permit non-match',
+            )
+        if not b_perfect_match:
+            return None
+
+        tv1 = erikpgjohansson.solo.metadata._parse_time_interval_str(
+            ls_str[3],
+        )
+        if tv1 is None:
+            return None
+
+        return erikpgjohansson.solo.metadata.DatasetFilename(
+            dsid=ls_str[0].upper(), time_interval_str=ls_str[3],
+            version_str=ls_str[5], tv1=tv1,
+            item_id=''.join(ls_str[0:1] + ls_str[2:4]),
+        )
+
+    ls_filename = [
+        'solo_L2_mag-rtn-normal_20200720_V02.cdf',
+        'solo_L2_rpw-lfr-surv-cwf-e-cdag_20200213_V02.cdf',
+        'solo_L2_rpw-lfr-surv-cwf-e-cdag-cdag_20200213_V02.cdf',
+        'solo_L2_rpw-lfr-surv-cwf-e-CDAG_20200213_V02.cdf',
+        '-cdag_20200213_V02.cdf',
+        '_20200213_V02.cdf',
+        'solo_L2_x_20200213_V2.cdf',
+        'solo_L2_x_20200213_V0123U.fits',
+        'solo_L2_x_20200213_V01CC.cdf',
+        'solo_L2_x_2020021_V01.cdf',
+        'solo_L2_x_20200213T000000-20200214T000000-20200215_V01.bin',
+        'solo_L2_x_20200213__V01.cdf',
+        'solo_L2_x_20200213_V01.cdf.cdf',
+        'solo_L2_x_20200213_V01.cdf~',
+        'solo_L2_x_20200213_V01.CDF',
+        '',
+    ]
+
+    # Random strings composed of parts of filenames.
+    rng = random.Random(0)
+    LS_PARTS = [
+        'solo', '_', 'L2', 'mag', '-', '-cdag', 'cdag', 'T', '0', '1', '2',
+        '20200213', '20200213T000000', '2024', '0699408000', '_V', 'V',
+        'C', 'I', 'U', 'x', '.cdf', '.fits', '.bin', '.',
+    ]
+    for _ in range(5000):
+        ls_filename.append(''.join(
+            rng.choice(LS_PARTS) for _ in range(rng.randint(0, 12))
+        ))
+    for _ in range(5000):
+        # Similar to actual filenames.
+        ls_filename.append(''.join([
+            'solo_L2_', rng.choice(['mag', 'x-1', 'x-T', 'x_y']),
+            rng.choice(['', '-cdag', '-cdag-cdag']),
+            rng.choice(['_', '__', '']),
+            rng.choice([
+                '2024', '202401', '20240101', '20240101-20240102',
+                '20240101T010203', '20240101T010203123',
+                '20240101T010203-20240101T020203', '0699408000-0699494399',
+                ''.join(
+                    rng.choice('0123456789T-')
+                    for _ in range(rng.randint(3, 33))
+                ),
+            ]),
+            rng.choice(['_V', '_', 'V']),
+            ''.join(
+                rng.choice('0123456789') for _ in range(rng.randint(0, 3))
+            ),
+            rng.choice(['', 'C', 'I', 'U', 'CI']),
+            rng.choice(['.cdf', '.fits', '.bin', '.txt', '']),
+        ]))
+
+    for filename in ls_filename:
+        exp = parse_filename_legacy(filename)
+        act = erikpgjohansson.solo.metadata.DatasetFilename.parse_filename(
+            filename,
+        )
+        assert act == exp, filename
+
+
+def test_parse_filenames(caplog):
+    LS_FILENAME = [
+        'solo_L3_epd-ept-1day_2024_V11.cdf',
+        'solo_L2_rpw-lfr-surv-cwf-e-cdag_20200213_V02.cdf',
+        'solo_L1_rpw-bia-sweep-cdag_20200307T053018-20200307T053330_V01.cdf',
+        'solo_L0_epd-epthet2-ll_0699408000-0699494399_V02.bin',
+        'solo_LL02_epd-het-south-rates_20200813T000026-20200814T000025_V03I'
+        '.cdf',
+        'solo_L1_eui-fsi174-image_20200806T083130185_V01.fits',
+        'solo_HK_rpw-bia_20200301_V01.cdf',
+        # Non-datasets.
+        'solo_L1_eui-fsi174-image_20200806T083130185_V01.txt',
+        'solo_L2_mag-rtn-normal_2020071_V01.cdf',
+        # Non-existent date.
+        'solo_L2_mag-rtn-normal_20200230_V01.cdf',
+        '',
+    ]
+
+    na_b_parsed, dc_na = erikpgjohansson.solo.metadata.parse_filenames(
+        iter(LS_FILENAME),
+    )
+    np.testing.assert_array_equal(na_b_parsed, [1] * 7 + [0] * 4)
+    for na in dc_na.values():
+        assert na.shape == (len(LS_FILENAME),)
+
+    # Non-existent date. ==> Logged.
+    assert 'solo_L2_mag-rtn-normal_20200230_V01.cdf' in caplog.text
+
+    # Compare with DatasetFilename.parse_filename().
+    # NOTE: parse_filename() parses filenames with non-existent dates (NaT).
+    for filename in LS_FILENAME[7:]:
+        dsfn = erikpgjohansson.solo.metadata.DatasetFilename.parse_filename(
+            filename,
+        )
+        if '20200230' in filename:
+            assert np.isnat(dsfn.begin_dt64)
+        else:
+            assert dsfn is None
+    for i, filename in enumerate(LS_FILENAME[0:7]):
+        dsfn = erikpgjohansson.solo.metadata.DatasetFilename.parse_filename(
+            filename,
+        )
+        assert dc_na['dsid'][i]        == dsfn.dsid
+        assert dc_na['item_id'][i]     == dsfn.item_id
+        assert dc_na['version_nbr'][i] == int(dsfn.version_str)
+
+    np.testing.assert_array_equal(
+        dc_na['begin_dt64'][0:7],
+        np.array(
+            [
+                '2024-01-01', '2020-02-13', '2020-03-07T05:30:18', 'NaT',
+                '2020-08-13T00:00:26', '2020-08-06T08:31:30', '2020-03-01',
+            ],
+            dtype='datetime64[ms]',
+        ),
+    )
+    assert list(dc_na['level'][0:7]) == \
+        ['L3', 'L2', 'L1', None, 'LL02', 'L1', None]
+    assert list(dc_na['instrument'][0:7]) == \
+        ['EPD', 'RPW', 'RPW', None, 'EPD', 'EUI', None]
+
+    # Empty.
+    na_b_parsed, dc_na = erikpgjohansson.solo.metadata.parse_filenames([])
+    assert na_b_parsed.shape == (0,)
+    assert dc_na['begin_dt64'].shape == (0,)
+
+
 def test_parse_item_ID():
     def test(item_id, exp_rv):
         act_rv = erikpgjohansson.solo.metadata.parse_item_ID(item_id)
@@ -190,6 +407,70 @@ def test_parse_item_ID():
     )
 
 
+def test_parse_item_IDs():
+    LS_ITEM_ID = [
+        'solo_HK_rpw-bia_20200301',
+        'solo_L1_rpw-bia-sweep_20200307T053018-20200307T053330',
+        'solo_L0_epd-epthet2-ll_0699408000-0699494399',
+        'solo_L1_swa-eas2-NM3D_20201027T000007-20201027T030817',
+        'solo_HK_rpw-bia_20200302',
+        # Non-existent date. ==> Parsable (like parse_item_ID()).
+        'solo_L2_mag-rtn-normal_20200230',
+        # Not parsable.
+        'abc',
+        'solo_LL02_epd-het-south-rates_20200813T000026-20200814T000025a',
+        'solo_L2_mag-rtn-normal_2020071',
+    ]
+
+    na_b_parsed, na_dsid = erikpgjohansson.solo.metadata.parse_item_IDs(
+        iter(LS_ITEM_ID),
+    )
+    np.testing.assert_array_equal(na_b_parsed, [1] * 6 + [0] * 3)
+    assert na_dsid.dtype == np.dtype(object)
+    assert list(na_dsid) == [
+        'SOLO_HK_RPW-BIA', 'SOLO_L1_RPW-BIA-SWEEP', 'SOLO_L0_EPD-EPTHET2-LL',
+        'SOLO_L1_SWA-EAS2-NM3D', 'SOLO_HK_RPW-BIA', 'SOLO_L2_MAG-RTN-NORMAL',
+    ] + [None] * 3
+
+    # Compare with parse_item_ID().
+    for item_id, dsid in zip(LS_ITEM_ID, na_dsid):
+        rv = erikpgjohansson.solo.metadata.parse_item_ID(item_id)
+        assert (rv['DSID'] if rv else None) == dsid
+
+    # Empty.
+    na_b_parsed, na_dsid = erikpgjohansson.solo.metadata.parse_item_IDs([])
+    assert na_b_parsed.shape == (0,)
+    assert na_dsid.shape == (0,)
+
+
+def test_parse_item_ID_parse_DSID_cached():
+    parse_item_ID = erikpgjohansson.solo.metadata.parse_item_ID
+    parse_DSID    = erikpgjohansson.solo.metadata.parse_DSID
+
+    ITEM_ID = 'solo_L2_mag-rtn-normal_20200301'
+    rv1 = parse_item_ID(ITEM_ID)
+    n_hits = parse_item_ID.cache_info().hits
+    rv2 = parse_item_ID(ITEM_ID)
+    assert parse_item_ID.cache_info().hits == n_hits + 1
+    assert rv2 is rv1
+
+    # Cached return value can not be modified.
+    with pytest.raises(TypeError):
+        rv1['DSID'] = 'SOLO_L2_MAG-SRF-NORMAL'
+    assert parse_item_ID(ITEM_ID)['DSID'] == 'SOLO_L2_MAG-RTN-NORMAL'
+
+    assert parse_DSID('SOLO_L2_MAG-RTN-NORMAL') == (
+        'SOLO', 'L2', 'MAG', 'MAG-RTN-NORMAL',
+    )
+    n_hits = parse_DSID.cache_info().hits
+    parse_DSID('SOLO_L2_MAG-RTN-NORMAL')
+    assert parse_DSID.cache_info().hits == n_hits + 1
+    # Exceptions are raised also on repeated calls.
+    for _ in range(2):
+        with pytest.raises(Exception):
+            parse_DSID('SOLO_L2')
+
+
 def test_parse_time_interval_str():
     def test(s, exp_tv):
         if type(exp_tv) is tuple and len(exp_tv) == 6:
@@ -215,6 +496,122 @@ def test_parse_time_interval_str():
     test('0000000003-0000086399',             (3,))
 
 
+def test_parse_time_interval_str_differential():
+    '''
+    Compare _parse_time_interval_str() with the earlier implementation (which
+    tried one format after another using
+    erikpgjohansson.solo.str.regexp_str_parts()), and
+    _parse_time_interval_strs() with _parse_time_interval_str(), for many
+    (partially random) strings.
+    '''
+    M = erikpgjohansson.solo.metadata
+
+    def parse_legacy(s):
+        def match(ls_regexp):
+            ls_str, _, b_perfect_match = \
+                erikpgjohansson.solo.str.regexp_str_parts(
+                    s, ls_regexp, 1, 'permit non-match',
+                )
+            return ls_str[0] if b_perfect_match else None
+
+        def parse_Thhmmssddd(s):
+            seconds_str = s[13:]
+            second = int(seconds_str) / 10**(len(seconds_str)-2)
+            return (
+                int(s[0:4]), int(s[4:6]), int(s[6:8]),
+                int(s[9:11]), int(s[11:13]), second,
+            )
+
+        if match([M._RE_YYYY]):
+            return (int(s[0:4]), 1, 1, 0, 0, 0.0)
+        if match([M._RE_YYYYMM]):
+            return (int(s[0:4]), int(s[4:6]), 1, 0, 0, 0.0)
+        if match([M._RE_YYYYMMDD]):
+            return (int(s[0:4]), int(s[4:6]), int(s[6:8]), 0, 0, 0.0)
+        s1 = match([M._RE_YYYYMMDD, '-', M._RE_YYYYMMDD])
+        if s1:
+            return (int(s1[0:4]), int(s1[4:6]), int(s1[6:8]), 0, 0, 0.0)
+        s1 = match([M._RE_YYYYMMDDThhmmssddd])
+        if s1:
+            return parse_Thhmmssddd(s1)
+        s1 = match([M._RE_YYYYMMDDThhmmss, '-', M._RE_YYYYMMDDThhmmss])
+        if s1:
+            return parse_Thhmmssddd(s1)
+        s1 = match([M._RE_OBT, '-', M._RE_OBT])
+        if s1:
+            return (int(s1),)
+        return None
+
+    ls_tis = [
+        '2024', '202401', '20240131', '20240131-20240201',
+        '20240131T010203', '20240131T0102031', '20240131T010203123',
+        '20240229T235959-20240301T000000', '0699408000-0699494399',
+        '', '2024-', '20240131T', '20240131T0102031234', '20240131-2024020',
+        '20240131T010203-20240201T0102031', '0699408000-069949439',
+        '2024013\x00', '202\n', '２０２４',
+    ]
+    rng = random.Random(0)
+    for _ in range(20000):
+        s = ''.join(
+            rng.choice('0112T-') for _ in range(rng.randint(0, 33))
+        )
+        # Avoid (most) invalid dates. ==> Test those separately.
+        s = s.replace('00', '01').replace('2', '1')
+        ls_tis.append(s)
+    for _ in range(5000):
+        # Valid formats, some with changed characters.
+        s = rng.choice(ls_tis[0:9])
+        i = rng.randrange(len(s))
+        ls_tis.append(s[:i] + rng.choice('0T-x') + s[i+1:])
+
+    ls_exp_tv1 = [parse_legacy(tis) for tis in ls_tis]
+    ls_act_tv1 = [M._parse_time_interval_str(tis) for tis in ls_tis]
+    for tis, exp_tv1, act_tv1 in zip(ls_tis, ls_exp_tv1, ls_act_tv1):
+        assert act_tv1 == exp_tv1, tis
+
+    def convert(tv1):
+        try:
+            return M._convert_TV1_to_DT64(tv1)
+        except ValueError:
+            return None
+
+    # Vectorized function. Non-existent dates/times are not parsed.
+    ls_tis2 = []
+    ls_exp_b_parsed = []
+    ls_exp_dt64 = []
+    for tis, tv1 in zip(ls_tis, ls_exp_tv1):
+        dt64 = None if tv1 is None else convert(tv1)
+        ls_tis2.append(tis)
+        ls_exp_b_parsed.append(dt64 is not None)
+        ls_exp_dt64.append(
+            np.datetime64('NaT', 'ms') if dt64 is None else dt64,
+        )
+    assert len(ls_tis2) > 10000
+    assert sum(ls_exp_b_parsed) > 1000
+
+    na_b_parsed, na_dt64 = M._parse_time_interval_strs(ls_tis2)
+    assert na_dt64.dtype == np.dtype('datetime64[ms]')
+    np.testing.assert_array_equal(na_b_parsed, ls_exp_b_parsed)
+    np.testing.assert_array_equal(
+        na_dt64, np.array(ls_exp_dt64, dtype='datetime64[ms]'),
+    )
+
+    # Empty input.
+    na_b_parsed, na_dt64 = M._parse_time_interval_strs([])
+    assert na_b_parsed.shape == (0,)
+    assert na_dt64.shape == (0,)
+
+    # Invalid dates/times.
+    for tis in [
+        '20240230', '0000', '202413', '20240131T240000',
+        '20240131T006000', '20240131T000060-20240131T000100',
+    ]:
+        assert M._parse_time_interval_str(tis) is not None
+        na_b_parsed, na_dt64 = M._parse_time_interval_strs(['2024', tis])
+        np.testing.assert_array_equal(na_b_parsed, [True, False])
+        assert np.isnat(na_dt64[1])
+
+
 def test_parse_DSID():
 
     def test(dsid, exp_rv):
@@ -0,0 +1,193 @@
+import erikpgjohansson.solo.iddt
+import erikpgjohansson.solo.soar.dsss as dsss
+import erikpgjohansson.solo.soar.mirror
+import numpy as np
+
+
+LS_DSID = [
+    'SOLO_LL02_MAG',
+    'SOLO_L1_EPD-SIS',
+    'SOLO_L2_MAG-RTN-NORMAL',
+    'SOLO_L2_MAG-RTN-BURST',
+    'SOLO_L2_EUI-FSI174-IMAGE',
+    'SOLO_L2_MAG-RTN-NORMAL',
+]
+NA_DSID = np.array(LS_DSID, dtype=object)
+NA_INSTRUMENT = np.array(
+    [s.split('_')[2].split('-')[0] for s in LS_DSID], dtype=object,
+)
+NA_LEVEL = np.array([s.split('_')[1] for s in LS_DSID], dtype=object)
+NA_BEGIN_DT64 = np.array(
+    [
+        '2020-01-01', '2020-01-01', '2020-01-01',
+        '2021-01-01', '2022-01-01', 'NaT',
+    ],
+    dtype='datetime64[ms]',
+)
+
+
+def test_RuleDatasetsSubset():
+
+    def test(ls_rule, exp_ls_b):
+        obj = dsss.RuleDatasetsSubset(ls_rule)
+        na_b = obj.datasets_in_subset(
+            NA_INSTRUMENT, NA_LEVEL, NA_BEGIN_DT64, NA_DSID,
+        )
+        assert na_b.dtype == bool
+        np.testing.assert_array_equal(na_b, np.array(exp_ls_b, dtype=bool))
+
+        # Scalar method returns the same result.
+        for i in range(NA_DSID.size):
+            assert obj.dataset_in_subset(
+                NA_INSTRUMENT[i], NA_LEVEL[i], NA_BEGIN_DT64[i], NA_DSID[i],
+            ) == bool(exp_ls_b[i])
+
+    test([], [0, 0, 0, 0, 0, 0])
+    test([dsss.Rule()], [1, 1, 1, 1, 1, 1])
+    test(
+        [dsss.Rule(instruments=('MAG',), levels=('L2',))],
+        [0, 0, 1, 1, 0, 1],
+    )
+    test([dsss.Rule(dsids=('SOLO_LL02_MAG', 'SOLO_L1_EPD-SIS'))],
+         [1, 1, 0, 0, 0, 0])
+    test([dsss.Rule(dsid_glob='SOLO_L2_*')], [0, 0, 1, 1, 1, 1])
+    test([dsss.Rule(dsid_glob='*-RTN-*')], [0, 0, 1, 1, 0, 1])
+    # Time window. NaT never matches.
+    test(
+        [dsss.Rule(
+            start_dt64=np.datetime64('2020-06-01'),
+            stop_dt64=np.datetime64('2022-01-01'),
+        )],
+        [0, 0, 0, 1, 0, 0],
+    )
+    # First matching rule decides.
+    test(
+        [
+            dsss.Rule(include=False, dsid_glob='*-BURST'),
+            dsss.Rule(instruments=('MAG',)),
+        ],
+        [1, 0, 1, 0, 0, 1],
+    )
+    test(
+        [
+            dsss.Rule(instruments=('MAG',)),
+            dsss.Rule(include=False, dsid_glob='*-BURST'),
+        ],
+        [1, 0, 1, 1, 0, 1],
+    )
+
+
+def test_RuleDatasetsSubset_get_ADQL_condition():
+
+    def test(ls_rule, exp_cond):
+        obj = dsss.RuleDatasetsSubset(ls_rule)
+        assert obj.get_ADQL_condition() == exp_cond
+
+    test([], '(1=0)')
+    test([dsss.Rule()], None)
+    # Time and exclude rules are ignored.
+    test(
+        [
+            dsss.Rule(include=False, instruments=('EUI',)),
+            dsss.Rule(
+                instruments=('MAG', 'EPD'), levels=('L2',),
+                start_dt64=np.datetime64('2020-06-01'),
+            ),
+        ],
+        "(((instrument='MAG' OR instrument='EPD')"
+        " AND (processing_level='L2')))",
+    )
+    # NOTE: Item IDs may contain uppercase outside the level. ==> LOWER().
+    test(
+        [
+            dsss.Rule(dsids=('SOLO_LL02_MAG', 'SOLO_L1_SWA-EAS2-NM3D')),
+            dsss.Rule(dsid_glob='SOLO_L2_MAG-*'),
+            dsss.Rule(dsid_glob='SOLO_*_SWA-?'),
+            # Glob which can not be converted. ==> Omitted.
+            dsss.Rule(levels=('L3',), dsid_glob='SOLO_L3_[AB]*'),
+        ],
+        "(((LOWER(item_id) LIKE 'solo_ll02_mag_%'"
+        " OR LOWER(item_id) LIKE 'solo_l1_swa-eas2-nm3d_%'))"
+        " OR (LOWER(item_id) LIKE 'solo_l2_mag-%_%')"
+        " OR (LOWER(item_id) LIKE 'solo_%_swa-__%')"
+        " OR ((processing_level='L3')))",
+    )
+    # Quotes are escaped. Empty sets match nothing.
+    test(
+        [
+            dsss.Rule(instruments=("MAG'",)),
+            dsss.Rule(levels=()),
+            dsss.Rule(dsids=()),
+        ],
+        "(((instrument='MAG''')) OR ((1=0)) OR ((1=0)))",
+    )
+
+
+def test_RuleDatasetsSubset_get_IDDT_filters():
+
+    def test(ls_rule, exp_tpl_filter):
+        obj = dsss.RuleDatasetsSubset(ls_rule)
+        assert obj.get_IDDT_filters() == exp_tpl_filter
+        obj = dsss.CachedDatasetsSubset(obj)
+        assert obj.get_IDDT_filters() == exp_tpl_filter
+
+    IddtSubtreeFilter = erikpgjohansson.solo.iddt.IddtSubtreeFilter
+    START_DT64 = np.datetime64('2020-06-01')
+
+    test([], ())
+    test([dsss.Rule()], None)
+    test([dsss.Rule(dsid_glob='SOLO_L2_MAG-*')], None)
+    # Exclude rules are ignored.
+    test(
+        [
+            dsss.Rule(include=False, instruments=('EUI',)),
+            dsss.Rule(
+                instruments=('MAG', 'EPD'), levels=('L2',),
+                start_dt64=START_DT64,
+            ),
+            dsss.Rule(dsids=('SOLO_LL02_MAG', 'SOLO_L1_EPD-SIS')),
+        ],
+        (
+            IddtSubtreeFilter(
+                instruments=('MAG', 'EPD'), levels=('L2',),
+                start_dt64=START_DT64,
+            ),
+            IddtSubtreeFilter(
+                instruments=('EPD', 'MAG'), levels=('L1', 'LL02'),
+            ),
+        ),
+    )
+    test(
+        [dsss.Rule(dsid_glob='SOLO_L2_MAG-*', start_dt64=START_DT64)],
+        (IddtSubtreeFilter(start_dt64=START_DT64),),
+    )
+
+
+def test_CachedDatasetsSubset():
+
+    class CountingDatasetsSubset(
+        erikpgjohansson.solo.soar.mirror.DatasetsSubset,
+    ):
+        '''Scalar-only DSSS which counts the number of calls.'''
+        def __init__(self):
+            self.n_calls = 0
+
+        def dataset_in_subset(self, instrument, level, begin_dt64, dsid):
+            self.n_calls += 1
+            return (instrument == 'MAG') and (
+                begin_dt64 < np.datetime64('2021-01-01')
+            )
+
+    def test(time_bin, exp_n_calls, exp_ls_b):
+        dsss_counting = CountingDatasetsSubset()
+        obj = dsss.CachedDatasetsSubset(dsss_counting, time_bin)
+        na_b = obj.datasets_in_subset(
+            NA_INSTRUMENT, NA_LEVEL, NA_BEGIN_DT64, NA_DSID,
+        )
+        assert dsss_counting.n_calls == exp_n_calls
+        np.testing.assert_array_equal(na_b, np.array(exp_ls_b, dtype=bool))
+
+    # NOTE: NA_DSID has 5 unique DSIDs.
+    test(None,                     5, [1, 0, 1, 0, 0, 1])
+    # 2020-01-01 and NaT bins for 'SOLO_L2_MAG-RTN-NORMAL'.
+    test(np.timedelta64(1, 'D'),   6, [1, 0, 1, 0, 0, 0])
@@ -71,6 +71,53 @@ def test_DatasetsTable():
         na_y = dst2['y']
         assert np.array_equal(na_y, NA_STR1b)
 
+    def test_index_view():
+        dst1 = erikpgjohansson.solo.soar.dst.DatasetsTable(
+            {'x': NA_INT1, 'y': NA_STR1},
+        )
+        assert not dst1.is_view
+
+        # Boolean indices, then integer indices on the view.
+        dst2 = dst1.index(np.array([True, False, True, True]), view=True)
+        assert dst2.is_view
+        assert dst2.n_rows == 3
+        dst3 = dst2.index(np.array([2, 0]), view=True)
+        assert dst3.n_rows == 2
+        assert np.array_equal(dst3['x'], NA_INT1[[3, 0]])
+        assert np.array_equal(dst3['y'], NA_STR1[[3, 0]])
+
+        # Same results as eager indexing.
+        dst4 = dst1.index(np.array([True, False, True, True])).index(
+            np.array([2, 0]),
+        )
+        for key in ('x', 'y'):
+            assert np.array_equal(dst3[key], dst4[key])
+
+        # Empty view, and eager indexing of view.
+        dst5 = dst3.index(np.array([False, False]), view=True)
+        assert dst5.n_rows == 0
+        assert dst5['x'].size == 0
+        dst6 = dst3.index(np.array([1]))
+        assert not dst6.is_view
+        assert np.array_equal(dst6['x'], NA_INT1[[0]])
+
+        # Concatenation of views.
+        dst7 = dst3 + dst2
+        assert np.array_equal(dst7['x'], NA_INT1[[3, 0, 0, 2, 3]])
+
+        with pytest.raises(KeyError):
+            _ = dst3['z']
+        with pytest.raises(AssertionError):
+            dst1.index(np.array([True, False]), view=True)
+
+        # DST without columns.
+        dst_empty = erikpgjohansson.solo.soar.dst.DatasetsTable()
+        for na_bi in [np.array([], dtype=bool), np.array([], dtype=int)]:
+            for view in [False, True]:
+                dst8 = dst_empty.index(na_bi, view=view)
+                assert dst8.n_rows is None
+                assert not dst8.is_view
+
     def test_add():
         dst1 = erikpgjohansson.solo.soar.dst.DatasetsTable(
             {'x': NA_INT1, 'y': NA_STR1},
@@ -83,9 +130,48 @@ def test_DatasetsTable():
         assert np.array_equal(dst3['x'], np.concatenate((NA_INT1, NA_INT2)))
         assert np.array_equal(dst3['y'], np.concatenate((NA_STR1, NA_STR2)))
 
+    def test_factorize():
+        dst = erikpgjohansson.solo.soar.dst.DatasetsTable({
+            'x': np.array(['b', 'a', 'b', 'c'], dtype=object),
+            'y': np.array([3, 1, 3, 2]),
+        })
+        for key in ('x', 'y'):
+            na_unique, na_i = dst.factorize(key)
+            assert na_unique.size == 3
+            assert np.array_equal(na_unique[na_i], dst[key])
+
+    def test_sort_top_k():
+        dst = erikpgjohansson.solo.soar.dst.DatasetsTable({
+            'x': np.array(['b', 'a', 'b', 'c', 'a'], dtype=object),
+            'y': np.array([3, 1, 2, 2, 5]),
+            't': np.array(
+                ['2020-01-03', 'NaT', '2020-01-01', '2020-01-02', 'NaT'],
+                dtype='datetime64[ms]',
+            ),
+        })
+        for view in (False, True):
+            dst2 = dst.sort(['x', 'y'], view=view)
+            assert np.array_equal(dst2['y'], [1, 5, 2, 3, 2])
+            dst2 = dst.sort('x', descending=True, view=view)
+            assert np.array_equal(dst2['y'], [2, 3, 2, 1, 5])
+            dst2 = dst.sort('t', view=view)
+            assert np.array_equal(dst2['y'], [2, 2, 3, 1, 5])
+
+            dst2 = dst.top_k('y', 2, view=view)
+            assert np.array_equal(dst2['y'], [5, 3])
+            # Ties are resolved by row order.
+            dst2 = dst.top_k('y', 2, descending=False, view=view)
+            assert np.array_equal(dst2['y'], [1, 2])
+            assert np.array_equal(dst2['x'], ['a', 'b'])
+            assert dst.top_k('y', 0, view=view).n_rows == 0
+            assert dst.top_k('y', 99, view=view).n_rows == 5
+
     test1()
     test2()
     test_index()
+    test_index_view()
+    test_factorize()
+    test_sort_top_k()
     test_add()
 
 
@@ -118,3 +204,97 @@ def test_log_DST():
         ['MAG', 'EPD', 'EPD', 'EPD'],
         ['L1', 'L2', 'L2', 'L2'],
     )
+
+
+def test_diff():
+    DST = erikpgjohansson.solo.soar.dst.DatasetsTable
+
+    dst_old = DST({
+        'item_id':   np.array(['A', 'B', 'C', 'D', 'D'], dtype=object),
+        'version':   np.array([1, 1, 1, 1, 2]),
+        'file_size': np.array([10, 20, 30, 40, 50]),
+    })
+    dst_new = DST({
+        'item_id':   np.array(['A', 'B', 'D', 'E', 'D'], dtype=object),
+        'version':   np.array([1, 2, 2, 1, 2]),
+        'file_size': np.array([10, 21, 51, 60, 50]),
+    })
+
+    def test(key, compare, exp_added, exp_removed, exp_cho, exp_chn):
+        act = erikpgjohansson.solo.soar.dst.derive_diff_NA_b(
+            dst_old, dst_new, key, compare,
+        )
+        for act_na_b, exp_ls_b in zip(
+            act, (exp_added, exp_removed, exp_cho, exp_chn),
+        ):
+            assert act_na_b.dtype == bool
+            np.testing.assert_array_equal(act_na_b, np.array(exp_ls_b, bool))
+
+    test(
+        'item_id', (),
+        [0, 0, 0, 1, 0], [0, 0, 1, 0, 0], [0] * 5, [0] * 5,
+    )
+    test(
+        ('item_id', 'version'), (),
+        [0, 1, 0, 1, 0], [0, 1, 1, 1, 0], [0] * 5, [0] * 5,
+    )
+    # NOTE: ('D', 2) has file sizes 50 (old) and {51, 50} (new). Only the new
+    # row with file size 51 has changed.
+    test(
+        ('item_id', 'version'), 'file_size',
+        [0, 1, 0, 1, 0], [0, 1, 1, 1, 0], [0] * 5, [0, 0, 1, 0, 0],
+    )
+    test(
+        'item_id', ('version', 'file_size'),
+        [0, 0, 0, 1, 0], [0, 0, 1, 0, 0], [0, 1, 0, 1, 0], [0, 1, 1, 0, 0],
+    )
+
+    # Empty DSTs.
+    dst_empty = DST({
+        'item_id':   np.array([], dtype=object),
+        'version':   np.array([], dtype=int),
+        'file_size': np.array([], dtype=int),
+    })
+    dd = erikpgjohansson.solo.soar.dst.diff(
+        dst_empty, dst_new, 'item_id', 'file_size',
+    )
+    assert dd.dst_added.n_rows == 5
+    assert dd.dst_removed.n_rows == 0
+    dd = erikpgjohansson.solo.soar.dst.diff(
+        dst_old, dst_empty, 'item_id', view=True,
+    )
+    assert dd.dst_added.n_rows == 0
+    np.testing.assert_array_equal(
+        dd.dst_removed['file_size'], [10, 20, 30, 40, 50],
+    )
+
+    dd = erikpgjohansson.solo.soar.dst.diff(
+        dst_old, dst_new, ('item_id', 'version'), 'file_size',
+    )
+    np.testing.assert_array_equal(dd.dst_added['item_id'], ['B', 'E'])
+    np.testing.assert_array_equal(dd.dst_removed['item_id'], ['B', 'C', 'D'])
+    np.testing.assert_array_equal(dd.dst_changed_new['file_size'], [51])
+
+    # Hash collision: hash(-1) == hash(-2) in CPython. Result must still be
+    # exact.
+    dst_1 = DST({'x': np.array([-1, 3], dtype=object)})
+    dst_2 = DST({'x': np.array([-2, 3], dtype=object)})
+    test_na_b = erikpgjohansson.solo.soar.dst.derive_diff_NA_b(
+        dst_1, dst_2, 'x',
+    )
+    np.testing.assert_array_equal(test_na_b[0], [True, False])
+    np.testing.assert_array_equal(test_na_b[1], [True, False])
+    # Colliding row which is only matched in one direction.
+    dst_2 = DST({'x': np.array([-1, -2], dtype=object)})
+    for dst_a, dst_b in ((dst_1, dst_2), (dst_2, dst_1)):
+        test_na_b = erikpgjohansson.solo.soar.dst.derive_diff_NA_b(
+            dst_a, dst_b, 'x',
+        )
+        dst_a_rows = set(dst_a['x'])
+        dst_b_rows = set(dst_b['x'])
+        np.testing.assert_array_equal(
+            test_na_b[0], [x not in dst_a_rows for x in dst_b['x']],
+        )
+        np.testing.assert_array_equal(
+            test_na_b[1], [x not in dst_b_rows for x in dst_a['x']],
+        )
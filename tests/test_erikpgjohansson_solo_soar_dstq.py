@@ -0,0 +1,77 @@
+import erikpgjohansson.solo.soar.dst
+import erikpgjohansson.solo.soar.dstq as dstq
+import numpy as np
+
+
+def _create_test_DST():
+    return erikpgjohansson.solo.soar.dst.DatasetsTable({
+        'instrument': np.array(
+            ['EPD', 'MAG', 'EPD', 'SWA', 'MAG'], dtype=object,
+        ),
+        'item_id': np.array(
+            [
+                'solo_L2_epd-ept-north-rates_20200801',
+                'solo_L2_mag-rtn-normal_20200801',
+                'solo_LL02_epd-het-south-rates_20200813T000026'
+                '-20200814T000025',
+                'solo_L2_swa-pas-grnd-mom_20200802',
+                'solo_LL02_mag_20200804T000025-20200805T000024',
+            ], dtype=object,
+        ),
+        'file_size': np.array([10, 20, 30, 40, 50], dtype='int64'),
+        'begin_time_FN': np.array(
+            [
+                '2020-08-01', '2020-08-01', '2020-08-13', 'NaT',
+                '2020-08-04',
+            ], dtype='datetime64[ms]',
+        ),
+    })
+
+
+def test_queries():
+    dst = _create_test_DST()
+
+    def test(q, exp_ls_b):
+        act_na_b = q.derive_NA_b(dst)
+        assert act_na_b.dtype == bool
+        np.testing.assert_array_equal(act_na_b, np.array(exp_ls_b, bool))
+
+    test(dstq.Eq('instrument', 'MAG'),         [0, 1, 0, 0, 1])
+    test(dstq.Eq('file_size', 30),             [0, 0, 1, 0, 0])
+    test(dstq.IsIn('instrument', ['EPD', 'SWA']), [1, 0, 1, 1, 0])
+    test(dstq.IsIn('instrument', []),          [0, 0, 0, 0, 0])
+    test(dstq.IsIn('file_size', [10, 50, 99]), [1, 0, 0, 0, 1])
+    test(
+        dstq.Range(
+            'begin_time_FN',
+            np.datetime64('2020-08-01'), np.datetime64('2020-08-13'),
+        ),
+        [1, 1, 0, 0, 1],
+    )
+    # NOTE: NaT is never in range, also without bounds.
+    test(dstq.Range('begin_time_FN'),          [1, 1, 1, 0, 1])
+    test(dstq.Range('file_size', end=30),      [1, 1, 0, 0, 0])
+    test(dstq.Prefix('item_id', 'solo_LL02_'), [0, 0, 1, 0, 1])
+    test(dstq.Regex('item_id', '^solo_L2_.*_2020080[12]$'), [1, 1, 0, 1, 0])
+
+    # Boolean combinations.
+    test(
+        dstq.Eq('instrument', 'MAG') & ~dstq.Prefix('item_id', 'solo_LL02'),
+        [0, 1, 0, 0, 0],
+    )
+    test(
+        dstq.Eq('instrument', 'SWA') | dstq.Range('file_size', 40),
+        [0, 0, 0, 1, 1],
+    )
+    test(dstq.And(),                           [1, 1, 1, 1, 1])
+    test(dstq.Or(),                            [0, 0, 0, 0, 0])
+
+
+def test_select():
+    dst = _create_test_DST()
+
+    for view in (False, True):
+        dst2 = dst.select(dstq.IsIn('instrument', ['MAG', 'SWA']), view=view)
+        np.testing.assert_array_equal(dst2['file_size'], [20, 40, 50])
+        dst3 = dst2.select(dstq.Prefix('item_id', 'solo_L2'), view=view)
+        np.testing.assert_array_equal(dst3['file_size'], [20, 40])
@@ -0,0 +1,116 @@
+import erikpgjohansson.solo.soar.dst
+import erikpgjohansson.solo.soar.inventory
+import erikpgjohansson.solo.soar.scan
+import erikpgjohansson.solo.soar.tests as tests
+import numpy as np
+import os
+import sqlite3
+
+
+def test_DirTreeInventory(tmp_path, monkeypatch):
+    # NOTE: Trust directory mtimes also for directories that were just
+    # modified.
+    monkeypatch.setattr(
+        erikpgjohansson.solo.soar.inventory, '_MTIME_MARGIN_NS', 0,
+    )
+    # Count the number of listed directories.
+    ls_dir_listed = []
+    list_dir = erikpgjohansson.solo.soar.scan.list_dir
+
+    def list_dir_counting(dir_path):
+        ls_dir_listed.append(dir_path)
+        return list_dir(dir_path)
+    monkeypatch.setattr(
+        erikpgjohansson.solo.soar.scan, 'list_dir', list_dir_counting,
+    )
+
+    root_dir = str(tmp_path / 'root')
+    db_path = str(tmp_path / 'inventory.sqlite')
+    tests.setup_FS(
+        root_dir, {
+            'a': {
+                'b': {'solo_L2_mag-rtn-normal_20240101_V01.cdf': 10},
+                'c': {
+                    'solo_L2_mag-rtn-normal_20240102_V01.cdf': 20,
+                    'other.txt': 30,
+                },
+            },
+            'd': {'solo_L2_mag-rtn-normal_20240103_V01.cdf': 40},
+        },
+    )
+
+    def test(full_rescan, exp_n_dirs_listed):
+        ls_dir_listed.clear()
+        inv = erikpgjohansson.solo.soar.inventory.DirTreeInventory(db_path)
+        ls_file_name, ls_file_path, ls_file_size = inv.scan(
+            root_dir, n_workers=3, full_rescan=full_rescan,
+        )
+        assert len(ls_dir_listed) == exp_n_dirs_listed
+
+        # Compare with scanning without inventory.
+        ls_entry = erikpgjohansson.solo.soar.scan.scan_dir_tree(root_dir)
+        assert ls_file_name == [e.name for e in ls_entry]
+        assert ls_file_path == [e.path for e in ls_entry]
+        assert ls_file_size == [
+            -1 if e.name.endswith('.txt') else e.stat().st_size
+            for e in ls_entry
+        ]
+
+    test(False, 5)
+    test(False, 0)
+    test(True,  5)
+
+    # Add file, remove directory, and modify file in-place (not detected).
+    tests.create_file(
+        os.path.join(root_dir, 'a/b/solo_L2_mag-rtn-normal_20240104_V01.cdf'),
+        50,
+    )
+    os.remove(
+        os.path.join(root_dir, 'a/c/solo_L2_mag-rtn-normal_20240102_V01.cdf'),
+    )
+    os.remove(os.path.join(root_dir, 'a/c/other.txt'))
+    os.rmdir(os.path.join(root_dir, 'a/c'))
+    # NOTE: Explicitly set mtimes since the mtime resolution may be coarse.
+    for rel_path in ['a', 'a/b']:
+        os.utime(os.path.join(root_dir, rel_path), ns=(0, 123456789))
+    test(False, 2)
+    test(False, 0)
+
+    # New root directory. ==> Inventory is not used.
+    root_dir = str(tmp_path / 'root' / 'a')
+    test(False, 2)
+
+    # Rows for the old root directory are deleted.
+    con = sqlite3.connect(db_path)
+    ls_rel_path = sorted(
+        rel_path for (rel_path,) in con.execute('SELECT rel_path FROM dirs')
+    )
+    con.close()
+    assert ls_rel_path == ['', 'b']
+
+
+def test_derive_DST_from_dir_inventory(tmp_path):
+    root_dir = str(tmp_path / 'root')
+    db_path = str(tmp_path / 'inventory.sqlite')
+    tests.setup_FS(
+        root_dir, {
+            'x': {
+                'y': {'solo_L2_mag-rtn-normal_20240101_V01.cdf': 10},
+                'solo_L1_epd-sis_20240102_V02.cdf': 20,
+                'other.txt': 30,
+            },
+        },
+    )
+
+    exp_dst = erikpgjohansson.solo.soar.dst.derive_DST_from_dir(root_dir)
+    assert exp_dst.n_rows == 2
+    for full_rescan in [False, False, True]:
+        act_dst = erikpgjohansson.solo.soar.dst.derive_DST_from_dir(
+            root_dir, inventory_path=db_path, full_rescan=full_rescan,
+        )
+        assert act_dst.n_rows == exp_dst.n_rows
+        for key in [
+            'file_name', 'file_path', 'item_version', 'item_id', 'file_size',
+            'begin_time_FN', 'instrument', 'processing_level',
+        ]:
+            np.testing.assert_array_equal(act_dst[key], exp_dst[key])
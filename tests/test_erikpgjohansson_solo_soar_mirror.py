@@ -8,9 +8,16 @@ content, but including file sizes).
 
 
 import erikpgjohansson.solo.soar.mirror
+import erikpgjohansson.solo.soar.const
 import erikpgjohansson.solo.soar.dwld
+import erikpgjohansson.solo.soar.remove
 import erikpgjohansson.solo.soar.tests as tests
+import erikpgjohansson.solo.soar.utils
+import json
+import numpy as np
 import os
+import pytest
+import threading
 
 
 '''
@@ -22,7 +29,11 @@ PROPOSAL: Split up into multiple modules.
 '''
 
 
-def test_sync_0(tmp_path):
+def test_sync_0(tmp_path, monkeypatch):
+    # NOTE: Do not depend on the default removal command (private script).
+    monkeypatch.setattr(
+        erikpgjohansson.solo.soar.const, 'FILE_REMOVAL_COMMAND_LIST', ['rm'],
+    )
     root_dir = tmp_path
     sync_dir = os.path.join(root_dir, 'mirror')
     download_dir = os.path.join(root_dir, 'download')
@@ -58,6 +69,7 @@ def test_sync_0(tmp_path):
         removal_dir=None,
         remove_removal_dir=False,
         sodl=sodl,
+        use_removal_command=True,
     )
 
     tests.assert_FS(
@@ -83,7 +95,12 @@ def test_sync_0(tmp_path):
     )
 
 
-def test_sync_1(tmp_path):
+def test_sync_1(tmp_path, monkeypatch):
+    # NOTE: Do not depend on the default removal command (private script).
+    monkeypatch.setattr(
+        erikpgjohansson.solo.soar.const, 'FILE_REMOVAL_COMMAND_LIST', ['rm'],
+    )
+
     class DatasetsSubsetNotEui(
         erikpgjohansson.solo.soar.mirror.DatasetsSubset,
     ):
@@ -175,6 +192,7 @@ def test_sync_1(tmp_path):
         removal_dir=None,
         remove_removal_dir=False,
         sodl=sodl,
+        use_removal_command=True,
     )
 
     tests.assert_FS(
@@ -214,6 +232,512 @@ def test_sync_1(tmp_path):
     )
 
 
+def test_sync_sharded(tmp_path):
+    L2_MAG_V02 = [
+        "2022-04-12T16:39:03.935", "2020-07-20T00:00:00.0", "SCI",
+        "solo_L2_mag-rtn-normal_20200720_V02.cdf", 108, "MAG",
+        "solo_L2_mag-rtn-normal_20200720", "V02", "L2",
+    ]
+    L2_MAG_V03 = [
+        "2022-04-12T16:39:03.935", "2020-07-20T00:00:00.0", "SCI",
+        "solo_L2_mag-rtn-normal_20200720_V03.cdf", 103, "MAG",
+        "solo_L2_mag-rtn-normal_20200720", "V03", "L2",
+    ]
+    L3_BIA = [
+        "2022-09-16T18:22:52.025", "2020-06-21T00:00:00.0", "SCI",
+        "solo_L3_rpw-bia-efield-10-seconds_20200621_V02.cdf", 11, "RPW",
+        "solo_L3_rpw-bia-efield-10-seconds_20200621", "V02", "L3",
+    ]
+    LL02_EPD = [
+        "2020-09-23T13:47:11.73", "2020-08-13T00:00:26.0",
+        "LL", "solo_LL02_epd-het-south-rates"
+        "_20200813T000026-20200814T000025_V03I.cdf",
+        113, "EPD",
+        "solo_LL02_epd-het-south-rates"
+        "_20200813T000026-20200814T000025",
+        "V03", "LL02",
+    ]
+
+    root_dir = tmp_path
+    tests.setup_FS(
+        root_dir, {
+            'download': {},
+            'mirror': {
+                'mag': {
+                    'L2': {
+                        'mag-rtn-normal': {
+                            '2020': {
+                                '07': {
+                                    'solo_L2_mag-rtn-normal_20200720'
+                                    '_V01.cdf': 100,
+                                },
+                            },
+                        },
+                    },
+                },
+                'rpw': {
+                    'L3': {
+                        'lfr_efield': {
+                            '2020': {
+                                '06': {
+                                    'solo_L3_rpw-bia-efield-10-seconds'
+                                    '_20200621_V01.cdf': 10,
+                                    'solo_L3_rpw-bia-efield-10-seconds'
+                                    '_20200621_V02.cdf': 11,
+                                },
+                                '07': {
+                                    'solo_L3_rpw-bia-efield-10-seconds'
+                                    '_20200714_V01.cdf': 12,
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    )
+    sodl = tests.SoarDownloaderTest(
+        dc_json_data_ls={
+            'MAG': [L2_MAG_V02, L2_MAG_V03],
+            'EPD': [LL02_EPD],
+            'SWA': [L3_BIA],
+        },
+    )
+
+    def sync(n_max_datasets_net_remove):
+        erikpgjohansson.solo.soar.mirror.sync(
+            sync_dir=os.path.join(root_dir, 'mirror'),
+            temp_download_dir=os.path.join(root_dir, 'download'),
+            dsss=tests.DatasetsSubsetEverything(),
+            delete_outside_subset=True,
+            n_max_datasets_net_remove=n_max_datasets_net_remove,
+            removal_dir=os.path.join(root_dir, 'removal'),
+            sodl=sodl,
+            n_shard_processes=2,
+        )
+
+    # The failsafe is enforced globally: The net number of datasets to remove
+    # is 3-2=1. The RPW shard alone would remove 2 (net).
+    with pytest.raises(AssertionError):
+        sync(n_max_datasets_net_remove=0)
+
+    sync(n_max_datasets_net_remove=1)
+
+    # NOTE: Removed datasets are moved to one batch directory per shard.
+    dc_batch_dir = {
+        instrument: os.listdir(os.path.join(root_dir, 'removal', instrument))
+        for instrument in ['mag', 'rpw']
+    }
+    tests.assert_FS(
+        root_dir,
+        {
+            # One temporary download subdirectory per shard.
+            'download': {'epd': {}, 'mag': {}, 'rpw': {}},
+            'mirror': {
+                'epd': {
+                    'LL02': {
+                        '2020': {
+                            '08': {
+                                '13': {
+                                    'solo_LL02_epd-het-south-rates'
+                                    '_20200813T000026-20200814T000025'
+                                    '_V03I.cdf': 113,
+                                },
+                            },
+                        },
+                    },
+                },
+                'mag': {
+                    'L2': {
+                        'mag-rtn-normal': {
+                            '2020': {
+                                '07': {
+                                    'solo_L2_mag-rtn-normal_20200720'
+                                    '_V03.cdf': 103,
+                                },
+                            },
+                        },
+                    },
+                },
+                'rpw': {
+                    'L3': {
+                        'lfr_efield': {
+                            '2020': {
+                                '06': {
+                                    'solo_L3_rpw-bia-efield-10-seconds'
+                                    '_20200621_V02.cdf': 11,
+                                },
+                                '07': {},
+                            },
+                        },
+                    },
+                },
+            },
+            # One removal subdirectory per shard.
+            'removal': {
+                'epd': {},
+                'mag': {
+                    dc_batch_dir['mag'][0]: {
+                        'solo_L2_mag-rtn-normal_20200720_V01.cdf': 100,
+                    },
+                },
+                'rpw': {
+                    dc_batch_dir['rpw'][0]: {
+                        'solo_L3_rpw-bia-efield-10-seconds_20200621_V01.cdf':
+                            10,
+                        'solo_L3_rpw-bia-efield-10-seconds_20200714_V01.cdf':
+                            12,
+                    },
+                },
+            },
+        },
+    )
+
+
+def test_plan_sync_execute_plan(tmp_path, monkeypatch):
+    # NOTE: Do not depend on the default removal command (private script).
+    monkeypatch.setattr(
+        erikpgjohansson.solo.soar.const, 'FILE_REMOVAL_COMMAND_LIST', ['rm'],
+    )
+    L2_MAG_V02 = [
+        "2022-04-12T16:39:03.935", "2020-07-20T00:00:00.0", "SCI",
+        "solo_L2_mag-rtn-normal_20200720_V02.cdf", 108, "MAG",
+        "solo_L2_mag-rtn-normal_20200720", "V02", "L2",
+    ]
+    L2_MAG_V03 = [
+        "2022-04-12T16:39:03.935", "2020-07-20T00:00:00.0", "SCI",
+        "solo_L2_mag-rtn-normal_20200720_V03.cdf", 103, "MAG",
+        "solo_L2_mag-rtn-normal_20200720", "V03", "L2",
+    ]
+    FS_MIRROR_BEFORE = {
+        'mag': {
+            'L2': {
+                'mag-rtn-normal': {
+                    '2020': {
+                        '07': {
+                            'solo_L2_mag-rtn-normal_20200720_V01.cdf': 100,
+                        },
+                    },
+                },
+            },
+        },
+    }
+
+    root_dir = tmp_path
+    sync_dir = os.path.join(root_dir, 'mirror')
+    download_dir = os.path.join(root_dir, 'download')
+    plan_path = os.path.join(root_dir, 'plan.json')
+    throughput_path = os.path.join(root_dir, 'throughput.json')
+    tests.setup_FS(
+        root_dir, {'download': {}, 'mirror': FS_MIRROR_BEFORE},
+    )
+    sodl = tests.SoarDownloaderTest(
+        dc_json_data_ls={'MAG': [L2_MAG_V02, L2_MAG_V03]},
+    )
+    erikpgjohansson.solo.soar.utils.record_download_throughput(
+        throughput_path, 1000, 10,
+    )
+
+    plan = erikpgjohansson.solo.soar.mirror.plan_sync(
+        sync_dir=sync_dir,
+        dsss=tests.DatasetsSubsetEverything(),
+        plan_path=plan_path,
+        sodl=sodl,
+        throughput_path=throughput_path,
+    )
+
+    # Planning does not modify any files.
+    tests.assert_FS(
+        root_dir,
+        {
+            'download': {}, 'mirror': FS_MIRROR_BEFORE,
+            'plan.json': os.stat(plan_path).st_size,
+            'throughput.json': os.stat(throughput_path).st_size,
+        },
+    )
+    with open(plan_path) as f:
+        assert json.load(f) == plan
+    assert plan['download']['file_name'] == [
+        'solo_L2_mag-rtn-normal_20200720_V03.cdf',
+    ]
+    assert plan['remove']['file_path'] == [os.path.join(
+        sync_dir, 'mag', 'L2', 'mag-rtn-normal', '2020', '07',
+        'solo_L2_mag-rtn-normal_20200720_V01.cdf',
+    )]
+    assert plan['summary']['download'] == {
+        'n_datasets': 1, 'n_bytes': 103,
+        'instrument_level': [{
+            'instrument': 'MAG', 'processing_level': 'L2',
+            'n_datasets': 1, 'n_bytes': 103,
+        }],
+    }
+    assert plan['summary']['remove']['n_bytes'] == 100
+    assert plan['download_throughput'] == 100
+    assert plan['estimated_download_time_s'] == 1.03
+
+    erikpgjohansson.solo.soar.mirror.execute_plan(
+        plan_path, download_dir, sodl=sodl, throughput_path=throughput_path,
+        use_removal_command=True,
+    )
+
+    tests.assert_FS(
+        os.path.join(root_dir, 'mirror'),
+        {
+            'mag': {
+                'L2': {
+                    'mag-rtn-normal': {
+                        '2020': {
+                            '07': {
+                                'solo_L2_mag-rtn-normal_20200720_V03.cdf':
+                                    103,
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    )
+    with open(throughput_path) as f:
+        assert len(json.load(f)) == 2
+
+    # Can not execute the plan again, since the dataset to remove is gone.
+    with pytest.raises(AssertionError):
+        erikpgjohansson.solo.soar.mirror.execute_plan(
+            plan, download_dir, sodl=sodl, use_removal_command=True,
+        )
+
+
+def test_sync_relocate_misplaced(tmp_path, monkeypatch):
+    # NOTE: Do not depend on the default removal command (private script).
+    monkeypatch.setattr(
+        erikpgjohansson.solo.soar.const, 'FILE_REMOVAL_COMMAND_LIST', ['rm'],
+    )
+    L2_MAG_V03 = [
+        "2022-04-12T16:39:03.935", "2020-07-20T00:00:00.0", "SCI",
+        "solo_L2_mag-rtn-normal_20200720_V03.cdf", 103, "MAG",
+        "solo_L2_mag-rtn-normal_20200720", "V03", "L2",
+    ]
+    L2_MAG_2 = [
+        "2022-04-12T16:39:03.935", "2020-07-21T00:00:00.0", "SCI",
+        "solo_L2_mag-rtn-normal_20200721_V01.cdf", 104, "MAG",
+        "solo_L2_mag-rtn-normal_20200721", "V01", "L2",
+    ]
+
+    root_dir = tmp_path
+    sync_dir = os.path.join(root_dir, 'mirror')
+    tests.setup_FS(
+        root_dir, {
+            'download': {},
+            'mirror': {
+                'misc': {
+                    # Misplaced. ==> Relocated.
+                    'solo_L2_mag-rtn-normal_20200720_V03.cdf': 103,
+                    # Misplaced duplicate. ==> Kept.
+                    'solo_L2_mag-rtn-normal_20200721_V01.cdf': 104,
+                },
+                'mag': {
+                    'L2': {
+                        'mag-rtn-normal': {
+                            '2020': {
+                                '07': {
+                                    'solo_L2_mag-rtn-normal_20200721'
+                                    '_V01.cdf': 104,
+                                },
+                            },
+                        },
+                    },
+                },
+                # Not a dataset. ==> Kept.
+                'solo_L2_mag-rtn-normal_20200720_V03.txt': 1,
+            },
+        },
+    )
+    ino = os.stat(os.path.join(
+        sync_dir, 'misc', 'solo_L2_mag-rtn-normal_20200720_V03.cdf',
+    )).st_ino
+
+    erikpgjohansson.solo.soar.mirror.sync(
+        sync_dir=sync_dir,
+        temp_download_dir=os.path.join(root_dir, 'download'),
+        dsss=tests.DatasetsSubsetEverything(),
+        n_max_datasets_net_remove=0,
+        sodl=tests.SoarDownloaderTest(
+            dc_json_data_ls={'MAG': [L2_MAG_V03, L2_MAG_2]},
+        ),
+        use_removal_command=True,
+    )
+
+    tests.assert_FS(
+        root_dir,
+        {
+            'download': {},
+            'mirror': {
+                'misc': {
+                    'solo_L2_mag-rtn-normal_20200721_V01.cdf': 104,
+                },
+                'mag': {
+                    'L2': {
+                        'mag-rtn-normal': {
+                            '2020': {
+                                '07': {
+                                    'solo_L2_mag-rtn-normal_20200720'
+                                    '_V03.cdf': 103,
+                                    'solo_L2_mag-rtn-normal_20200721'
+                                    '_V01.cdf': 104,
+                                },
+                            },
+                        },
+                    },
+                },
+                'solo_L2_mag-rtn-normal_20200720_V03.txt': 1,
+            },
+        },
+    )
+    # Same file (renamed, not downloaded).
+    assert os.stat(os.path.join(
+        sync_dir, 'mag', 'L2', 'mag-rtn-normal', '2020', '07',
+        'solo_L2_mag-rtn-normal_20200720_V03.cdf',
+    )).st_ino == ino
+
+
+def test_sync_remover(tmp_path):
+    L2_MAG_V03 = [
+        "2022-04-12T16:39:03.935", "2020-07-20T00:00:00.0", "SCI",
+        "solo_L2_mag-rtn-normal_20200720_V03.cdf", 103, "MAG",
+        "solo_L2_mag-rtn-normal_20200720", "V03", "L2",
+    ]
+
+    def get_FS_mirror(file_name, file_size):
+        return {
+            'mag': {
+                'L2': {
+                    'mag-rtn-normal': {
+                        '2020': {'07': {file_name: file_size}},
+                    },
+                },
+            },
+        }
+
+    root_dir = tmp_path
+    sync_dir = os.path.join(root_dir, 'mirror')
+    trash_dir = os.path.join(root_dir, 'trash')
+    tests.setup_FS(
+        root_dir, {
+            'download': {},
+            'mirror': get_FS_mirror(
+                'solo_L2_mag-rtn-normal_20200720_V01.cdf', 100,
+            ),
+        },
+    )
+
+    def sync(**kwargs):
+        erikpgjohansson.solo.soar.mirror.sync(
+            sync_dir=sync_dir,
+            temp_download_dir=os.path.join(root_dir, 'download'),
+            dsss=tests.DatasetsSubsetEverything(),
+            sodl=tests.SoarDownloaderTest(
+                dc_json_data_ls={'MAG': [L2_MAG_V03]},
+            ),
+            **kwargs,
+        )
+
+    # No way of removing datasets specified. ==> Fail (before downloading).
+    with pytest.raises(AssertionError):
+        sync()
+
+    sync(remover=erikpgjohansson.solo.soar.remove.TrashRemover(trash_dir))
+
+    ls_batch_dir = os.listdir(trash_dir)
+    assert len(ls_batch_dir) == 1
+    tests.assert_FS(
+        root_dir,
+        {
+            'download': {},
+            'mirror': get_FS_mirror(
+                'solo_L2_mag-rtn-normal_20200720_V03.cdf', 103,
+            ),
+            'trash': {
+                ls_batch_dir[0]: {
+                    'solo_L2_mag-rtn-normal_20200720_V01.cdf': 100,
+                },
+            },
+        },
+    )
+
+
+def test_sync_concurrent_local_DST_SDT(tmp_path, monkeypatch):
+    '''Test that the local datasets are scanned concurrently with
+    downloading the SDT, and that exceptions from both are propagated.'''
+    root_dir = tmp_path
+    sync_dir = os.path.join(root_dir, 'mirror')
+    download_dir = os.path.join(root_dir, 'download')
+    tests.setup_FS(root_dir, {'download': {}, 'mirror': {}})
+    # NOTE: Do not depend on the default removal command (private script).
+    monkeypatch.setattr(
+        erikpgjohansson.solo.soar.const, 'FILE_REMOVAL_COMMAND_LIST', ['rm'],
+    )
+
+    sodl = tests.SoarDownloaderTest(
+        dc_json_data_ls={
+            'EPD':
+                [[
+                    "2020-09-23T13:47:11.73", "2020-08-13T00:00:26.0",
+                    "LL", "solo_LL02_epd-het-south-rates"
+                    "_20200813T000026-20200814T000025_V03I.cdf",
+                    113, "EPD",
+                    "solo_LL02_epd-het-south-rates"
+                    "_20200813T000026-20200814T000025",
+                    "V03", "LL02",
+                ]],
+        },
+    )
+
+    derive_DST_from_dir = erikpgjohansson.solo.soar.dst.derive_DST_from_dir
+    download_SDT_DST = erikpgjohansson.solo.soar.dwld.download_SDT_DST
+    dc_exception = {}
+
+    def wrap(func, key, barrier):
+        def wrapper(*args, **kwargs):
+            # NOTE: Fails (times out) unless both functions are called
+            # concurrently.
+            barrier.wait(timeout=10)
+            if key in dc_exception:
+                raise dc_exception[key]
+            return func(*args, **kwargs)
+        return wrapper
+
+    def sync():
+        barrier = threading.Barrier(2)
+        monkeypatch.setattr(
+            erikpgjohansson.solo.soar.dst, 'derive_DST_from_dir',
+            wrap(derive_DST_from_dir, 'local', barrier),
+        )
+        monkeypatch.setattr(
+            erikpgjohansson.solo.soar.dwld, 'download_SDT_DST',
+            wrap(download_SDT_DST, 'SDT', barrier),
+        )
+        erikpgjohansson.solo.soar.mirror.sync(
+            sync_dir=sync_dir,
+            temp_download_dir=download_dir,
+            dsss=tests.DatasetsSubsetEverything(),
+            sodl=sodl,
+            use_removal_command=True,
+        )
+
+    for dc_exception_test in (
+        {'local': ValueError()},
+        {'SDT': ValueError()},
+        {'local': KeyError(), 'SDT': ValueError()},
+    ):
+        dc_exception = dc_exception_test
+        with pytest.raises(ValueError):
+            sync()
+
+    dc_exception = {}
+    sync()
+    assert os.listdir(os.path.join(sync_dir, 'epd')) == ['LL02']
+
+
 def test_offline_cleanup_0(tmp_path):
     # TODO: Check misplaced files.
 
@@ -351,3 +875,67 @@ def test_offline_cleanup_1(tmp_path):
             },
         },
     )
+
+
+def test_find_file_name_size_difference():
+
+    def test(ls_name1, ls_name2, ls_size1, ls_size2, exp_ls_b1, exp_ls_b2):
+        act_na_b1, act_na_b2 = \
+            erikpgjohansson.solo.soar.mirror._find_file_name_size_difference(
+                np.array(ls_name1, dtype=object),
+                np.array(ls_name2, dtype=object),
+                np.array(ls_size1, dtype='int64'),
+                np.array(ls_size2, dtype='int64'),
+            )
+        np.testing.assert_array_equal(act_na_b1, np.array(exp_ls_b1, bool))
+        np.testing.assert_array_equal(act_na_b2, np.array(exp_ls_b2, bool))
+
+    test([], [], [], [], [], [])
+    test(['a'], [], [1], [], [1], [])
+    test([], ['a'], [], [1], [], [1])
+    test(['a', 'b'], ['b', 'a'], [1, 2], [2, 1], [0, 0], [0, 0])
+    # Same name, different size.
+    test(['a', 'b'], ['b', 'a'], [1, 2], [2, 9], [1, 0], [0, 1])
+    # Duplicates.
+    test(['a', 'a', 'c'], ['a', 'b'], [1, 1, 3], [1, 2], [0, 0, 1], [0, 1])
+
+
+def test_DatasetsSubset_datasets_in_subset():
+    '''Test that the batch method returns the same result as the scalar
+    method, both for the default implementation and a vectorized one.'''
+    import erikpgjohansson.solo.soar.appl.irfu_mirror
+
+    class DatasetsSubsetDefault(
+        erikpgjohansson.solo.soar.appl.irfu_mirror.DatasetsSubset,
+    ):
+        # Restore the default (non-vectorized) batch method.
+        datasets_in_subset = \
+            erikpgjohansson.solo.soar.mirror.DatasetsSubset.datasets_in_subset
+
+    LS_DSID = [
+        'SOLO_LL02_MAG', 'SOLO_LL02_EPD-HET-SUN-RATES', 'SOLO_L1_EPD-SIS',
+        'SOLO_L2_EPD-STEP-MAIN', 'SOLO_L1_MAG-SRF-DEBUG',
+        'SOLO_L2_MAG-RTN-NORMAL', 'SOLO_L2_SWA-PAS-GRND-MOM',
+        'SOLO_L3_SWA-EAS-NMPAD-PSD', 'SOLO_L3_SWA-HIS-COMP-10MIN',
+        'SOLO_L2_EUI-FSI174-IMAGE',
+    ]
+    na_dsid = np.array(LS_DSID, dtype=object)
+    na_instrument = np.array(
+        [s.split('_')[2].split('-')[0] for s in LS_DSID], dtype=object,
+    )
+    na_level = np.array([s.split('_')[1] for s in LS_DSID], dtype=object)
+    na_begin_dt64 = np.full(
+        na_dsid.shape, np.datetime64('2022-01-01T00:00:00.000'),
+    )
+
+    for dsss in (
+        erikpgjohansson.solo.soar.appl.irfu_mirror.DatasetsSubset(),
+        DatasetsSubsetDefault(),
+    ):
+        na_b = dsss.datasets_in_subset(
+            na_instrument, na_level, na_begin_dt64, na_dsid,
+        )
+        assert na_b.dtype == bool
+        np.testing.assert_array_equal(
+            na_b, [1, 0, 1, 1, 0, 1, 1, 1, 0, 0],
+        )
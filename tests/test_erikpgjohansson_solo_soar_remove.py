@@ -0,0 +1,129 @@
+import erikpgjohansson.solo.soar.remove as remove
+import erikpgjohansson.solo.soar.tests as tests
+import os
+import time
+
+
+def test_UnlinkRemover(tmp_path):
+    tests.setup_FS(tmp_path, {'a': {'f1': 1, 'f2': 2}, 'f3': 3})
+
+    ls_path = [
+        os.path.join(tmp_path, 'a', 'f1'),
+        os.path.join(tmp_path, 'f3'),
+        os.path.join(tmp_path, 'nonexisting'),
+    ]
+    ls_outcome = remove.UnlinkRemover(n_workers=2).remove(ls_path)
+
+    assert [outcome.path for outcome in ls_outcome] == ls_path
+    assert [outcome.ok for outcome in ls_outcome] == [True, True, False]
+    assert 'FileNotFoundError' in ls_outcome[2].error
+    assert remove.log_outcomes(ls_outcome) == 1
+    tests.assert_FS(tmp_path, {'a': {'f2': 2}})
+
+    assert remove.UnlinkRemover().remove([]) == []
+
+
+def test_TrashRemover(tmp_path):
+    trash_dir = os.path.join(tmp_path, 'trash')
+    tests.setup_FS(
+        tmp_path, {'sync': {'a': {'f': 10}, 'b': {'f': 20}, 'g': 30}},
+    )
+
+    remover = remove.TrashRemover(trash_dir)
+    ls_outcome = remover.remove([
+        os.path.join(tmp_path, 'sync', 'a', 'f'),
+        os.path.join(tmp_path, 'sync', 'b', 'f'),
+    ])
+    assert all(outcome.ok for outcome in ls_outcome)
+    # Empty call. ==> No new batch directory.
+    assert remover.remove([]) == []
+
+    ls_batch_dir = os.listdir(trash_dir)
+    assert len(ls_batch_dir) == 1
+    tests.assert_FS(
+        tmp_path, {
+            'sync': {'a': {}, 'b': {}, 'g': 30},
+            'trash': {ls_batch_dir[0]: {'f': 10, 'f.1': 20}},
+        },
+    )
+
+    # ------------------------------------------------------------------
+    # Size quota: Oldest batch directory is evicted when adding a new one.
+    # ------------------------------------------------------------------
+    # Make the existing batch directory look older.
+    os.rename(
+        os.path.join(trash_dir, ls_batch_dir[0]),
+        os.path.join(trash_dir, '2020-01-01T00.00.00_old'),
+    )
+    os.mkdir(os.path.join(trash_dir, 'not_a_batch_dir'))
+    remover = remove.TrashRemover(trash_dir, max_size_bytes=40)
+    ls_outcome = remover.remove([os.path.join(tmp_path, 'sync', 'g')])
+    assert all(outcome.ok for outcome in ls_outcome)
+
+    ls_batch_dir = sorted(os.listdir(trash_dir))
+    assert len(ls_batch_dir) == 2
+    assert ls_batch_dir[1] == 'not_a_batch_dir'
+    tests.assert_FS(
+        tmp_path, {
+            'sync': {'a': {}, 'b': {}},
+            'trash': {ls_batch_dir[0]: {'g': 30}, 'not_a_batch_dir': {}},
+        },
+    )
+
+    # ------------------------------------------
+    # Age: Batch directories older than max age.
+    # ------------------------------------------
+    time.sleep(1.1)
+    remove.TrashRemover(trash_dir, max_age_s=1).evict()
+    tests.assert_FS(tmp_path, {
+        'sync': {'a': {}, 'b': {}}, 'trash': {'not_a_batch_dir': {}},
+    })
+
+
+def test_SnapshotRemover(tmp_path):
+    sync_dir = os.path.join(tmp_path, 'sync')
+    snapshot_dir = os.path.join(tmp_path, 'snapshot')
+    tests.setup_FS(
+        tmp_path, {'sync': {'a': {'f': 10}, 'b': {'f': 20}}, 'other': 1},
+    )
+    ino = os.stat(os.path.join(sync_dir, 'a', 'f')).st_ino
+
+    ls_outcome = remove.SnapshotRemover(snapshot_dir, sync_dir).remove([
+        os.path.join(sync_dir, 'a', 'f'),
+        os.path.join(sync_dir, 'b', 'f'),
+        # Not under root directory. ==> Error, kept.
+        os.path.join(tmp_path, 'other'),
+    ])
+
+    assert [outcome.ok for outcome in ls_outcome] == [True, True, False]
+    ls_batch_dir = os.listdir(snapshot_dir)
+    assert len(ls_batch_dir) == 1
+    tests.assert_FS(
+        tmp_path, {
+            'sync': {'a': {}, 'b': {}},
+            'snapshot': {ls_batch_dir[0]: {'a': {'f': 10}, 'b': {'f': 20}}},
+            'other': 1,
+        },
+    )
+    assert os.stat(
+        os.path.join(snapshot_dir, ls_batch_dir[0], 'a', 'f'),
+    ).st_ino == ino
+
+
+def test_CommandRemover(tmp_path):
+    tests.setup_FS(tmp_path, {'sync': {'f1': 1, 'f2': 2}})
+
+    ls_outcome = remove.CommandRemover(
+        removal_dir=os.path.join(tmp_path, 'removal'),
+    ).remove([
+        os.path.join(tmp_path, 'sync', 'f1'),
+        os.path.join(tmp_path, 'sync', 'nonexisting'),
+    ])
+    assert [outcome.ok for outcome in ls_outcome] == [True, False]
+    tests.assert_FS(tmp_path, {'sync': {'f2': 2}, 'removal': {'f1': 1}})
+
+    ls_outcome = remove.CommandRemover(ls_command=['rm']).remove([
+        os.path.join(tmp_path, 'sync', 'f2'),
+    ])
+    assert [outcome.ok for outcome in ls_outcome] == [True]
+    tests.assert_FS(tmp_path, {'sync': {}, 'removal': {'f1': 1}})
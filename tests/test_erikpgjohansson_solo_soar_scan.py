@@ -0,0 +1,192 @@
+import erikpgjohansson.solo.iddt
+import erikpgjohansson.solo.metadata
+import erikpgjohansson.solo.soar.dst
+import erikpgjohansson.solo.soar.scan
+import numpy as np
+import os
+import random
+
+
+def create_dir_tree(root_dir):
+    '''Create a directory tree with (empty and non-empty) files, directories,
+    symlinks and non-dataset files.'''
+    rng = random.Random(0)
+    ls_dir = [root_dir]
+    for i_dir in range(60):
+        dir_path = os.path.join(rng.choice(ls_dir), f'd{i_dir}')
+        os.mkdir(dir_path)
+        ls_dir.append(dir_path)
+    for i_file in range(300):
+        dir_path = rng.choice(ls_dir)
+        if rng.random() < 0.8:
+            file_name = (
+                'solo_L2_mag-rtn-normal'
+                f'_2024{1 + i_file % 12:02}{1 + i_file % 28:02}'
+                f'_V{i_file:03}.cdf'
+            )
+        else:
+            file_name = f'other_{i_file}.txt'
+        with open(os.path.join(dir_path, file_name), 'wb') as f:
+            f.write(b'x' * rng.randint(0, 100))
+
+    # Symlinks to directory (not descended into) and file.
+    os.symlink(ls_dir[5], os.path.join(ls_dir[1], 'link_dir'))
+    file_path = os.path.join(
+        ls_dir[3], 'solo_L2_mag-rtn-normal_20240101_V01.cdf',
+    )
+    with open(file_path, 'wb') as f:
+        f.write(b'x' * 200)
+    os.symlink(
+        file_path,
+        os.path.join(ls_dir[2], 'solo_L2_mag-rtn-normal_20240102_V01.cdf'),
+    )
+
+
+def test_scan_dir_tree(tmp_path):
+    root_dir = str(tmp_path)
+    create_dir_tree(root_dir)
+
+    exp_ls_path = []
+    for dir_path, _, ls_file_name in os.walk(root_dir):
+        for file_name in ls_file_name:
+            exp_ls_path.append(os.path.join(dir_path, file_name))
+    assert len(exp_ls_path) == 302
+
+    for n_workers in [1, 2, 16]:
+        for root_dir2 in [root_dir, root_dir + os.sep]:
+            ls_entry = erikpgjohansson.solo.soar.scan.scan_dir_tree(
+                root_dir2, n_workers,
+            )
+            # NOTE: Same order as os.walk().
+            assert [e.path for e in ls_entry] == [
+                os.path.join(root_dir2, os.path.relpath(p, root_dir))
+                for p in exp_ls_path
+            ]
+
+            na_file_size = erikpgjohansson.solo.soar.scan.get_file_sizes(
+                ls_entry, n_workers,
+            )
+            assert na_file_size.dtype == np.dtype('int64')
+            np.testing.assert_array_equal(
+                na_file_size, [os.stat(p).st_size for p in exp_ls_path],
+            )
+
+    assert erikpgjohansson.solo.soar.scan.get_file_sizes([]).shape == (0,)
+
+
+def test_derive_DST_from_dir(tmp_path):
+    '''Compare with the earlier implementation (based on os.walk()).'''
+    root_dir = str(tmp_path)
+    create_dir_tree(root_dir)
+    # Non-existent date. ==> Ignored (not an exception).
+    with open(
+        os.path.join(root_dir, 'solo_L2_mag-rtn-normal_20200230_V01.cdf'),
+        'wb',
+    ):
+        pass
+
+    ls_file_name = []
+    ls_file_path = []
+    for dir_path, _, ls_file_name_dir in os.walk(root_dir):
+        for file_name in ls_file_name_dir:
+            ls_file_name.append(file_name)
+            ls_file_path.append(os.path.join(dir_path, file_name))
+    na_b_parsed, _ = erikpgjohansson.solo.metadata.parse_filenames(
+        ls_file_name,
+    )
+    exp_na_file_path = np.array(ls_file_path, dtype=object)[na_b_parsed]
+    exp_na_file_size = [os.stat(p).st_size for p in exp_na_file_path]
+
+    for n_workers in [None, 1, 7]:
+        dst = erikpgjohansson.solo.soar.dst.derive_DST_from_dir(
+            root_dir, n_workers=n_workers,
+        )
+        assert dst.n_rows > 200
+        assert 'solo_L2_mag-rtn-normal_20200230_V01.cdf' \
+            not in dst['file_name']
+        np.testing.assert_array_equal(dst['file_path'], exp_na_file_path)
+        np.testing.assert_array_equal(dst['file_size'], exp_na_file_size)
+        np.testing.assert_array_equal(
+            dst['file_name'],
+            [os.path.basename(p) for p in exp_na_file_path],
+        )
+
+
+def test_scan_dir_tree_select_subdir(tmp_path):
+    '''Compare with os.walk() with pruning.'''
+    root_dir = str(tmp_path)
+    create_dir_tree(root_dir)
+
+    def select_subdir(tpl_dir_name):
+        return not tpl_dir_name[-1].endswith(('1', '3'))
+
+    exp_ls_path = []
+    for dir_path, ls_dir_name, ls_file_name in os.walk(root_dir):
+        tpl_dir_name = tuple(
+            os.path.relpath(dir_path, root_dir).split(os.sep),
+        ) if dir_path != root_dir else ()
+        ls_dir_name[:] = [
+            s for s in ls_dir_name if select_subdir(tpl_dir_name + (s,))
+        ]
+        for file_name in ls_file_name:
+            exp_ls_path.append(os.path.join(dir_path, file_name))
+    assert 0 < len(exp_ls_path) < 302
+
+    for n_workers in [1, 16]:
+        ls_entry = erikpgjohansson.solo.soar.scan.scan_dir_tree(
+            root_dir, n_workers, select_subdir=select_subdir,
+        )
+        assert [e.path for e in ls_entry] == exp_ls_path
+
+
+def test_derive_DST_from_dir_iddt_filters(tmp_path):
+    root_dir = str(tmp_path)
+    ls_file_name = [
+        'solo_L2_mag-rtn-normal_20200101_V01.cdf',
+        'solo_L2_mag-rtn-normal_20200301_V01.cdf',
+        'solo_L2_mag-rtn-burst_20200302_V02.cdf',
+        'solo_L2_epd-sis-rates_20200301_V01.cdf',
+        'solo_L1_mag-ibs_20200301_V01.cdf',
+        'solo_L1_mag-ibs_20200315_V01.cdf',
+        'solo_LL02_mag_20200315T000000-20200316T000000_V01.cdf',
+    ]
+    for file_name in ls_file_name:
+        dir_path = os.path.join(
+            root_dir, erikpgjohansson.solo.iddt.get_IDDT_subdir(file_name),
+        )
+        os.makedirs(dir_path, exist_ok=True)
+        with open(os.path.join(dir_path, file_name), 'wb'):
+            pass
+    # Dataset directly in the root directory is always found.
+    with open(os.path.join(root_dir, ls_file_name[0]), 'wb'):
+        pass
+
+    def test(tpl_filter, exp_ls_file_name):
+        dst = erikpgjohansson.solo.soar.dst.derive_DST_from_dir(
+            root_dir, iddt_filters=tpl_filter,
+        )
+        assert sorted(dst['file_name']) == sorted(exp_ls_file_name)
+
+    IddtSubtreeFilter = erikpgjohansson.solo.iddt.IddtSubtreeFilter
+    test(None, ls_file_name + ls_file_name[0:1])
+    test((), ls_file_name[0:1])
+    test(
+        (IddtSubtreeFilter(instruments=('MAG',), levels=('L2',)),),
+        ls_file_name[0:3] + ls_file_name[0:1],
+    )
+    test(
+        (IddtSubtreeFilter(
+            instruments=('MAG',), levels=('L1', 'L2'),
+            start_dt64=np.datetime64('2020-03-02'),
+            stop_dt64=np.datetime64('2020-04-01'),
+        ),),
+        # NOTE: L2 directories are per month. L1 directories are per day.
+        ls_file_name[1:3] + ls_file_name[5:6] + ls_file_name[0:1],
+    )
+    test(
+        (
+            IddtSubtreeFilter(levels=('LL02',)),
+            IddtSubtreeFilter(instruments=('EPD',)),
+        ),
+        ls_file_name[3:4] + ls_file_name[6:7] + ls_file_name[0:1],
+    )
@@ -0,0 +1,144 @@
+import erikpgjohansson.solo.soar.dst
+import erikpgjohansson.solo.soar.tests as tests
+import erikpgjohansson.solo.soar.watch
+import errno
+import os
+import pytest
+import shutil
+import time
+
+
+def get_path_size_set(dst):
+    return set(zip(dst['file_path'].tolist(), dst['file_size'].tolist()))
+
+
+@pytest.mark.parametrize('use_inotify', [True, False])
+def test_LocalDatasetsWatcher(tmp_path, use_inotify):
+    if use_inotify and erikpgjohansson.solo.soar.watch._get_libc() is None:
+        pytest.skip('inotify is not available.')
+
+    root_dir = str(tmp_path / 'root')
+    tests.setup_FS(
+        root_dir, {
+            'a': {
+                'b': {'solo_L2_mag-rtn-normal_20240101_V01.cdf': 10},
+                'other.txt': 30,
+            },
+        },
+    )
+
+    def test():
+        if not use_inotify:
+            watcher.rescan()
+        exp_dst = erikpgjohansson.solo.soar.dst.derive_DST_from_dir(root_dir)
+        act_dst = watcher.get_DST()
+        assert get_path_size_set(act_dst) == get_path_size_set(exp_dst)
+        assert set(act_dst['item_id']) == set(exp_dst['item_id'])
+
+    with erikpgjohansson.solo.soar.watch.LocalDatasetsWatcher(
+        root_dir, use_inotify=use_inotify,
+    ) as watcher:
+        assert watcher.uses_inotify == use_inotify
+        test()
+
+        # New file.
+        tests.create_file(
+            os.path.join(root_dir, 'a/solo_L1_epd-sis_20240102_V02.cdf'), 20,
+        )
+        test()
+        # Modified file.
+        with open(
+            os.path.join(root_dir, 'a/solo_L1_epd-sis_20240102_V02.cdf'), 'ab',
+        ) as f:
+            f.write(b'0')
+        test()
+        # New directory tree (moved into the tree), with files.
+        os.makedirs(str(tmp_path / 'x/y'))
+        tests.create_file(
+            str(tmp_path / 'x/y/solo_L2_mag-rtn-normal_20240103_V01.cdf'), 40,
+        )
+        os.rename(str(tmp_path / 'x'), os.path.join(root_dir, 'x'))
+        test()
+        # File in new subdirectory.
+        os.makedirs(os.path.join(root_dir, 'x/y/z'))
+        tests.create_file(
+            os.path.join(
+                root_dir, 'x/y/z/solo_L2_mag-rtn-normal_20240104_V01.cdf',
+            ),
+            50,
+        )
+        test()
+        # Renamed file and directory.
+        os.rename(
+            os.path.join(root_dir, 'a/solo_L1_epd-sis_20240102_V02.cdf'),
+            os.path.join(root_dir, 'a/b/solo_L1_epd-sis_20240102_V02.cdf'),
+        )
+        os.rename(os.path.join(root_dir, 'x'), os.path.join(root_dir, 'x2'))
+        test()
+        tests.create_file(
+            os.path.join(
+                root_dir, 'x2/y/z/solo_L2_mag-rtn-normal_20240105_V01.cdf',
+            ),
+            60,
+        )
+        test()
+        # Removed file and directory tree.
+        os.remove(os.path.join(
+            root_dir, 'a/b/solo_L2_mag-rtn-normal_20240101_V01.cdf',
+        ))
+        shutil.rmtree(os.path.join(root_dir, 'x2'))
+        test()
+        assert watcher.get_DST().n_rows == 1
+
+        if use_inotify:
+            assert watcher.n_rescans == 1
+
+            # Simulated event queue overflow. ==> Full rescan.
+            with watcher._lock:
+                watcher._process_event(
+                    -1, erikpgjohansson.solo.soar.watch._IN_Q_OVERFLOW, '',
+                )
+            test()
+            assert watcher.n_rescans == 2
+
+            # Out of inotify watches. ==> Periodic full rescans.
+
+            def add_watch_failing(dir_path):
+                raise OSError(
+                    errno.ENOSPC, os.strerror(errno.ENOSPC), dir_path,
+                )
+            watcher._add_watch = add_watch_failing
+            os.makedirs(os.path.join(root_dir, 'c'))
+            tests.create_file(
+                os.path.join(
+                    root_dir, 'c/solo_L2_mag-rtn-normal_20240106_V01.cdf',
+                ),
+                70,
+            )
+            test()
+            assert not watcher.uses_inotify
+
+
+def test_LocalDatasetsWatcher_retry(tmp_path):
+    '''Background thread retries soon after an exception.'''
+    root_dir = str(tmp_path / 'root')
+    os.makedirs(root_dir)
+
+    with erikpgjohansson.solo.soar.watch.LocalDatasetsWatcher(
+        root_dir, rescan_interval_s=3600, use_inotify=False,
+    ) as watcher:
+        assert watcher.n_rescans == 1
+        ls_exception = [Exception('Simulated failure.')]
+        update = watcher._update
+
+        def update_failing():
+            if ls_exception:
+                raise ls_exception.pop()
+            update()
+        watcher._update = update_failing
+
+        t_timeout = time.monotonic() + 10
+        while watcher.n_rescans == 1 and time.monotonic() < t_timeout:
+            time.sleep(0.1)
+        assert not ls_exception
+        assert watcher.n_rescans == 2
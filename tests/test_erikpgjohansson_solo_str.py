@@ -0,0 +1,127 @@
+import erikpgjohansson.solo.str
+import pytest
+import random
+import re
+
+
+def _read_token_legacy(s, regexp_list, search_dir):
+    '''Earlier implementation of read_token() (without compiled regexps and
+    string indices). Used as reference.'''
+    for i_regexp in range(len(regexp_list)):
+        if search_dir == 1:
+            mo = re.search('^' + regexp_list[i_regexp], s)
+            if mo:
+                token = mo.group(0)
+                return token, s[len(token):], i_regexp
+        else:
+            mo = re.search(regexp_list[i_regexp] + '$', s)
+            if mo:
+                token = mo.group(0)
+                return token, s[:len(s) - len(token)], i_regexp
+    return None, s, -1
+
+
+def _regexp_str_parts_legacy(s, regexp_list, search_dir):
+    '''Earlier implementation of regexp_str_parts() with
+    nonmatch_policy='permit non-match'. Used as reference.'''
+    if search_dir == -1:
+        regexp_list = regexp_list[::-1]
+    substr_list = []
+    remaining_str = s
+    for regexp in regexp_list:
+        token, remaining_str, j = _read_token_legacy(
+            remaining_str, [regexp], search_dir,
+        )
+        if j == -1:
+            break
+        substr_list.append(token)
+    else:
+        if not remaining_str:
+            return substr_list[::search_dir], remaining_str, True
+    return substr_list[::search_dir], remaining_str, False
+
+
+LS_REGEXP_LIST = [
+    ['a+', 'b'],
+    ['.*', '(|-x)', '_', '[0-9T-]{4,31}', '_V', '[0-9][0-9]+', '[CIU]?'],
+    ['[0-9]{4}', '-', '[0-9]{2}'],
+    ['(SOLO|RGTS)', '_', '(LL02|L1|L2)', '_', '[A-Z]+', '(|-[A-Z0-9-]+)'],
+    ['', 'a*', 'b?'],
+    ['$'],
+    # Depend on characters outside the remaining string (if not sliced).
+    ['a', r'\bb', 'b|a'],
+    ['a*', '(?<=a)b', r'\Ba?'],
+]
+
+
+def test_read_token():
+    def test(s, regexp_list, search_dir, exp_result):
+        act_result = erikpgjohansson.solo.str.read_token(
+            s, regexp_list, search_dir,
+        )
+        assert act_result == exp_result
+
+    test('abc', ['x', 'a'],  1, ('a', 'bc', 1))
+    test('abc', ['x', 'c'], -1, ('c', 'ab', 1))
+    test('abc', ['x'],       1, (None, 'abc', -1))
+    test('',    ['$'],       1, ('', '', 0))
+    test('aab', ['a*'],      1, ('aa', 'b', 0))
+
+    with pytest.raises(Exception):
+        erikpgjohansson.solo.str.read_token('abc', ['a'], 0)
+
+
+def test_regexp_str_parts():
+    def test(s, regexp_list, search_dir, exp_result):
+        act_result = erikpgjohansson.solo.str.regexp_str_parts(
+            s, regexp_list, search_dir, 'permit non-match',
+        )
+        assert act_result == exp_result
+
+    test('aab',   ['a+', 'b'],  1, (['aa', 'b'], '', True))
+    test('aab',   ['a+', 'b'], -1, (['aa', 'b'], '', True))
+    test('aabc',  ['a+', 'b'],  1, (['aa', 'b'], 'c', False))
+    test('xaab',  ['a+', 'b'], -1, (['aa', 'b'], 'x', False))
+    test('xaab',  ['a+', 'b'],  1, ([], 'xaab', False))
+    # Regexps only see the remaining string (as if sliced).
+    test('ab',    ['a', r'\bb'],        1, (['a', 'b'], '', True))
+    test('ab',    ['a', '(?<=a)b'],     1, (['a'], 'b', False))
+    # Top-level alternation: "^" only applies to the first alternative.
+    # ==> Matches "a" at index 1 (unlike Pattern.match()).
+    test('xa',    ['b|a'],             1, (['a'], 'a', False))
+
+    with pytest.raises(Exception):
+        erikpgjohansson.solo.str.regexp_str_parts(
+            'xaab', ['a+', 'b'], 1, 'assert match',
+        )
+    with pytest.raises(Exception):
+        erikpgjohansson.solo.str.regexp_str_parts(
+            'aabc', ['a+', 'b'], 1, 'assert match',
+        )
+
+
+def test_differential():
+    '''Compare with the earlier implementations for many random strings.'''
+    rng = random.Random(0)
+    ALPHABET = 'ab_-0123456789TVCIUx.SOLRGTLA'
+    LS_PARTS = [
+        'SOLO', 'RGTS', '_', 'L2', 'LL02', 'MAG', '-X', '-x', '2020',
+        '20200101T000000', '-', '_V', '01', 'C', 'aa', 'b',
+    ]
+    for _ in range(3000):
+        if rng.random() < 0.5:
+            s = ''.join(
+                rng.choice(ALPHABET) for _ in range(rng.randint(0, 25))
+            )
+        else:
+            s = ''.join(
+                rng.choice(LS_PARTS) for _ in range(rng.randint(0, 8))
+            )
+        regexp_list = rng.choice(LS_REGEXP_LIST)
+        for search_dir in (1, -1):
+            assert erikpgjohansson.solo.str.read_token(
+                s, regexp_list, search_dir,
+            ) == _read_token_legacy(s, regexp_list, search_dir)
+            assert erikpgjohansson.solo.str.regexp_str_parts(
+                s, regexp_list, search_dir, 'permit non-match',
+            ) == _regexp_str_parts_legacy(s, regexp_list, search_dir)